@@ -1,34 +1,23 @@
 from main import session_metadata, sessions
 from fastapi import HTTPException
-from manage_tools.manage_tools import fetch_gemini_tools_and_router, build_gemini_tools_from_supabase, dispatch_tool_with_router
+from manage_tools.manage_tools import dispatch_tool_with_router
 from audio.audio import convert_api_response_to_natural_language, truncate_response_for_voice
 import asyncio
 import time
 import re
-from main import initialize_gemini_model_async, get_system_prompt_with_training
-from manage_tools.manage_tools import ToolRouter
+from agent.profile_cache import get_agent_profile, context_cache_retired
+from company.files.prompt_budget import record_company_query
+from turn_trace import trace_mark
+from agent.history_window import record_turn_tokens, compact_chat_history, forget_history_window
+from session_store import save_chat_history, load_chat_history, session_store_is_shared
+from session_lifecycle import register_eviction_hook, touch_session, SESSION_PERSIST_HISTORY_ON_EVICT
 
 # Global cache for chat sessions
 chat_sessions = {}  # session_id -> chat_object
 chat_session_metadata = {}  # session_id -> {company_id, system_prompt, tools}
 
-async def get_agent_response_with_training_helper(session_id: str, user_text: str, user_id: str = None, company_id: str = None):
-    """Get response from agent with training data included"""
-    print(f"🔍 Looking for session: {session_id}")
-    print(f"🔍 Available sessions: {list(sessions.keys())}")
-    print(f"🔍 Available chat sessions: {list(chat_sessions.keys())}")
-    
-    session_info = sessions.get(session_id)
-    if not session_info:
-        print(f"❌ Session {session_id} not found in sessions dictionary")
-        raise HTTPException(404, "Chat session not found")
-
-    # Get company_id from session metadata
-    session_metadata_info = session_metadata.get(session_id, {})
-    company_id_from_session = session_metadata_info.get("company_id", "default")
-    effective_company_id = company_id or company_id_from_session
-
-    # Upfront balance gate (non-deducting)
+async def _check_llm_balance(user_id: str, effective_company_id: str):
+    """Upfront balance gate (non-deducting); raises 402 when the user has no credits left"""
     if user_id and effective_company_id:
         try:
             from credits_helper import get_user_credits
@@ -46,105 +35,222 @@ async def get_agent_response_with_training_helper(session_id: str, user_text: st
         print(f"⚠️ AI CREDITS: Skipping balance check - missing user_id or company_id")
         print(f"⚠️ AI CREDITS: user_id={user_id}, company_id={effective_company_id}")
 
-    try:
-        # Check if we have a cached chat session
+async def _get_chat_for_session(session_id: str, effective_company_id: str, user_id: str = None):
+    """Return (chat, tools, router) for a session, pre-warming it on demand"""
+    touch_session(session_id)
+    # Check if we have a cached chat session
+    if session_id in chat_sessions and chat_sessions[session_id] is not None:
+        print(f"✅ Using cached chat session for {session_id}")
+    else:
+        print(f"⏳ Chat session not ready yet for {session_id}, creating on-demand...")
+        
+        # Create session on-demand if pre-warming didn't complete
+        await pre_warm_chat_session(session_id, effective_company_id, user_id)
+        
+        # Check again after pre-warming
         if session_id in chat_sessions and chat_sessions[session_id] is not None:
-            print(f"✅ Using cached chat session for {session_id}")
-            chat = chat_sessions[session_id]
-            tools = chat_session_metadata[session_id]["tools"]
-            router = chat_session_metadata[session_id]["router"]
+            print(f"✅ Chat session created on-demand for {session_id}")
         else:
-            print(f"⏳ Chat session not ready yet for {session_id}, creating on-demand...")
+            print(f"❌ Failed to create chat session for {session_id}")
+            raise HTTPException(500, "Failed to initialize chat session")
+    
+    chat = chat_sessions[session_id]
+    metadata = chat_session_metadata[session_id]
+    expires_at = metadata.get("model_expires_at")
+    if (expires_at and time.time() > expires_at - MODEL_REBIND_MARGIN_S) or context_cache_retired(metadata.get("context_cache")):
+        await _rebind_company_model(session_id, chat, effective_company_id)
+    tools = chat_session_metadata[session_id]["tools"]
+    router = chat_session_metadata[session_id]["router"]
+    trace_mark(session_id, "chat_ready", once=True)
+    return chat, tools, router
+
+# A chat bound to a context-cached model moves to the current profile's model this long before
+# the Gemini cache expires (profiles are rebuilt well within the cache TTL), or as soon as a
+# changed prompt retired its cache
+MODEL_REBIND_MARGIN_S = 120
+
+async def _rebind_company_model(session_id: str, chat, company_id: str):
+    metadata = chat_session_metadata[session_id]
+    profile = await get_agent_profile(metadata.get("company_id") or company_id)
+    chat.model = profile["model"]
+    metadata.update({
+        "system_prompt": profile["system_prompt"],
+        "tools": profile["tools"],
+        "router": profile["router"],
+        "model_expires_at": profile["model_expires_at"],
+        "context_cache": profile["context_cache"],
+    })
+    print(f"🔁 Chat {session_id} rebound to the current company model (context cache {profile['context_cache']})")
+
+# Part fields that survive a round trip through the session store
+_HISTORY_PART_FIELDS = ("text", "inline_data", "function_call", "function_response", "file_data")
+
+def _serialize_history(history) -> list:
+    """Gemini chat history → JSON-safe contents (dict parts are kept, proto parts are converted)"""
+    contents = []
+    for content in history:
+        if isinstance(content, dict):
+            parts = [part if isinstance(part, dict) else {"text": str(part)} for part in content.get("parts", [])]
+            contents.append({"role": content.get("role", "user"), "parts": parts})
+            continue
+        parts = []
+        for part in content.parts:
+            as_dict = type(part).to_dict(part)
+            parts.append({k: as_dict[k] for k in _HISTORY_PART_FIELDS if as_dict.get(k)})
+        contents.append({"role": content.role, "parts": parts})
+    return contents
+
+def _persist_chat_history(session_id: str, chat):
+    """Share the chat history so another worker can pick up the session (no-op for the in-process store)"""
+    if chat is None or not session_store_is_shared():
+        return
+    try:
+        save_chat_history(session_id, _serialize_history(chat.history))
+    except Exception as e:
+        print(f"⚠️ Failed to persist chat history for {session_id}: {e}")
+
+async def _maintain_history_window(session_id: str, chat, prompt_tokens: int):
+    pinned = chat_session_metadata.get(session_id, {}).get("pinned_messages", 0)
+    if await compact_chat_history(session_id, chat, pinned, prompt_tokens):
+        _persist_chat_history(session_id, chat)
+
+def _after_turn(session_id: str, chat, response):
+    """Bookkeeping once a turn is in the history: share it, account its tokens, compact if needed"""
+    _persist_chat_history(session_id, chat)
+    prompt_tokens = record_turn_tokens(session_id, response)
+    if prompt_tokens:
+        asyncio.create_task(_maintain_history_window(session_id, chat, prompt_tokens))
+
+async def _track_llm_usage_background(response, session_id: str, user_text: str, user_id: str, effective_company_id: str):
+    """Track LLM usage and deduct credits (meant to run as a background task)"""
+    if user_id and effective_company_id:
+        try:
+            from main import supabase
+            from credits_helper import check_and_use_credits
+            
+            bg_t0 = time.time()
+            print("🧵 LLM BG: started")
+            
+            # Extract token usage from response
+            input_tokens = 0
+            output_tokens = 0
+            total_tokens = 0
             
-            # Create session on-demand if pre-warming didn't complete
-            await pre_warm_chat_session(session_id, effective_company_id, user_id)
+            if getattr(response, 'usage_metadata', None) is not None:
+                input_tokens = getattr(response.usage_metadata, 'prompt_token_count', 0)
+                output_tokens = getattr(response.usage_metadata, 'candidates_token_count', 0)
+                total_tokens = input_tokens + output_tokens
+                print(f"🧵 LLM BG: usage_metadata tokens input={input_tokens} output={output_tokens} total={total_tokens}")
+            else:
+                # Fallback: estimate tokens based on text length
+                system_prompt = chat_session_metadata.get(session_id, {}).get("system_prompt", "")
+                total_tokens = (len(user_text) + len(system_prompt)) // 4
+                print(f"🧵 LLM BG: fallback token estimate total={total_tokens}")
+            
+            # Telemetry
+            if total_tokens > 0:
+                tele_t0 = time.time()
+                supabase.rpc('track_model_usage', {
+                    'p_user_id': user_id,
+                    'p_company_id': effective_company_id,
+                    'p_session_id': session_id,
+                    'p_model_type': 'llm',
+                    'p_provider': 'google',
+                    'p_model_name': 'gemini-pro',
+                    'p_usage_amount': total_tokens,
+                    'p_metadata': {
+                        'input_tokens': input_tokens,
+                        'output_tokens': output_tokens,
+                        'total_tokens': total_tokens,
+                        'user_message_length': len(user_text)
+                    }
+                }).execute()
+                print(f"🧵 LLM BG: telemetry done in {time.time()-tele_t0:.3f}s")
+            else:
+                print(f"🧵 LLM BG: skip telemetry (no tokens)")
             
-            # Check again after pre-warming
-            if session_id in chat_sessions and chat_sessions[session_id] is not None:
-                print(f"✅ Chat session created on-demand for {session_id}")
-                chat = chat_sessions[session_id]
-                tools = chat_session_metadata[session_id]["tools"]
-                router = chat_session_metadata[session_id]["router"]
+            # Background credit deduction (using token count)
+            if total_tokens > 0:
+                deduct_t0 = time.time()
+                try:
+                    credit_res = await check_and_use_credits(
+                        user_id, effective_company_id, 'gemini-pro', float(total_tokens),
+                        f"AI response using gemini-pro ({total_tokens} tokens)"
+                    )
+                    print(f"🧵 LLM BG: deducted {credit_res['credits_used']} credits in {time.time()-deduct_t0:.3f}s; remaining={credit_res['remaining_credits']}")
+                except Exception as ce:
+                    print(f"❌ LLM CREDIT BG error: {ce}")
             else:
-                print(f"❌ Failed to create chat session for {session_id}")
-                raise HTTPException(500, "Failed to initialize chat session")
+                print("🧵 LLM BG: skip deduction (0 tokens)")
+            
+            print(f"🧵 LLM BG: finished in {time.time()-bg_t0:.3f}s")
+        except Exception as e:
+            print(f"❌ Error tracking/deducting LLM in background: {e}")
+    else:
+        print(f"⚠️ Skipping LLM cost tracking - missing user_id or company_id")
+
+async def _run_function_call(fc, user_text: str, effective_company_id: str, user_id: str, session_id: str):
+    """Execute a Gemini function call through the tool router and return a speakable answer, or None"""
+    name = getattr(fc, 'name', 'unknown_function')
+    args = getattr(fc, 'args', {})
+    
+    print(f"🔧 Function call details:")
+    print(f"   Name: '{name}'")
+    print(f"   Args type: {type(args)}")
+    print(f"   Args: {args}")
+    
+    # Skip empty function calls
+    if not name or name.strip() == "":
+        print(f"⚠️ Skipping empty function call")
+        return None
+    
+    print(f"🔧 Executing function: {name} with args: {args}")
+    
+    # Actually dispatch the tool using router
+    trace_mark(session_id, "tool_call_start", tool=name)
+    result = await dispatch_tool_with_router(name, args, effective_company_id, user_id, session_id)
+    trace_mark(session_id, "tool_call_end", tool=name)
+    
+    # Get company language for natural language conversion
+    language_code = (await get_agent_profile(effective_company_id))["language"]
+    
+    # Convert API response to natural language
+    if isinstance(result, dict):
+        return convert_api_response_to_natural_language(result, name, user_text, language_code)
+    return str(result)
+
+async def get_agent_response_with_training_helper(session_id: str, user_text: str, user_id: str = None, company_id: str = None):
+    """Get response from agent with training data included"""
+    print(f"🔍 Looking for session: {session_id}")
+    print(f"🔍 Available sessions: {list(sessions.keys())}")
+    print(f"🔍 Available chat sessions: {list(chat_sessions.keys())}")
+    
+    session_info = sessions.get(session_id)
+    if not session_info:
+        print(f"❌ Session {session_id} not found in sessions dictionary")
+        raise HTTPException(404, "Chat session not found")
+
+    # Get company_id from session metadata
+    session_metadata_info = session_metadata.get(session_id, {})
+    company_id_from_session = session_metadata_info.get("company_id", "default")
+    effective_company_id = company_id or company_id_from_session
+
+    await _check_llm_balance(user_id, effective_company_id)
+
+    try:
+        chat, tools, router = await _get_chat_for_session(session_id, effective_company_id, user_id)
 
         # Send message and get response
         start_time = time.time()
-        response = chat.send_message(user_text, tools=tools)
+        trace_mark(session_id, "llm_request")
+        response = chat.send_message(user_text)
+        trace_mark(session_id, "llm_complete")
         end_time = time.time()
         print(f"🔍 Response received in {end_time - start_time:.2f} seconds")
 
-        # Track LLM usage and deduct credits in background
-        async def track_llm_usage_background():
-            if user_id and effective_company_id:
-                try:
-                    from main import supabase
-                    from credits_helper import check_and_use_credits
-                    
-                    bg_t0 = time.time()
-                    print("🧵 LLM BG: started")
-                    
-                    # Extract token usage from response
-                    input_tokens = 0
-                    output_tokens = 0
-                    total_tokens = 0
-                    
-                    if hasattr(response, 'usage_metadata'):
-                        input_tokens = getattr(response.usage_metadata, 'prompt_token_count', 0)
-                        output_tokens = getattr(response.usage_metadata, 'candidates_token_count', 0)
-                        total_tokens = input_tokens + output_tokens
-                        print(f"🧵 LLM BG: usage_metadata tokens input={input_tokens} output={output_tokens} total={total_tokens}")
-                    else:
-                        # Fallback: estimate tokens based on text length
-                        system_prompt = chat_session_metadata[session_id]["system_prompt"]
-                        total_tokens = (len(user_text) + len(system_prompt)) // 4
-                        print(f"🧵 LLM BG: fallback token estimate total={total_tokens}")
-                    
-                    # Telemetry
-                    if total_tokens > 0:
-                        tele_t0 = time.time()
-                        supabase.rpc('track_model_usage', {
-                            'p_user_id': user_id,
-                            'p_company_id': effective_company_id,
-                            'p_session_id': session_id,
-                            'p_model_type': 'llm',
-                            'p_provider': 'google',
-                            'p_model_name': 'gemini-pro',
-                            'p_usage_amount': total_tokens,
-                            'p_metadata': {
-                                'input_tokens': input_tokens,
-                                'output_tokens': output_tokens,
-                                'total_tokens': total_tokens,
-                                'user_message_length': len(user_text)
-                            }
-                        }).execute()
-                        print(f"🧵 LLM BG: telemetry done in {time.time()-tele_t0:.3f}s")
-                    else:
-                        print(f"🧵 LLM BG: skip telemetry (no tokens)")
-                    
-                    # Background credit deduction (using token count)
-                    if total_tokens > 0:
-                        deduct_t0 = time.time()
-                        try:
-                            credit_res = await check_and_use_credits(
-                                user_id, effective_company_id, 'gemini-pro', float(total_tokens),
-                                f"AI response using gemini-pro ({total_tokens} tokens)"
-                            )
-                            print(f"🧵 LLM BG: deducted {credit_res['credits_used']} credits in {time.time()-deduct_t0:.3f}s; remaining={credit_res['remaining_credits']}")
-                        except Exception as ce:
-                            print(f"❌ LLM CREDIT BG error: {ce}")
-                    else:
-                        print("🧵 LLM BG: skip deduction (0 tokens)")
-                    
-                    print(f"🧵 LLM BG: finished in {time.time()-bg_t0:.3f}s")
-                except Exception as e:
-                    print(f"❌ Error tracking/deducting LLM in background: {e}")
-            else:
-                print(f"⚠️ Skipping LLM cost tracking - missing user_id or company_id")
-
         # Start background tracking + deduction
-        asyncio.create_task(track_llm_usage_background())
+        asyncio.create_task(_track_llm_usage_background(response, session_id, user_text, user_id, effective_company_id))
+        record_company_query(effective_company_id, user_text)
         print("🧵 LLM BG: scheduled")
 
         # Check for finish_reason error
@@ -165,39 +271,15 @@ async def get_agent_response_with_training_helper(session_id: str, user_text: st
                 response_text += part.text + " "
             elif hasattr(part, 'function_call'):
                 # For function calls, actually execute them
-                fc = part.function_call
-                name = getattr(fc, 'name', 'unknown_function')
-                args = getattr(fc, 'args', {})
-                
-                print(f"🔧 Function call details:")
-                print(f"   Name: '{name}'")
-                print(f"   Args type: {type(args)}")
-                print(f"   Args: {args}")
-                
-                # Skip empty function calls
-                if not name or name.strip() == "":
-                    print(f"⚠️ Skipping empty function call")
-                    continue
-                
-                print(f"🔧 Executing function: {name} with args: {args}")
-                
-                # Actually dispatch the tool using router
-                result = await dispatch_tool_with_router(name, args, effective_company_id, user_id, session_id)
-                
-                # Get company language for natural language conversion
-                from tools import get_company_language
-                language_code = get_company_language(effective_company_id)
-                
-                # Convert API response to natural language
-                if isinstance(result, dict):
-                    natural_response = convert_api_response_to_natural_language(result, name, user_text, language_code)
-                else:
-                    natural_response = str(result)
-                response_text += natural_response + ". "
+                natural_response = await _run_function_call(part.function_call, user_text, effective_company_id, user_id, session_id)
+                if natural_response is not None:
+                    response_text += natural_response + ". "
 
         if not response_text.strip():
             response_text = "He procesado tu solicitud."
         
+        _after_turn(session_id, chat, response)
+
         # Truncate if too long for voice synthesis
         truncated_response = truncate_response_for_voice(response_text, max_words=150)
 
@@ -212,18 +294,213 @@ async def get_agent_response_with_training_helper(session_id: str, user_text: st
         traceback.print_exc()
         return "Estoy teniendo problemas para procesar tu solicitud en este momento. Por favor, intenta de nuevo."
 
-# Cleanup function to remove old chat sessions
-async def cleanup_chat_sessions():
-    """Remove chat sessions that are no longer active"""
-    current_sessions = set(sessions.keys())
-    cached_sessions = set(chat_sessions.keys())
-    
-    # Remove sessions that are no longer active
-    for session_id in cached_sessions - current_sessions:
-        del chat_sessions[session_id]
-        del chat_session_metadata[session_id]
+# ===== STREAMING TURN MODE =====
+
+# Sentence enders (optionally followed by closing quotes/brackets) and softer clause breaks
+_SENTENCE_END_RE = re.compile(r'[.!?…]+["\')\]»]*\s+')
+_CLAUSE_END_RE = re.compile(r'[,;:]\s+')
+
+def split_speakable_segments(buffer: str, min_chars: int = 12, max_chars: int = 160):
+    """Split streamed LLM text into speakable pieces.
+    Returns (segments, remainder): complete sentences are emitted as soon as they end; when a
+    sentence runs past max_chars it is cut at the last clause break so TTS can start early.
+    The remainder is the unfinished tail that must wait for more tokens.
+    """
+    segments = []
+    start = 0
+    for match in _SENTENCE_END_RE.finditer(buffer):
+        end = match.end()
+        if end - start < min_chars:
+            continue
+        segments.append(buffer[start:end].strip())
+        start = end
+    remainder = buffer[start:]
+    while len(remainder) > max_chars:
+        cut = None
+        for match in _CLAUSE_END_RE.finditer(remainder, 0, max_chars):
+            if match.end() >= min_chars:
+                cut = match.end()
+        if cut is None:
+            break
+        segments.append(remainder[:cut].strip())
+        remainder = remainder[cut:]
+    return [seg for seg in segments if seg], remainder
+
+def _discard_incomplete_turn(chat):
+    """Drop a half-streamed exchange so the chat history stays coherent for the next turn"""
+    try:
+        chat.rewind()
+    except Exception:
+        pass
+
+async def stream_agent_response_with_training_helper(session_id: str, user_text: str, user_id: str = None, company_id: str = None, max_words: int = 150):
+    """Stream the agent response as speakable segments (sentences or clauses).
+    Same gating, tools and billing as get_agent_response_with_training_helper, but each segment is
+    yielded as soon as Gemini has produced it instead of waiting for the whole reply.
+    """
+    session_info = sessions.get(session_id)
+    if not session_info:
+        print(f"❌ Session {session_id} not found in sessions dictionary")
+        raise HTTPException(404, "Chat session not found")
+
+    session_metadata_info = session_metadata.get(session_id, {})
+    effective_company_id = company_id or session_metadata_info.get("company_id", "default")
+
+    await _check_llm_balance(user_id, effective_company_id)
+
+    words_left = max_words
+    yielded_any = False
+    chat = None
+    sent = False
+    completed = False
+    try:
+        chat, tools, router = await _get_chat_for_session(session_id, effective_company_id, user_id)
+
+        start_time = time.time()
+        first_token_at = None
+        trace_mark(session_id, "llm_request")
+        response = await chat.send_message_async(user_text, stream=True)
+        # From here the SDK has the new exchange in flight; before, history holds only completed turns
+        sent = True
+        buffer = ""
+
+        async for chunk in response:
+            try:
+                parts = chunk.parts
+            except Exception:
+                parts = []
+            for part in parts:
+                segments = []
+                if getattr(part, 'text', None):
+                    if first_token_at is None:
+                        first_token_at = time.time()
+                        trace_mark(session_id, "llm_first_token")
+                        print(f"⏱️ LLM FIRST TOKEN: {first_token_at - start_time:.3f}s")
+                    segments, buffer = split_speakable_segments(buffer + part.text)
+                elif getattr(part, 'function_call', None) and getattr(part.function_call, 'name', None):
+                    # Speak whatever text preceded the tool call before running it
+                    if buffer.strip():
+                        segments.append(buffer.strip())
+                        buffer = ""
+                    natural_response = await _run_function_call(part.function_call, user_text, effective_company_id, user_id, session_id)
+                    if natural_response:
+                        segments.append(natural_response)
+                for segment in segments:
+                    if words_left <= 0:
+                        break
+                    segment = truncate_response_for_voice(segment, max_words=words_left)
+                    words_left -= len(segment.split())
+                    yielded_any = True
+                    yield segment
+
+        if buffer.strip() and words_left > 0:
+            yielded_any = True
+            yield truncate_response_for_voice(buffer.strip(), max_words=words_left)
+
+        completed = True
+        trace_mark(session_id, "llm_complete")
+        _after_turn(session_id, chat, response)
+        print(f"🔍 Streamed response completed in {time.time() - start_time:.2f} seconds")
+
+        asyncio.create_task(_track_llm_usage_background(response, session_id, user_text, user_id, effective_company_id))
+        print("🧵 LLM BG: scheduled")
+        record_company_query(effective_company_id, user_text)
+
+        if not yielded_any:
+            yield "He procesado tu solicitud."
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Error in stream_agent_response_with_training: {e}")
+        import traceback
+        traceback.print_exc()
+        if not yielded_any:
+            yield "Estoy teniendo problemas para procesar tu solicitud en este momento. Por favor, intenta de nuevo."
+    finally:
+        if chat is not None and sent and not completed:
+            _discard_incomplete_turn(chat)
+
+# ===== SPECULATIVE TURNS =====
+
+async def speculate_agent_response_helper(session_id: str, user_text: str, user_id: str = None, company_id: str = None):
+    """Generate a reply for a not-yet-final utterance without touching the chat history.
+    Returns a speculation dict for commit_speculative_response_helper, or None if the session
+    cannot speculate. Replies that need a tool call are flagged with needs_tools and discarded:
+    tools have side effects and never run speculatively. Every generated reply is billed here,
+    whether or not it is committed later.
+    """
+    if not sessions.get(session_id):
+        return None
+    effective_company_id = company_id or session_metadata.get(session_id, {}).get("company_id", "default")
+    try:
+        await _check_llm_balance(user_id, effective_company_id)
+    except HTTPException:
+        return None
+
+    chat, tools, router = await _get_chat_for_session(session_id, effective_company_id, user_id)
+    history = list(chat.history)
+    start_time = time.time()
+    response = await chat.model.generate_content_async(history + [{"role": "user", "parts": [user_text]}])
+    print(f"🔮 SPECULATION: reply generated in {time.time() - start_time:.2f} seconds")
+    # Billed whether or not the speculation is committed: a discarded reply still cost a full call
+    asyncio.create_task(_track_llm_usage_background(response, session_id, user_text, user_id, effective_company_id))
+    print("🧵 LLM BG: scheduled")
+    from manage_twilio.speculation import record_speculative_tokens
+    usage = getattr(response, "usage_metadata", None)
+    tokens = (getattr(usage, "prompt_token_count", 0) or 0) + (getattr(usage, "candidates_token_count", 0) or 0) if usage is not None else 0
+    record_speculative_tokens(tokens)
+
+    candidate = response.candidates[0] if getattr(response, "candidates", None) else None
+    if candidate is None:
+        return None
+    parts = list(getattr(candidate.content, "parts", []))
+    needs_tools = any(getattr(part, "function_call", None) and getattr(part.function_call, "name", None) for part in parts)
+    text = " ".join(part.text for part in parts if getattr(part, "text", None)).strip()
+    return {
+        "user_text": user_text,
+        "text": text,
+        "needs_tools": needs_tools,
+        "response": response,
+        "content": candidate.content,
+        "history_len": len(history),
+        "company_id": effective_company_id,
+        "tokens": tokens,
+    }
+
+def commit_speculative_response_helper(session_id: str, user_text: str, speculation: dict, user_id: str = None, max_words: int = 150):
+    """Adopt a finished speculation as the real turn for user_text.
+    Appends the exchange to the chat history (the call was already billed when it was generated);
+    returns the reply, or None when the speculation is unusable (needs tools, empty, or the history
+    moved on since it started).
+    """
+    chat = chat_sessions.get(session_id)
+    if chat is None or not speculation or speculation.get("needs_tools") or not speculation.get("text"):
+        return None
+    history = list(chat.history)
+    if len(history) != speculation["history_len"]:
+        print(f"⚠️ SPECULATION: history changed for {session_id}; discarding stale reply")
+        return None
+    chat.history = history + [{"role": "user", "parts": [user_text]}, speculation["content"]]
+    _after_turn(session_id, chat, speculation["response"])
+
+    from manage_twilio.speculation import record_committed_tokens
+    record_committed_tokens(speculation.get("tokens", 0))
+    record_company_query(speculation["company_id"], user_text)
+    return truncate_response_for_voice(speculation["text"], max_words=max_words)
+
+# Eviction hook: drop the session's Gemini chat (full history + system prompt) from this worker
+def release_chat_session(session_id: str):
+    chat = chat_sessions.pop(session_id, None)
+    chat_session_metadata.pop(session_id, None)
+    forget_history_window(session_id)
+    if chat is not None:
+        if SESSION_PERSIST_HISTORY_ON_EVICT:
+            _persist_chat_history(session_id, chat)
         print(f"🧹 Cleaned up chat session: {session_id}")
 
+register_eviction_hook(release_chat_session)
+
 async def pre_warm_chat_session(session_id: str, company_id: str, user_id: str = None):
     """Pre-warm a chat session by initializing it in the background"""
     try:
@@ -241,50 +518,22 @@ async def pre_warm_chat_session(session_id: str, company_id: str, user_id: str =
                 print(f"⚠️ Error checking credits during pre-warm: {e}")
                 # Continue with pre-warm even if credit check fails
         
-        # Parallelize tools/router, system prompt, and model initialization
-        parallel_t0 = time.time()
-        print("🚀 Pre-warm: launching parallel tasks (tools/router, system prompt, model init)")
-        tools_task = asyncio.to_thread(fetch_gemini_tools_and_router, company_id)
-        prompt_task = get_system_prompt_with_training(company_id)
-        model_task = initialize_gemini_model_async()
-        (tools_rows, router_spec), system_prompt, model = await asyncio.gather(tools_task, prompt_task, model_task)
-        print(f"✅ Pre-warm parallel phase took {time.time() - parallel_t0:.2f} seconds")
-
-        # Build tools from rows
-        tools_build_t0 = time.time()
-        tools = build_gemini_tools_from_supabase(tools_rows, company_id)
-        print(f"🔍 Tools built in {time.time() - tools_build_t0:.2f} seconds")
-        
-        # Create router with allowed domains
-        router_t0 = time.time()
-        allowed_domains = [
-            re.escape(router_spec["api_base_url"].split("://",1)[-1].split("/")[0]),
-            "39e547b6a29c\\.ngrok-free\\.app",  # Allow ngrok domain
-            "localhost",
-            "127\\.0\\.0\\.1"
-        ] if router_spec else []
-        router = ToolRouter(router_spec, allowed_domains=allowed_domains) if router_spec else None
-        print(f"🔍 Router built in {time.time() - router_t0:.2f} seconds")
-
-        # Add important instructions to system prompt
-        additional_instructions = """
-
-IMPORTANT INSTRUCTIONS:
-- Keep your responses concise and under 50 words. Be direct and to the point.
-- NEVER dictate or read out IDs, serial numbers, or very large numbers to users.
-- NEVER EVER read out loud the id of a company or user. 
-- If you need to reference an ID or number, say something like "I've processed your request" or "Your information has been updated" instead of reading the actual ID.
-- Focus on providing helpful, actionable information rather than technical details.
-- Use natural, conversational language that's easy to understand when spoken aloud.
-"""
-        system_prompt = (system_prompt or "") + additional_instructions
-        print(f"🔍 System prompt prepared (length={len(system_prompt)} chars)")
+        # Company profile (prompt, tools, router and the company's model) from cache
+        profile_t0 = time.time()
+        profile = await get_agent_profile(company_id)
+        system_prompt = profile["system_prompt"]
+        tools = profile["tools"]
+        router = profile["router"]
+        print(f"✅ Pre-warm profile took {time.time() - profile_t0:.2f} seconds "
+              f"(prompt {len(system_prompt)} chars, {len(tools)} tools)")
         
-        # Create chat and seed system prompt
-        chat_t0 = time.time()
-        chat = model.start_chat(history=[])
-        chat.send_message(system_prompt)  # Send system prompt once
-        print(f"🔍 Chat initialized with system prompt in {time.time() - chat_t0:.2f} seconds")
+        # The prompt and tools are part of the model (system_instruction or context cache), so a new
+        # chat starts empty without a round trip; a session started on another worker resumes from
+        # the shared history
+        stored_history = load_chat_history(session_id) if session_store_is_shared() else None
+        chat = profile["model"].start_chat(history=stored_history or [])
+        if stored_history:
+            print(f"🔍 Chat restored from shared history ({len(stored_history)} messages)")
         
         # Cache the chat session and metadata
         chat_sessions[session_id] = chat
@@ -292,7 +541,11 @@ IMPORTANT INSTRUCTIONS:
             "company_id": company_id,
             "system_prompt": system_prompt,
             "tools": tools,
-            "router": router
+            "router": router,
+            "model_expires_at": profile["model_expires_at"],
+            "context_cache": profile["context_cache"],
+            # Nothing is seeded into the history any more, so compaction may fold all of it
+            "pinned_messages": 0,
         }
         print(f"🔥 Pre-warmed chat session for {session_id}")
         
@@ -0,0 +1,179 @@
+import os
+import time
+from typing import Dict, List, Optional
+
+from extraction_processing.vectors.chunking import count_tokens
+
+# History window for cached Gemini chats. Every turn resends the whole history, so once the
+# history alone (not the system prompt/documents, which are the same every turn) crosses
+# CHAT_HISTORY_TOKEN_THRESHOLD the older turns are folded into a running summary:
+# pinned messages + summary + the last CHAT_HISTORY_KEEP_TURNS turns.
+CHAT_HISTORY_COMPACTION_ENABLED = os.getenv("CHAT_HISTORY_COMPACTION_ENABLED", "true").lower() in ("1", "true", "yes")
+CHAT_HISTORY_TOKEN_THRESHOLD = int(os.getenv("CHAT_HISTORY_TOKEN_THRESHOLD", "4000"))
+CHAT_HISTORY_KEEP_TURNS = int(os.getenv("CHAT_HISTORY_KEEP_TURNS", "6"))
+# Summaries use their own plain model: the chat's model carries the company prompt and tools
+CHAT_HISTORY_SUMMARY_MODEL = os.getenv("CHAT_HISTORY_SUMMARY_MODEL", "gemini-2.5-flash-lite")
+
+SUMMARY_PREFIX = "[Conversation summary so far]"
+SUMMARY_ACK = "Understood, I will keep this context in mind."
+SUMMARY_PROMPT = """Summarize the conversation below between a user and an AI assistant so the assistant can continue it.
+Keep names, dates, times, amounts, decisions, open requests and anything the user asked to remember. Drop small talk.
+Write at most 120 words, in the same language as the conversation.
+
+{previous}Conversation:
+{transcript}"""
+
+HISTORY_STATS = {
+    "turns": 0,
+    "prompt_tokens_total": 0,
+    "max_prompt_tokens": 0,
+    "compactions": 0,
+    "compaction_failures": 0,
+    "turns_folded": 0,
+    "estimated_tokens_saved": 0,
+}
+# session_id -> {"last_prompt_tokens", "saved_per_turn", "compacting"}
+_session_windows: Dict[str, Dict] = {}
+_summary_model = None
+
+
+def _role(content) -> str:
+    return content.get("role", "") if isinstance(content, dict) else getattr(content, "role", "")
+
+
+def _parts(content) -> list:
+    return list(content.get("parts", [])) if isinstance(content, dict) else list(getattr(content, "parts", []))
+
+
+def _part_text(part) -> str:
+    if isinstance(part, str):
+        return part
+    if isinstance(part, dict):
+        return part.get("text") or ""
+    return getattr(part, "text", "") or ""
+
+
+def _content_text(content) -> str:
+    return " ".join(text for text in (_part_text(p) for p in _parts(content)) if text)
+
+
+def _is_user_turn_start(content) -> bool:
+    # Function responses are sent with role "user" too; only text messages start a turn
+    return _role(content) == "user" and bool(_content_text(content).strip())
+
+
+def _split_turns(history: list, start: int) -> List[int]:
+    """Indexes (>= start) where a user turn begins"""
+    return [i for i in range(start, len(history)) if _is_user_turn_start(history[i])]
+
+
+def _is_summary(content) -> bool:
+    return _content_text(content).startswith(SUMMARY_PREFIX)
+
+
+def _transcript(history: list) -> str:
+    lines = []
+    for content in history:
+        text = _content_text(content).strip()
+        if text:
+            lines.append(f"{'User' if _role(content) == 'user' else 'Assistant'}: {text}")
+    return "\n".join(lines)
+
+
+def _get_summary_model():
+    global _summary_model
+    if _summary_model is None:
+        import google.generativeai as genai
+        _summary_model = genai.GenerativeModel(CHAT_HISTORY_SUMMARY_MODEL)
+    return _summary_model
+
+
+def record_turn_tokens(session_id: str, response) -> Optional[int]:
+    """Account a finished turn's prompt size; returns its prompt_token_count when Gemini reported it"""
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", None) if usage is not None else None
+    window = _session_windows.setdefault(session_id, {"last_prompt_tokens": None, "saved_per_turn": 0, "compacting": False})
+    HISTORY_STATS["turns"] += 1
+    HISTORY_STATS["estimated_tokens_saved"] += window["saved_per_turn"]
+    if prompt_tokens:
+        window["last_prompt_tokens"] = prompt_tokens
+        HISTORY_STATS["prompt_tokens_total"] += prompt_tokens
+        HISTORY_STATS["max_prompt_tokens"] = max(HISTORY_STATS["max_prompt_tokens"], prompt_tokens)
+    return prompt_tokens
+
+
+async def compact_chat_history(session_id: str, chat, pinned: int, prompt_tokens: Optional[int]) -> bool:
+    """Fold turns older than the last CHAT_HISTORY_KEEP_TURNS into the running summary once the
+    history crossed the threshold. Runs after the reply was sent; turns appended meanwhile are kept.
+    """
+    # prompt_token_count includes the system prompt, so it is only a cheap lower-bound check
+    if not CHAT_HISTORY_COMPACTION_ENABLED or chat is None or not prompt_tokens or prompt_tokens < CHAT_HISTORY_TOKEN_THRESHOLD:
+        return False
+    window = _session_windows.setdefault(session_id, {"last_prompt_tokens": prompt_tokens, "saved_per_turn": 0, "compacting": False})
+    if window["compacting"]:
+        return False
+
+    snapshot = list(chat.history)
+    history_tokens = count_tokens(_transcript(snapshot))
+    if history_tokens < CHAT_HISTORY_TOKEN_THRESHOLD:
+        return False
+    body_start = pinned
+    previous_summary = ""
+    if len(snapshot) >= pinned + 2 and _is_summary(snapshot[pinned]):
+        previous_summary = _content_text(snapshot[pinned])[len(SUMMARY_PREFIX):].strip()
+        body_start = pinned + 2
+    turn_starts = _split_turns(snapshot, body_start)
+    if len(turn_starts) <= CHAT_HISTORY_KEEP_TURNS:
+        return False
+    cut = turn_starts[-CHAT_HISTORY_KEEP_TURNS]
+    folded = snapshot[body_start:cut]
+
+    window["compacting"] = True
+    start_time = time.time()
+    try:
+        prompt = SUMMARY_PROMPT.format(
+            previous=f"Earlier summary:\n{previous_summary}\n\n" if previous_summary else "",
+            transcript=_transcript(folded),
+        )
+        response = await _get_summary_model().generate_content_async(prompt)
+        summary = (getattr(response, "text", "") or "").strip()
+        if not summary:
+            raise ValueError("empty summary")
+
+        current = chat.history
+        if len(current) < len(snapshot) or any(a is not b for a, b in zip(current, snapshot)):
+            print(f"⚠️ HISTORY WINDOW: history of {session_id} was rewritten meanwhile; skipping compaction")
+            return False
+        summary_pair = [
+            {"role": "user", "parts": [f"{SUMMARY_PREFIX} {summary}"]},
+            {"role": "model", "parts": [SUMMARY_ACK]},
+        ]
+        chat.history = snapshot[:pinned] + summary_pair + list(current[cut:])
+
+        window["saved_per_turn"] = max(0, count_tokens(_transcript(snapshot[pinned:cut])) - count_tokens(_transcript(summary_pair)))
+        HISTORY_STATS["compactions"] += 1
+        HISTORY_STATS["turns_folded"] += len(_split_turns(folded, 0))
+        print(f"🗜️ HISTORY WINDOW: {session_id} folded {len(folded)} messages into a summary in {time.time() - start_time:.2f}s "
+              f"(history was {history_tokens} tokens, ~{window['saved_per_turn']} saved per turn)")
+        return True
+    except Exception as e:
+        HISTORY_STATS["compaction_failures"] += 1
+        print(f"⚠️ HISTORY WINDOW: compaction failed for {session_id}: {e}")
+        return False
+    finally:
+        window["compacting"] = False
+
+
+def forget_history_window(session_id: str):
+    _session_windows.pop(session_id, None)
+
+
+def get_history_window_stats() -> Dict:
+    turns = HISTORY_STATS["turns"]
+    return {
+        **HISTORY_STATS,
+        "avg_prompt_tokens": round(HISTORY_STATS["prompt_tokens_total"] / turns, 1) if turns else 0.0,
+        "token_threshold": CHAT_HISTORY_TOKEN_THRESHOLD,
+        "keep_turns": CHAT_HISTORY_KEEP_TURNS,
+        "sessions": {sid: w["last_prompt_tokens"] for sid, w in list(_session_windows.items())[-50:]},
+    }
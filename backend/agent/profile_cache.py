@@ -0,0 +1,279 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Optional
+
+from manage_tools.manage_tools import fetch_gemini_tools_and_router, build_gemini_tools_from_supabase, build_tool_router
+from session_store import get_session_backend, session_store_is_shared
+from company.files.prompt_budget import count_tokens, record_prompt_breakdown
+
+# Everything a session of a company needs that does not depend on the session: final system
+# prompt (with training data and the voice instructions), compiled Gemini tool schemas, router
+# spec + ToolRouter and the language config. Built once per company and reused by every warmup
+# and tool call; the prompt/tool/file/training/company write paths call invalidate_agent_profile,
+# AGENT_PROFILE_TTL_S only bounds staleness from writes made outside this API.
+AGENT_PROFILE_TTL_S = float(os.getenv("AGENT_PROFILE_TTL_S", "600"))
+# The profile also holds the company's GenerativeModel, built with the prompt and tools as
+# system_instruction/tools and shared by all its sessions. Prompts of at least
+# GEMINI_CONTEXT_CACHE_MIN_TOKENS go through Gemini explicit context caching, so each turn bills
+# them at the cached-input rate. The default is the largest minimum cacheable size among the
+# agent models (4096 for 2.5 Pro); the count is tiktoken's, only an estimate of Gemini's, so a
+# create can still be rejected: the rejected prompt is then not retried for that company for
+# GEMINI_CONTEXT_CACHE_REJECT_RETRY_S (quota errors clear up, a prompt below the minimum won't). The cache outlives the
+# profile so sessions bound to it can rebind to the next profile's model before it expires.
+# A rebuild with the same prompt and tools keeps the company's cache and only extends its TTL;
+# a changed prompt retires the old cache: sessions on it rebind on their next turn and it is
+# deleted GEMINI_CONTEXT_CACHE_RETIRE_GRACE_S later (turns already in flight may still use it).
+GEMINI_CONTEXT_CACHE_ENABLED = os.getenv("GEMINI_CONTEXT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+GEMINI_CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", "4096"))
+GEMINI_CONTEXT_CACHE_REJECT_RETRY_S = float(os.getenv("GEMINI_CONTEXT_CACHE_REJECT_RETRY_S", "3600"))
+GEMINI_CONTEXT_CACHE_TTL_S = float(os.getenv("GEMINI_CONTEXT_CACHE_TTL_S", str(AGENT_PROFILE_TTL_S + 600)))
+GEMINI_CONTEXT_CACHE_RETIRE_GRACE_S = float(os.getenv("GEMINI_CONTEXT_CACHE_RETIRE_GRACE_S", "60"))
+
+VOICE_RESPONSE_INSTRUCTIONS = """
+
+IMPORTANT INSTRUCTIONS:
+- Keep your responses concise and under 50 words. Be direct and to the point.
+- NEVER dictate or read out IDs, serial numbers, or very large numbers to users.
+- NEVER EVER read out loud the id of a company or user.
+- If you need to reference an ID or number, say something like "I've processed your request" or "Your information has been updated" instead of reading the actual ID.
+- Focus on providing helpful, actionable information rather than technical details.
+- Use natural, conversational language that's easy to understand when spoken aloud.
+"""
+
+# company_id -> profile dict
+_profiles: Dict[str, Dict] = {}
+# company_id -> in-flight build, shared by concurrent warmups of the same company
+_builds: Dict[str, asyncio.Future] = {}
+# company_id -> local invalidation counter; a build that overlaps an invalidation is not stored
+_generations: Dict[str, int] = {}
+# company_id -> {"key", "cached", "model", "expires_at"} of its live Gemini context cache
+_context_caches: Dict[str, Dict] = {}
+# cache name -> retired at; sessions bound to these rebind before their next turn
+_retired_caches: Dict[str, float] = {}
+_cache_deletions: set = set()
+# company_id -> (cache key, rejected at) of its last failed CachedContent.create
+_rejected_caches: Dict[str, tuple] = {}
+# A cache this close to expiring is replaced rather than extended
+_CACHE_REUSE_MIN_LEFT_S = 30
+stats = {"hits": 0, "misses": 0, "builds": 0, "build_failures": 0, "invalidations": 0, "stale_builds_dropped": 0,
+         "context_caches": 0, "context_cache_reuses": 0, "context_cache_failures": 0, "context_caches_deleted": 0,
+         "context_cache_rejections_skipped": 0}
+
+
+def _shared_version(company_id: str) -> float:
+    """With a shared session store, invalidations are published so every worker drops its copy"""
+    if not session_store_is_shared():
+        return 0
+    return get_session_backend().get("agent_profile_version", company_id, 0)
+
+
+def _create_cached_model(model_name: str, company_id: str, system_prompt: str, tools: list):
+    import datetime
+    import google.generativeai as genai
+    from google.generativeai import caching
+
+    cached = caching.CachedContent.create(
+        model=model_name if model_name.startswith("models/") else f"models/{model_name}",
+        display_name=f"agent-profile-{company_id}"[:128],
+        system_instruction=system_prompt,
+        tools=tools or None,
+        ttl=datetime.timedelta(seconds=GEMINI_CONTEXT_CACHE_TTL_S),
+    )
+    return genai.GenerativeModel.from_cached_content(cached_content=cached), cached
+
+
+def _extend_cached_content(cached):
+    import datetime
+    cached.update(ttl=datetime.timedelta(seconds=GEMINI_CONTEXT_CACHE_TTL_S))
+
+
+def _context_cache_key(model_name: str, system_prompt: str, tools: list) -> str:
+    payload = json.dumps([model_name, system_prompt, tools], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def _delete_retired_cache(company_id: str, cached):
+    await asyncio.sleep(GEMINI_CONTEXT_CACHE_RETIRE_GRACE_S)
+    try:
+        await asyncio.to_thread(cached.delete)
+        stats["context_caches_deleted"] += 1
+        print(f"🧹 AGENT PROFILE: deleted superseded context cache of {company_id}")
+    except Exception as e:
+        print(f"⚠️ AGENT PROFILE: could not delete context cache {cached.name}: {e}")
+
+
+def _retire_context_cache(company_id: str):
+    entry = _context_caches.pop(company_id, None)
+    if entry is None:
+        return
+    now = time.time()
+    _retired_caches[entry["cached"].name] = now
+    # Past the TTL the cache is gone anyway, and the sessions' expiry check rebinds them
+    for name, retired_at in list(_retired_caches.items()):
+        if now - retired_at > GEMINI_CONTEXT_CACHE_TTL_S:
+            _retired_caches.pop(name, None)
+    task = asyncio.ensure_future(_delete_retired_cache(company_id, entry["cached"]))
+    _cache_deletions.add(task)
+    task.add_done_callback(_cache_deletions.discard)
+
+
+def context_cache_retired(cache_name: Optional[str]) -> bool:
+    """Whether a session bound to this context cache must move to the company's current model"""
+    return bool(cache_name) and cache_name in _retired_caches
+
+
+async def _build_model(company_id: str, system_prompt: str, tools: list) -> Dict:
+    """The company's GenerativeModel: context-cached when the prompt is large enough, else plain system_instruction"""
+    from main import initialize_gemini_model_async, GEMINI_AGENT_MODEL
+
+    key = None
+    if GEMINI_CONTEXT_CACHE_ENABLED and count_tokens(system_prompt) >= GEMINI_CONTEXT_CACHE_MIN_TOKENS:
+        key = _context_cache_key(GEMINI_AGENT_MODEL, system_prompt, tools)
+        rejected = _rejected_caches.get(company_id)
+        if rejected is not None and rejected[0] == key and time.time() - rejected[1] < GEMINI_CONTEXT_CACHE_REJECT_RETRY_S:
+            # Same prompt and tools the API refused recently: don't pay for another doomed create
+            stats["context_cache_rejections_skipped"] += 1
+            key = None
+    if key is not None:
+        entry = _context_caches.get(company_id)
+        if entry is not None and entry["key"] == key and entry["expires_at"] > time.time() + _CACHE_REUSE_MIN_LEFT_S:
+            try:
+                await asyncio.to_thread(_extend_cached_content, entry["cached"])
+                entry["expires_at"] = time.time() + GEMINI_CONTEXT_CACHE_TTL_S
+                stats["context_cache_reuses"] += 1
+                return {"model": entry["model"], "context_cache": entry["cached"].name, "model_expires_at": entry["expires_at"]}
+            except Exception as e:
+                print(f"⚠️ AGENT PROFILE: could not extend context cache of {company_id} ({e}); creating a new one")
+        try:
+            model, cached = await asyncio.to_thread(_create_cached_model, GEMINI_AGENT_MODEL, company_id, system_prompt, tools)
+            stats["context_caches"] += 1
+            _rejected_caches.pop(company_id, None)
+            _retire_context_cache(company_id)
+            _context_caches[company_id] = {"key": key, "cached": cached, "model": model,
+                                           "expires_at": time.time() + GEMINI_CONTEXT_CACHE_TTL_S}
+            return {"model": model, "context_cache": cached.name, "model_expires_at": _context_caches[company_id]["expires_at"]}
+        except Exception as e:
+            # Below the model's minimum cacheable size, unsupported model, quota...
+            stats["context_cache_failures"] += 1
+            _rejected_caches[company_id] = (key, time.time())
+            print(f"⚠️ AGENT PROFILE: context caching unavailable for {company_id} ({e}); using system_instruction")
+    # No (new) context cache for this prompt: the previous one is superseded
+    _retire_context_cache(company_id)
+    model = await initialize_gemini_model_async(system_instruction=system_prompt, tools=tools)
+    return {"model": model, "context_cache": None, "model_expires_at": None}
+
+
+async def _build_profile(company_id: str) -> Dict:
+    from main import get_system_prompt_with_training
+    from tools import get_company_language, get_language_config
+
+    build_t0 = time.time()
+    (tools_rows, router_spec), system_prompt, language = await asyncio.gather(
+        asyncio.to_thread(fetch_gemini_tools_and_router, company_id),
+        get_system_prompt_with_training(company_id),
+        asyncio.to_thread(get_company_language, company_id),
+    )
+    # The router spec already carries each tool's args (same order as the rows)
+    args_by_tool = {row["id"]: tool["args"] for row, tool in zip(tools_rows, router_spec.get("tools", []))}
+    system_prompt = (system_prompt or "") + VOICE_RESPONSE_INSTRUCTIONS
+    tools = build_gemini_tools_from_supabase(tools_rows, company_id, args_by_tool=args_by_tool)
+    record_prompt_breakdown(company_id, total_tokens=count_tokens(system_prompt),
+                            instruction_tokens=count_tokens(VOICE_RESPONSE_INSTRUCTIONS))
+    return {
+        "company_id": company_id,
+        "system_prompt": system_prompt,
+        "tools": tools,
+        **await _build_model(company_id, system_prompt, tools),
+        "router_spec": router_spec,
+        "router": build_tool_router(router_spec),
+        "language": language,
+        "language_config": get_language_config(language),
+        "built_at": time.monotonic(),
+        "build_s": round(time.time() - build_t0, 3),
+    }
+
+
+async def _build_and_store(company_id: str) -> Dict:
+    generation = _generations.get(company_id, 0)
+    version = await asyncio.to_thread(_shared_version, company_id)
+    stats["builds"] += 1
+    try:
+        profile = await _build_profile(company_id)
+    except Exception:
+        stats["build_failures"] += 1
+        raise
+    profile["version"] = version
+    if _generations.get(company_id, 0) == generation:
+        _profiles[company_id] = profile
+    else:
+        stats["stale_builds_dropped"] += 1
+    print(f"🧩 AGENT PROFILE: built {company_id} in {profile['build_s']:.2f}s "
+          f"({len(profile['tools'])} tools, prompt {len(profile['system_prompt'])} chars"
+          f"{', context cached' if profile['context_cache'] else ''})")
+    return profile
+
+
+async def get_agent_profile(company_id: str) -> Dict:
+    """Compiled profile for a company, from cache when fresh"""
+    profile = _profiles.get(company_id)
+    if profile is not None and time.monotonic() - profile["built_at"] < AGENT_PROFILE_TTL_S:
+        if not session_store_is_shared() or profile["version"] == await asyncio.to_thread(_shared_version, company_id):
+            stats["hits"] += 1
+            return profile
+    stats["misses"] += 1
+
+    build = _builds.get(company_id)
+    if build is None:
+        build = asyncio.ensure_future(_build_and_store(company_id))
+        _builds[company_id] = build
+
+        def _forget(done, company_id=company_id):
+            if _builds.get(company_id) is done:
+                _builds.pop(company_id, None)
+            if not done.cancelled():
+                done.exception()  # Mark retrieved; waiters already got it
+
+        build.add_done_callback(_forget)
+    # A caller giving up (e.g. a cancelled warmup) must not cancel the build for the others
+    return await asyncio.shield(build)
+
+
+def get_cached_agent_profile(company_id: str) -> Optional[Dict]:
+    """Profile if one is cached (possibly past its TTL), without building"""
+    return _profiles.get(company_id)
+
+
+def invalidate_agent_profile(company_id: str = None):
+    """Drop the cached profile of a company (all companies when None); call after writes
+    that change its prompt, tools, files, training data or language"""
+    company_ids = [company_id] if company_id else list(_profiles)
+    for cid in company_ids:
+        _generations[cid] = _generations.get(cid, 0) + 1
+        _profiles.pop(cid, None)
+        _builds.pop(cid, None)
+        if session_store_is_shared():
+            get_session_backend().set("agent_profile_version", cid, time.time())
+    stats["invalidations"] += 1
+    print(f"🧩 AGENT PROFILE: invalidated {company_id or 'all companies'}")
+
+
+def get_agent_profile_stats() -> Dict:
+    lookups = stats["hits"] + stats["misses"]
+    now = time.monotonic()
+    return {
+        **stats,
+        "hit_ratio": round(stats["hits"] / lookups, 3) if lookups else 0.0,
+        "cached_profiles": len(_profiles),
+        "builds_in_flight": len(_builds),
+        "live_context_caches": len(_context_caches),
+        "retired_context_caches": len(_retired_caches),
+        "ttl_s": AGENT_PROFILE_TTL_S,
+        "profiles": {
+            cid: {"age_s": round(now - p["built_at"], 1), "build_s": p["build_s"], "tools": len(p["tools"]),
+                  "context_cache": p["context_cache"]}
+            for cid, p in list(_profiles.items())[-50:]
+        },
+    }
@@ -1,18 +1,16 @@
-import elevenlabs
-
+import asyncio
 import os
 import time
-from elevenlabs import ElevenLabs
 from io import BytesIO
 import wave
 from dotenv import load_dotenv
 import json
 from openai import OpenAI
+from turn_trace import trace_mark
+from audio.tts_cache import tts_cache, tts_cache_key, is_cacheable_text
 
 load_dotenv()
 
-elevenlabs = ElevenLabs(api_key=os.getenv("ELEVENLABS_API_KEY"))
-
 
 
 def pcm_to_wav_bytes(pcm_bytes, sample_rate=16000, channels=1, sampwidth=2):
@@ -26,18 +24,21 @@ def pcm_to_wav_bytes(pcm_bytes, sample_rate=16000, channels=1, sampwidth=2):
     return wav_buffer
 
 
-async def transcribe_audio_file(audio_bytes: bytes, language_code: str = "es", user_id: str = None, company_id: str = None, session_id: str = None) -> str:
-    """Transcribe audio bytes to text using ElevenLabs with language support"""
+async def transcribe_audio_file(audio_bytes: bytes, language_code: str = "es", user_id: str = None, company_id: str = None, session_id: str = None,
+                                content_type: str = None) -> str:
+    """Transcribe audio bytes to text using ElevenLabs with language support.
+    The request goes over the shared async HTTP client, so the event loop keeps serving other calls.
+    """
     try:
         print(f"🎤 STT START: Starting transcription for session {session_id}")
         print(f"🎤 STT INFO: user_id={user_id}, company_id={company_id}, language={language_code}")
         print(f"🎤 STT INFO: Audio size: {len(audio_bytes)} bytes")
         
-        from elevenlabs import ElevenLabs
-        elevenlabs = ElevenLabs(api_key=os.getenv("ELEVENLABS_API_KEY"))
-        # Convert audio bytes to a format ElevenLabs can process
-        from io import BytesIO
-        audio_data = BytesIO(audio_bytes)
+        from http_client import http_request
+        from audio.duration import audio_duration_seconds
+        api_key = os.getenv("ELEVENLABS_API_KEY")
+        if not api_key:
+            raise RuntimeError("ELEVENLABS_API_KEY not configured")
         
         # Map language codes to ElevenLabs language codes
         language_mapping = {
@@ -55,19 +56,26 @@ async def transcribe_audio_file(audio_bytes: bytes, language_code: str = "es", u
         start_time = time.time()
         
         print(f"🎤 STT PROCESSING: Calling ElevenLabs STT with model scribe_v1")
-        transcription = elevenlabs.speech_to_text.convert(
-            file=audio_data,
-            model_id="scribe_v1",
-            tag_audio_events=True,
-            language_code=elevenlabs_language,
-            diarize=False,
+        r = await http_request(
+            "elevenlabs", "POST", "https://api.elevenlabs.io/v1/speech-to-text",
+            headers={"xi-api-key": api_key},
+            data={
+                "model_id": "scribe_v1",
+                "tag_audio_events": "true",
+                "language_code": elevenlabs_language,
+                "diarize": "false",
+            },
+            files={"file": ("audio", audio_bytes, content_type or "application/octet-stream")},
         )
+        if r.status_code >= 300:
+            raise RuntimeError(f"ElevenLabs STT error {r.status_code}: {r.text[:200]}")
+        transcription_text = r.json().get("text", "")
+        print(f"⏱️ STT: ElevenLabs responded in {time.time() - start_time:.3f}s")
         
-        # Calculate approximate duration (rough estimate based on audio size)
-        # This is an approximation - for more accuracy, you'd need to analyze the actual audio
-        estimated_duration_minutes = len(audio_bytes) / (16000 * 2) / 60  # Assuming 16kHz, 16-bit audio
+        # Duration from the WAV/WebM container; raw 16 kHz 16-bit PCM is assumed otherwise
+        estimated_duration_minutes = audio_duration_seconds(audio_bytes) / 60
         print(f"🎤 STT DURATION: Estimated duration: {estimated_duration_minutes:.3f} minutes")
-        print(f"🎤 STT DURATION: Audio size: {len(audio_bytes)} bytes, Sample rate: 16kHz, Bits: 16")
+        print(f"🎤 STT DURATION: Audio size: {len(audio_bytes)} bytes")
         
         # Track usage if user info provided
         if user_id and company_id:
@@ -116,14 +124,161 @@ async def transcribe_audio_file(audio_bytes: bytes, language_code: str = "es", u
             print(f"⚠️ STT CREDITS: user_id={user_id}, company_id={company_id}")
         
         print(f"🎤 STT COMPLETE: Transcription completed successfully")
-        print(f"🎤 STT RESULT: Text length: {len(transcription.text)} characters")
-        return transcription.text
+        print(f"🎤 STT RESULT: Text length: {len(transcription_text)} characters")
+        return transcription_text
     except Exception as e:
         print(f"❌ STT ERROR: Error in transcription: {e}")
         import traceback
         traceback.print_exc()
         return ""
 
+# Language-specific ElevenLabs voices
+ELEVENLABS_VOICE_MAPPING = {
+    'es': 'Pmm5fxQ8MZkUyktbTlMv',      # Spanish voice
+    'en': '21m00Tcm4TlvDq8ikWAM',       # English voice
+    'fr': 'yoZ06aMxZJJ28mfd3POQ',       # French voice
+    'de': 'AZnzlk1XvdvUeBnXmlld',       # German voice
+    'pt': 'VR6AewLTigWG4xSOukaG',       # Portuguese voice
+    'it': 'EXAVITQu4vr4xnSDxMaL'        # Italian voice
+}
+ELEVENLABS_TTS_MODEL = "eleven_flash_v2_5"
+# 0-4, higher trades quality for time to first audio; unset keeps the API default
+ELEVENLABS_STREAMING_LATENCY = os.getenv("ELEVENLABS_STREAMING_LATENCY")
+
+
+def _elevenlabs_voice_id(language_code: str) -> str:
+    return ELEVENLABS_VOICE_MAPPING.get(language_code, ELEVENLABS_VOICE_MAPPING['es'])  # Default to Spanish
+
+
+def _elevenlabs_output_format(encoding: str = None, sample_rate: int = None) -> str:
+    """Map the encoding/sample_rate used for Deepgram onto an ElevenLabs output_format (None = MP3 default)"""
+    if encoding == "linear16":
+        return f"pcm_{sample_rate or 16000}"
+    if encoding == "mulaw":
+        return "ulaw_8000"
+    return None
+
+
+async def track_elevenlabs_tts_usage(text: str, language_code: str, voice_id: str, audio_size_bytes: int, user_id: str = None, company_id: str = None, session_id: str = None):
+    """Log ElevenLabs TTS usage and deduct credits for one synthesized reply"""
+    # Calculate usage (estimate duration based on text length)
+    # Rough estimate: 150 words per minute; words = len(text.split())
+    words = max(1, len(text.split()))
+    estimated_duration_minutes = words / 150.0  # minutes
+    print(f"🔊 TTS DURATION: Estimated duration: {estimated_duration_minutes:.3f} minutes (words={words}, wpm=150)")
+    print(f"🔊 TTS DURATION: Text length: {len(text)} chars")
+    
+    # Track usage if user info provided
+    if user_id and company_id:
+        print(f"🔊 TTS CREDITS: User and company provided, tracking usage and credits")
+        try:
+            from main import supabase
+            
+            # Track TTS usage
+            print(f"🔊 TTS USAGE TRACKING: Tracking usage in database")
+            result = supabase.rpc('track_model_usage', {
+                'p_user_id': user_id,
+                'p_company_id': company_id,
+                'p_session_id': session_id or '',
+                'p_model_type': 'tts',
+                'p_provider': 'elevenlabs',
+                'p_model_name': ELEVENLABS_TTS_MODEL,
+                'p_usage_amount': estimated_duration_minutes,
+                'p_metadata': {
+                    'text_length': len(text),
+                    'language': language_code,
+                    'voice_id': voice_id,
+                    'audio_size_bytes': audio_size_bytes,
+                    'estimated_duration_minutes': estimated_duration_minutes
+                }
+            }).execute()
+            print(f"✅ TTS USAGE TRACKING: Usage tracked successfully")
+            
+            # Also track credits using the new credit system
+            try:
+                print(f"🔊 TTS CREDIT TRACKING: Starting credit deduction")
+                from credits_helper import elevenlabs_tts_with_credits
+                credit_result = await elevenlabs_tts_with_credits(
+                    user_id, company_id, estimated_duration_minutes
+                )
+                print(f"✅ TTS CREDIT SUCCESS: Credits deducted for ElevenLabs TTS: {credit_result['credits_used']} credits")
+                print(f"✅ TTS CREDIT SUCCESS: Remaining credits: {credit_result['remaining_credits']} credits")
+            except Exception as credit_error:
+                print(f"❌ TTS CREDIT ERROR: Error processing TTS credits: {credit_error}")
+                import traceback
+                traceback.print_exc()
+            
+        except Exception as e:
+            print(f"❌ TTS TRACKING ERROR: Error tracking TTS usage: {e}")
+            import traceback
+            traceback.print_exc()
+    else:
+        print(f"⚠️ TTS CREDITS: Skipping cost tracking - missing user_id or company_id")
+        print(f"⚠️ TTS CREDITS: user_id={user_id}, company_id={company_id}")
+
+
+async def stream_audio_response_elevenlabs(text: str, language_code: str = "es", user_id: str = None, company_id: str = None, session_id: str = None, chunk_size: int = 4096,
+                                           encoding: str = None, sample_rate: int = None, optimize_streaming_latency: str = ELEVENLABS_STREAMING_LATENCY):
+    """Synthesize speech with ElevenLabs' streaming endpoint and yield audio chunks as they arrive.
+    encoding/sample_rate select the output format (linear16 → pcm_<rate>, mulaw → ulaw_8000,
+    default MP3); usage is tracked when the stream ends, also if the consumer stops early.
+    """
+    from http_client import http_stream
+
+    api_key = os.getenv("ELEVENLABS_API_KEY")
+    if not api_key:
+        raise RuntimeError("ELEVENLABS_API_KEY not configured")
+    voice_id = _elevenlabs_voice_id(language_code)
+    output_format = _elevenlabs_output_format(encoding, sample_rate)
+    print(f"🔊 TTS STREAM START: session={session_id} voice_id={voice_id} format={output_format or 'mp3'} text_length={len(text)}")
+    start_time = time.time()
+
+    cache_key = None
+    if is_cacheable_text(text):
+        cache_key = tts_cache_key("elevenlabs", f"{voice_id}/{ELEVENLABS_TTS_MODEL}", text, output_format=output_format)
+        cached = await tts_cache.get(cache_key)
+        if cached is not None:
+            trace_mark(session_id, "tts_first_byte", once=True, cached=True)
+            print(f"🗄️ TTS STREAM CACHE HIT: {len(cached)} bytes for session {session_id}")
+            for offset in range(0, len(cached), chunk_size):
+                yield cached[offset:offset + chunk_size]
+            return
+
+    url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}/stream"
+    params = {}
+    if output_format:
+        params["output_format"] = output_format
+    if optimize_streaming_latency is not None:
+        params["optimize_streaming_latency"] = optimize_streaming_latency
+    headers = {"xi-api-key": api_key, "Content-Type": "application/json"}
+    payload = {"text": text, "model_id": ELEVENLABS_TTS_MODEL}
+    total_bytes = 0
+    collected = bytearray() if cache_key else None
+    requested = False
+    try:
+        async with http_stream("elevenlabs", "POST", url, params=params, headers=headers, json=payload) as r:
+            if r.status_code >= 300:
+                body = await r.aread()
+                raise RuntimeError(f"ElevenLabs TTS error {r.status_code}: {body[:200].decode('utf-8', 'replace')}")
+            requested = True
+            async for chunk in r.aiter_bytes(chunk_size):
+                if total_bytes == 0:
+                    trace_mark(session_id, "tts_first_byte", once=True)
+                    print(f"⏱️ TTS STREAM: first audio after {time.time() - start_time:.3f}s")
+                total_bytes += len(chunk)
+                if collected is not None:
+                    collected.extend(chunk)
+                yield chunk
+        print(f"🔊 TTS STREAM COMPLETE: {total_bytes} bytes in {time.time() - start_time:.3f}s")
+        if collected:
+            await tts_cache.put(cache_key, bytes(collected))
+    finally:
+        # The provider bills the accepted request even when the consumer stopped early (barge-in,
+        # closed socket); scheduled rather than awaited since this may run during cancellation
+        if requested:
+            asyncio.create_task(track_elevenlabs_tts_usage(text, language_code, voice_id, total_bytes, user_id, company_id, session_id))
+
+
 async def synthesize_audio_response(text: str, language_code: str = "es", user_id: str = None, company_id: str = None, session_id: str = None) -> str:
     """Convert text to audio using ElevenLabs with language-specific voice and return as base64"""
     try:
@@ -133,93 +288,14 @@ async def synthesize_audio_response(text: str, language_code: str = "es", user_i
         
         import base64
         
-        # Language-specific voice mapping
-        voice_mapping = {
-            'es': 'Pmm5fxQ8MZkUyktbTlMv',      # Spanish voice
-            'en': '21m00Tcm4TlvDq8ikWAM',       # English voice
-            'fr': 'yoZ06aMxZJJ28mfd3POQ',       # French voice
-            'de': 'AZnzlk1XvdvUeBnXmlld',       # German voice
-            'pt': 'VR6AewLTigWG4xSOukaG',       # Portuguese voice
-            'it': 'EXAVITQu4vr4xnSDxMaL'        # Italian voice
-        }
-        
-        # Get voice ID for the language
-        voice_id = voice_mapping.get(language_code, 'Pmm5fxQ8MZkUyktbTlMv')  # Default to Spanish
-        model_id = "eleven_flash_v2_5"
-        
-        print(f"🔊 TTS VOICE: Using voice_id={voice_id} for language={language_code}")
-        print(f"🔊 TTS MODEL: Using model_id={model_id}")
-        
-        print(f"🔊 TTS PROCESSING: Calling ElevenLabs TTS")
-        audio = elevenlabs.text_to_speech.convert(
-            text=text,
-            voice_id=voice_id,
-            model_id=model_id
-        )
-        
-        # Convert generator to bytes if needed
-        if hasattr(audio, '__iter__') and not isinstance(audio, bytes):
-            audio_bytes = b''.join(audio)
-        else:
-            audio_bytes = audio
-        
+        # Same streaming endpoint, collected: keeps the event loop free while ElevenLabs renders
+        audio_bytes = b''.join([
+            chunk async for chunk in stream_audio_response_elevenlabs(
+                text, language_code, user_id=user_id, company_id=company_id, session_id=session_id
+            )
+        ])
         print(f"🔊 TTS AUDIO: Generated audio size: {len(audio_bytes)} bytes")
         
-        # Calculate usage (estimate duration based on text length)
-        # Rough estimate: 150 words per minute; words = len(text.split())
-        words = max(1, len(text.split()))
-        estimated_duration_minutes = words / 150.0  # minutes
-        print(f"🔊 TTS DURATION: Estimated duration: {estimated_duration_minutes:.3f} minutes (words={words}, wpm=150)")
-        print(f"🔊 TTS DURATION: Text length: {len(text)} chars")
-        
-        # Track usage if user info provided
-        if user_id and company_id:
-            print(f"🔊 TTS CREDITS: User and company provided, tracking usage and credits")
-            try:
-                from main import supabase
-                
-                # Track TTS usage
-                print(f"🔊 TTS USAGE TRACKING: Tracking usage in database")
-                result = supabase.rpc('track_model_usage', {
-                    'p_user_id': user_id,
-                    'p_company_id': company_id,
-                    'p_session_id': session_id or '',
-                    'p_model_type': 'tts',
-                    'p_provider': 'elevenlabs',
-                    'p_model_name': 'eleven_flash_v2_5',
-                    'p_usage_amount': estimated_duration_minutes,
-                    'p_metadata': {
-                        'text_length': len(text),
-                        'language': language_code,
-                        'voice_id': voice_id,
-                        'audio_size_bytes': len(audio_bytes),
-                        'estimated_duration_minutes': estimated_duration_minutes
-                    }
-                }).execute()
-                print(f"✅ TTS USAGE TRACKING: Usage tracked successfully")
-                
-                # Also track credits using the new credit system
-                try:
-                    print(f"🔊 TTS CREDIT TRACKING: Starting credit deduction")
-                    from credits_helper import elevenlabs_tts_with_credits
-                    credit_result = await elevenlabs_tts_with_credits(
-                        user_id, company_id, estimated_duration_minutes
-                    )
-                    print(f"✅ TTS CREDIT SUCCESS: Credits deducted for ElevenLabs TTS: {credit_result['credits_used']} credits")
-                    print(f"✅ TTS CREDIT SUCCESS: Remaining credits: {credit_result['remaining_credits']} credits")
-                except Exception as credit_error:
-                    print(f"❌ TTS CREDIT ERROR: Error processing TTS credits: {credit_error}")
-                    import traceback
-                    traceback.print_exc()
-                
-            except Exception as e:
-                print(f"❌ TTS TRACKING ERROR: Error tracking TTS usage: {e}")
-                import traceback
-                traceback.print_exc()
-        else:
-            print(f"⚠️ TTS CREDITS: Skipping cost tracking - missing user_id or company_id")
-            print(f"⚠️ TTS CREDITS: user_id={user_id}, company_id={company_id}")
-        
         # Convert audio to base64 for API response
         audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
         print(f"🔊 TTS COMPLETE: Audio synthesis completed successfully")
@@ -232,6 +308,100 @@ async def synthesize_audio_response(text: str, language_code: str = "es", user_i
         traceback.print_exc()
         return ""
     
+def _deepgram_tts_model_id(language_code: str) -> str:
+    # Very simple language→model mapping with safe fallback
+    # You can refine with exact Aura v2 voice ids you want to use
+    model_mapping = {
+        'es': 'aura-2-estrella-es',
+        'en': 'aura-asteria-en',
+        'fr': 'aura-asteria-fr',
+        'de': 'aura-asteria-de',
+        'pt': 'aura-asteria-pt',
+        'it': 'aura-asteria-it',
+    }
+    model_id = model_mapping.get(language_code, 'aura-asteria-en')
+    model_id = "aura-2-celeste-es"
+    return model_id
+
+
+def _deepgram_speak_request(text: str, model_id: str, **audio_options):
+    """URL, headers and JSON payload for the Deepgram Speak REST API (Aura v2).
+    audio_options (encoding, sample_rate, container, ...) are passed as query parameters.
+    """
+    api_key = os.getenv("DEEPGRAM_API_KEY")
+    if not api_key:
+        raise RuntimeError("DEEPGRAM_API_KEY not configured")
+    # Docs: POST https://api.deepgram.com/v1/speak?model={model_id}
+    url = f"https://api.deepgram.com/v1/speak?model={model_id}"
+    for name, value in audio_options.items():
+        if value is not None:
+            url += f"&{name}={value}"
+    headers = {
+        "Authorization": f"Token {api_key}",
+        "Content-Type": "application/json"
+    }
+    return url, headers, {"text": text}
+
+
+def track_deepgram_tts_usage(text: str, language_code: str, model_id: str, audio_size_bytes: int, user_id: str = None, company_id: str = None, session_id: str = None):
+    """Log Deepgram TTS telemetry and schedule the credit deduction for one synthesized reply"""
+    # Estimate duration (same heuristic as ElevenLabs path): words/150 minutes
+    words = max(1, len(text.split()))
+    estimated_duration_minutes = words / 150.0
+    print(f"🔊 DG TTS DURATION: Estimated duration: {estimated_duration_minutes:.3f} minutes (words={words}, wpm=150)")
+    
+    # Telemetry (awaited inline)
+    if user_id and company_id:
+        print(f"🔊 DG TTS CREDITS: User and company provided, tracking usage and scheduling deduction")
+        try:
+            from main import supabase
+            print("🔊 DG TTS USAGE TRACKING: Tracking usage in database")
+            supabase.rpc('track_model_usage', {
+                'p_user_id': user_id,
+                'p_company_id': company_id,
+                'p_session_id': session_id or '',
+                'p_model_type': 'tts',
+                'p_provider': 'deepgram',
+                'p_model_name': 'aura_v2',
+                'p_usage_amount': estimated_duration_minutes,
+                'p_metadata': {
+                    'text_length': len(text),
+                    'language': language_code,
+                    'model_id': model_id,
+                    'audio_size_bytes': audio_size_bytes,
+                    'estimated_duration_minutes': estimated_duration_minutes
+                }
+            }).execute()
+            print("✅ DG TTS USAGE TRACKING: Usage tracked successfully")
+
+            # Credit deduction (non-blocking), service_type configurable via credit_costs
+            try:
+                import asyncio
+                from credits_helper import check_and_use_credits
+                from credits_helper import _round_up_tenth
+                billed_minutes = _round_up_tenth(estimated_duration_minutes)
+                print(f"💰 DG TTS BILLING: Raw minutes={estimated_duration_minutes:.3f}, Billed minutes={billed_minutes:.1f}")
+                async def _deduct_dg_tts():
+                    try:
+                        result = await check_and_use_credits(
+                            user_id, company_id, 'deepgram_aura_v2_tts', billed_minutes,
+                            f"Deepgram Aura v2 TTS ({estimated_duration_minutes:.2f} minutes → billed {billed_minutes:.1f}m)"
+                        )
+                        print(f"✅ DG TTS CREDIT SUCCESS: Credits deducted: {result['credits_used']} | Remaining: {result['remaining_credits']}")
+                    except Exception as ex:
+                        print(f"❌ DG TTS CREDIT ERROR: {ex}")
+                        import traceback; traceback.print_exc()
+                asyncio.create_task(_deduct_dg_tts())
+            except Exception as credit_schedule_error:
+                print(f"❌ DG TTS CREDIT ERROR: Failed to schedule credit deduction: {credit_schedule_error}")
+                import traceback; traceback.print_exc()
+        except Exception as e:
+            print(f"❌ DG TTS TRACKING ERROR: {e}")
+            import traceback; traceback.print_exc()
+    else:
+        print(f"⚠️ DG TTS CREDITS: Skipping cost tracking - missing user_id or company_id (user_id={user_id}, company_id={company_id})")
+
+
 async def synthesize_audio_response_deepgram(text: str, language_code: str = "es", user_id: str = None, company_id: str = None, session_id: str = None) -> str:
     """Synthesize speech with Deepgram Aura v2 and return base64 audio.
     Mirrors synthesize_audio_response (ElevenLabs) behavior: logs telemetry and deducts credits in background.
@@ -242,97 +412,31 @@ async def synthesize_audio_response_deepgram(text: str, language_code: str = "es
         print(f"🔊 DG TTS INFO: Text length: {len(text)} characters")
 
         import base64
-        import os
-        import requests
-        
-        api_key = os.getenv("DEEPGRAM_API_KEY")
-        if not api_key:
-            raise RuntimeError("DEEPGRAM_API_KEY not configured")
+        from http_client import http_request
         
-        # Very simple language→model mapping with safe fallback
-        # You can refine with exact Aura v2 voice ids you want to use
-        model_mapping = {
-            'es': 'aura-2-estrella-es',
-            'en': 'aura-asteria-en',
-            'fr': 'aura-asteria-fr',
-            'de': 'aura-asteria-de',
-            'pt': 'aura-asteria-pt',
-            'it': 'aura-asteria-it',
-        }
-        model_id = model_mapping.get(language_code, 'aura-asteria-en')
-        model_id = "aura-2-celeste-es"
+        model_id = _deepgram_tts_model_id(language_code)
         print(f"🔊 DG TTS MODEL: Using model_id={model_id}")
         
-        # Call Deepgram Speak API (Aura v2)
-        # Docs: POST https://api.deepgram.com/v1/speak?model={model_id}
-        url = f"https://api.deepgram.com/v1/speak?model={model_id}"
-        headers = {
-            "Authorization": f"Token {api_key}",
-            "Content-Type": "application/json"
-        }
-        payload = {"text": text}
+        cache_key = tts_cache_key("deepgram", model_id, text) if is_cacheable_text(text) else None
+        if cache_key:
+            cached = await tts_cache.get(cache_key)
+            if cached is not None:
+                trace_mark(session_id, "tts_first_byte", once=True, cached=True)
+                print(f"🗄️ DG TTS CACHE HIT: {len(cached)} bytes for session {session_id}")
+                return base64.b64encode(cached).decode('utf-8')
+        
+        url, headers, payload = _deepgram_speak_request(text, model_id)
         print("🔊 DG TTS PROCESSING: Calling Deepgram Speak API")
-        r = requests.post(url, headers=headers, json=payload, timeout=60)
+        r = await http_request("deepgram", "POST", url, headers=headers, json=payload)
         if r.status_code >= 300:
             raise RuntimeError(f"Deepgram Speak error {r.status_code}: {r.text[:200]}")
         audio_bytes = r.content
+        trace_mark(session_id, "tts_first_byte", once=True)
         print(f"🔊 DG TTS AUDIO: Generated audio size: {len(audio_bytes)} bytes")
+        if cache_key:
+            await tts_cache.put(cache_key, audio_bytes)
         
-        # Estimate duration (same heuristic as ElevenLabs path): words/150 minutes
-        words = max(1, len(text.split()))
-        estimated_duration_minutes = words / 150.0
-        print(f"🔊 DG TTS DURATION: Estimated duration: {estimated_duration_minutes:.3f} minutes (words={words}, wpm=150)")
-        
-        # Telemetry (awaited inline)
-        if user_id and company_id:
-            print(f"🔊 DG TTS CREDITS: User and company provided, tracking usage and scheduling deduction")
-            try:
-                from main import supabase
-                print("🔊 DG TTS USAGE TRACKING: Tracking usage in database")
-                supabase.rpc('track_model_usage', {
-                    'p_user_id': user_id,
-                    'p_company_id': company_id,
-                    'p_session_id': session_id or '',
-                    'p_model_type': 'tts',
-                    'p_provider': 'deepgram',
-                    'p_model_name': 'aura_v2',
-                    'p_usage_amount': estimated_duration_minutes,
-                    'p_metadata': {
-                        'text_length': len(text),
-                        'language': language_code,
-                        'model_id': model_id,
-                        'audio_size_bytes': len(audio_bytes),
-                        'estimated_duration_minutes': estimated_duration_minutes
-                    }
-                }).execute()
-                print("✅ DG TTS USAGE TRACKING: Usage tracked successfully")
-
-                # Credit deduction (non-blocking), service_type configurable via credit_costs
-                try:
-                    import asyncio
-                    from credits_helper import check_and_use_credits
-                    from credits_helper import _round_up_tenth
-                    billed_minutes = _round_up_tenth(estimated_duration_minutes)
-                    print(f"💰 DG TTS BILLING: Raw minutes={estimated_duration_minutes:.3f}, Billed minutes={billed_minutes:.1f}")
-                    async def _deduct_dg_tts():
-                        try:
-                            result = await check_and_use_credits(
-                                user_id, company_id, 'deepgram_aura_v2_tts', billed_minutes,
-                                f"Deepgram Aura v2 TTS ({estimated_duration_minutes:.2f} minutes → billed {billed_minutes:.1f}m)"
-                            )
-                            print(f"✅ DG TTS CREDIT SUCCESS: Credits deducted: {result['credits_used']} | Remaining: {result['remaining_credits']}")
-                        except Exception as ex:
-                            print(f"❌ DG TTS CREDIT ERROR: {ex}")
-                            import traceback; traceback.print_exc()
-                    asyncio.create_task(_deduct_dg_tts())
-                except Exception as credit_schedule_error:
-                    print(f"❌ DG TTS CREDIT ERROR: Failed to schedule credit deduction: {credit_schedule_error}")
-                    import traceback; traceback.print_exc()
-            except Exception as e:
-                print(f"❌ DG TTS TRACKING ERROR: {e}")
-                import traceback; traceback.print_exc()
-        else:
-            print(f"⚠️ DG TTS CREDITS: Skipping cost tracking - missing user_id or company_id (user_id={user_id}, company_id={company_id})")
+        track_deepgram_tts_usage(text, language_code, model_id, len(audio_bytes), user_id, company_id, session_id)
         
         # Return base64 audio
         audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
@@ -344,6 +448,68 @@ async def synthesize_audio_response_deepgram(text: str, language_code: str = "es
         return ""
 
 
+async def stream_audio_response_deepgram(text: str, language_code: str = "es", user_id: str = None, company_id: str = None, session_id: str = None, chunk_size: int = 8192,
+                                         encoding: str = None, sample_rate: int = None, container: str = None):
+    """Synthesize speech with Deepgram Aura v2 and yield raw audio chunks as they arrive.
+    Nothing is buffered or base64-encoded; usage is tracked when the stream ends, also if the consumer stops early.
+    encoding/sample_rate/container default to Deepgram's MP3; telephony asks for mulaw/8000/none.
+    """
+    from http_client import http_stream
+
+    print(f"🔊 DG TTS STREAM START: session={session_id} text_length={len(text)}")
+    model_id = _deepgram_tts_model_id(language_code)
+    start_time = time.time()
+    cache_key = None
+    if is_cacheable_text(text):
+        cache_key = tts_cache_key("deepgram", model_id, text, encoding=encoding, sample_rate=sample_rate, container=container)
+        cached = await tts_cache.get(cache_key)
+        if cached is not None:
+            trace_mark(session_id, "tts_first_byte", once=True, cached=True)
+            print(f"🗄️ DG TTS STREAM CACHE HIT: {len(cached)} bytes for session {session_id}")
+            for offset in range(0, len(cached), chunk_size):
+                yield cached[offset:offset + chunk_size]
+            return
+    url, headers, payload = _deepgram_speak_request(text, model_id, encoding=encoding, sample_rate=sample_rate, container=container)
+    total_bytes = 0
+    collected = bytearray() if cache_key else None
+    requested = False
+    try:
+        async with http_stream("deepgram", "POST", url, headers=headers, json=payload) as r:
+            if r.status_code >= 300:
+                body = await r.aread()
+                raise RuntimeError(f"Deepgram Speak error {r.status_code}: {body[:200].decode('utf-8', 'replace')}")
+            requested = True
+            async for chunk in r.aiter_bytes(chunk_size):
+                if total_bytes == 0:
+                    trace_mark(session_id, "tts_first_byte", once=True)
+                    print(f"⏱️ DG TTS STREAM: first audio after {time.time() - start_time:.3f}s")
+                total_bytes += len(chunk)
+                if collected is not None:
+                    collected.extend(chunk)
+                yield chunk
+        print(f"🔊 DG TTS STREAM COMPLETE: {total_bytes} bytes in {time.time() - start_time:.3f}s")
+        if collected:
+            await tts_cache.put(cache_key, bytes(collected))
+    finally:
+        # Billed even when the consumer stopped early (barge-in, closed socket): the request was made
+        if requested:
+            track_deepgram_tts_usage(text, language_code, model_id, total_bytes, user_id, company_id, session_id)
+
+
+async def stream_audio_response(text: str, language_code: str = "es", user_id: str = None, company_id: str = None, session_id: str = None,
+                                provider: str = "deepgram", encoding: str = None, sample_rate: int = None):
+    """Yield TTS audio chunks from the given provider ("deepgram" or "elevenlabs") as they arrive"""
+    if provider == "elevenlabs":
+        stream = stream_audio_response_elevenlabs(text, language_code, user_id=user_id, company_id=company_id, session_id=session_id,
+                                                  encoding=encoding, sample_rate=sample_rate)
+    else:
+        container = "none" if encoding in ("linear16", "mulaw") else None
+        stream = stream_audio_response_deepgram(text, language_code, user_id=user_id, company_id=company_id, session_id=session_id,
+                                                encoding=encoding, sample_rate=sample_rate, container=container)
+    async for chunk in stream:
+        yield chunk
+
+
 async def choose_model_for_tts(model:str, text:str, language_code:str, user_id:str, company_id:str, session_id:str):
     if model == "elevenlabs_flash_v2_5":
         return await synthesize_audio_response(text, language_code="es", user_id=user_id, company_id=company_id, session_id=session_id)
@@ -0,0 +1,109 @@
+import struct
+from typing import Optional
+
+# Duration of uploaded audio, read from the container instead of assuming raw 16 kHz PCM.
+# WAV: byte rate from the fmt chunk and the data chunk size.
+# WebM/Matroska: Segment Info Duration × TimecodeScale; browser recordings (MediaRecorder)
+# usually omit Duration, so the last cluster/block timecode is used instead.
+
+_EBML_HEADER = 0x1A45DFA3
+_SEGMENT = 0x18538067
+_INFO = 0x1549A966
+_CLUSTER = 0x1F43B675
+_TIMECODE_SCALE = 0x2AD7B1
+_DURATION = 0x4489
+_CLUSTER_TIMECODE = 0xE7
+_SIMPLE_BLOCK = 0xA3
+_BLOCK_GROUP = 0xA0
+_BLOCK = 0xA1
+# Master elements we descend into; everything else is skipped by size
+_WEBM_MASTERS = {_SEGMENT, _INFO, _CLUSTER, _BLOCK_GROUP}
+
+
+def wav_duration_seconds(data: bytes) -> Optional[float]:
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+    byte_rate = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        chunk_size = struct.unpack_from("<I", data, offset + 4)[0]
+        body = offset + 8
+        if chunk_id == b"fmt " and chunk_size >= 16:
+            byte_rate = struct.unpack_from("<I", data, body + 8)[0]
+        elif chunk_id == b"data" and byte_rate:
+            # Streamed WAVs may carry a placeholder size; trust the bytes we actually have
+            available = len(data) - body
+            if chunk_size in (0, 0xFFFFFFFF) or chunk_size > available:
+                chunk_size = available
+            return chunk_size / byte_rate
+        offset = body + chunk_size + (chunk_size & 1)
+    return None
+
+
+def _read_vint(data: bytes, offset: int, keep_marker: bool):
+    """EBML variable-length integer: returns (value, length); IDs keep their marker bit"""
+    first = data[offset]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        mask >>= 1
+        length += 1
+    if length > 8 or offset + length > len(data):
+        raise ValueError("invalid EBML vint")
+    value = first if keep_marker else first & (mask - 1)
+    for byte in data[offset + 1:offset + length]:
+        value = (value << 8) | byte
+    unknown = not keep_marker and value == (1 << (7 * length)) - 1
+    return (None if unknown else value), length
+
+
+def webm_duration_seconds(data: bytes) -> Optional[float]:
+    if len(data) < 4 or struct.unpack_from(">I", data, 0)[0] != _EBML_HEADER:
+        return None
+    timecode_scale = 1_000_000  # ns per tick (Matroska default)
+    duration_ticks = None
+    cluster_timecode = 0
+    last_timecode = None
+    offset = 0
+    try:
+        while offset < len(data):
+            element_id, id_len = _read_vint(data, offset, keep_marker=True)
+            size, size_len = _read_vint(data, offset + id_len, keep_marker=False)
+            body = offset + id_len + size_len
+            if element_id in _WEBM_MASTERS:
+                # Walk children in place (also handles unknown-size live-recording elements)
+                offset = body
+                continue
+            if size is None or body + size > len(data):
+                break
+            payload = data[body:body + size]
+            if element_id == _TIMECODE_SCALE:
+                timecode_scale = int.from_bytes(payload, "big")
+            elif element_id == _DURATION:
+                duration_ticks = struct.unpack(">f" if size == 4 else ">d", payload)[0]
+            elif element_id == _CLUSTER_TIMECODE:
+                cluster_timecode = int.from_bytes(payload, "big")
+                last_timecode = max(last_timecode or 0, cluster_timecode)
+            elif element_id in (_SIMPLE_BLOCK, _BLOCK) and size >= 4:
+                _, track_len = _read_vint(payload, 0, keep_marker=False)
+                relative = struct.unpack_from(">h", payload, track_len)[0]
+                last_timecode = max(last_timecode or 0, cluster_timecode + relative)
+            offset = body + size
+    except (ValueError, IndexError, struct.error):
+        pass
+    if duration_ticks:
+        return duration_ticks * timecode_scale / 1e9
+    if last_timecode is not None:
+        return last_timecode * timecode_scale / 1e9
+    return None
+
+
+def audio_duration_seconds(data: bytes, assumed_pcm_rate: int = 16000) -> float:
+    """Best-effort duration: container headers when recognized, else raw 16-bit PCM at assumed_pcm_rate"""
+    duration = wav_duration_seconds(data)
+    if duration is None:
+        duration = webm_duration_seconds(data)
+    if duration is None:
+        duration = len(data) / (assumed_pcm_rate * 2)
+    return duration
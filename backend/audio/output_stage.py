@@ -0,0 +1,238 @@
+import asyncio
+import os
+import threading
+import time
+from typing import AsyncIterator, Dict, Optional
+
+# Defaults for the TTS output path (see AudioOutputStage)
+TTS_OUTPUT_FRAME_MS = int(os.getenv("TTS_OUTPUT_FRAME_MS", "40"))
+TTS_OUTPUT_MAX_BUFFER_MS = int(os.getenv("TTS_OUTPUT_MAX_BUFFER_MS", "10000"))
+TTS_OUTPUT_PACE = os.getenv("TTS_OUTPUT_PACE", "false").lower() in ("1", "true", "yes")
+# With pacing on, how far ahead of real time frames may be sent (client jitter buffer)
+TTS_OUTPUT_PACE_LEAD_MS = int(os.getenv("TTS_OUTPUT_PACE_LEAD_MS", "300"))
+# How long a producer thread may block on a full buffer before the oldest audio is dropped
+TTS_OUTPUT_BLOCK_TIMEOUT_S = float(os.getenv("TTS_OUTPUT_BLOCK_TIMEOUT_S", "2"))
+# Frame size for compressed encodings (mp3, opus...), where duration cannot be derived from bytes
+COMPRESSED_FRAME_BYTES = 4096
+
+PCM_BYTES_PER_SAMPLE = {"linear16": 2, "mulaw": 1, "alaw": 1}
+
+
+class AudioOutputStage:
+    """Bounded audio buffer between a TTS provider and a client socket.
+
+    Producers append raw chunks of any size: push() from a provider SDK thread or put() from
+    the event loop. The consumer iterates frames(), which yields fixed-duration frames
+    (frame_ms of audio) plus the partial tail once the stream goes idle or is flushed.
+    - Handoff: a producer thread only schedules a wake-up when the consumer is waiting, not
+      once per chunk.
+    - Backpressure: the buffer holds at most max_buffer_ms of audio. A blocking producer waits
+      for room (up to block_timeout_s); after that, or with block=False, the oldest audio is
+      dropped.
+    - clear() drops everything buffered (barge-in); flush() emits the partial tail right away.
+    - pace=True sends frames at real-time rate, at most pace_lead_ms ahead of playback.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, sample_rate: int = 16000, encoding: str = "linear16",
+                 frame_ms: int = TTS_OUTPUT_FRAME_MS, max_buffer_ms: int = TTS_OUTPUT_MAX_BUFFER_MS,
+                 pace: bool = TTS_OUTPUT_PACE, pace_lead_ms: int = TTS_OUTPUT_PACE_LEAD_MS,
+                 block: bool = True, block_timeout_s: float = TTS_OUTPUT_BLOCK_TIMEOUT_S, label: str = ""):
+        self._loop = loop
+        self.label = label
+        bytes_per_sample = PCM_BYTES_PER_SAMPLE.get(encoding)
+        if bytes_per_sample:
+            self.bytes_per_second = sample_rate * bytes_per_sample
+            self.frame_bytes = max(bytes_per_sample, self.bytes_per_second * frame_ms // 1000 // bytes_per_sample * bytes_per_sample)
+            self.max_bytes = max(self.frame_bytes, self.bytes_per_second * max_buffer_ms // 1000)
+            self.sample_bytes = bytes_per_sample
+        else:
+            # Compressed audio: byte-sized frames, a byte budget instead of a duration, no pacing
+            self.bytes_per_second = None
+            self.frame_bytes = COMPRESSED_FRAME_BYTES
+            self.max_bytes = COMPRESSED_FRAME_BYTES * 64
+            self.sample_bytes = 1
+            pace = False
+        self.frame_s = frame_ms / 1000.0
+        self.pace = pace
+        self.pace_lead_s = pace_lead_ms / 1000.0
+        self.block = block
+        self.block_timeout_s = block_timeout_s
+
+        self._buffer = bytearray()
+        self._cond = threading.Condition()
+        self._data_ready = asyncio.Event()
+        self._space_ready = asyncio.Event()
+        self._consumer_waiting = False
+        self._wake_scheduled = False
+        self._flush_requested = False
+        self._ended = False
+        self._closed = False
+        self._pace_origin: Optional[float] = None
+        self._paced_s = 0.0
+        self.stats = {"bytes_in": 0, "frames_out": 0, "bytes_dropped": 0, "max_buffered": 0}
+
+    # ----- producer side -----
+
+    def push(self, data: bytes):
+        """Append audio from any thread other than the event loop's"""
+        if not data:
+            return
+        with self._cond:
+            if self._closed:
+                return
+            if self.block and len(self._buffer) + len(data) > self.max_bytes:
+                self._cond.wait_for(lambda: self._closed or len(self._buffer) + len(data) <= self.max_bytes,
+                                    timeout=self.block_timeout_s)
+                if self._closed:
+                    return
+            self._append_locked(data)
+            wake = self._consumer_waiting and not self._wake_scheduled
+            if wake:
+                self._wake_scheduled = True
+        if wake:
+            try:
+                self._loop.call_soon_threadsafe(self._data_ready.set)
+            except RuntimeError:
+                pass  # Event loop already closed
+
+    async def put(self, data: bytes):
+        """Append audio from the event loop, waiting for room when the buffer is full"""
+        if not data:
+            return
+        while self.block and not self._closed:
+            with self._cond:
+                if len(self._buffer) + len(data) <= self.max_bytes or not self._buffer:
+                    break
+                self._space_ready.clear()
+            await self._space_ready.wait()
+        with self._cond:
+            if self._closed:
+                return
+            self._append_locked(data)
+        self._data_ready.set()
+
+    def flush(self):
+        """Emit the buffered partial frame without waiting for more audio (thread-safe)"""
+        self._signal(flush=True)
+
+    def end(self):
+        """No more audio: frames() drains what is buffered and stops (thread-safe)"""
+        self._signal(end=True)
+
+    def clear(self) -> int:
+        """Drop all buffered audio, e.g. on barge-in; returns the number of bytes dropped"""
+        with self._cond:
+            dropped = len(self._buffer)
+            self._buffer.clear()
+            self.stats["bytes_dropped"] += dropped
+            self._pace_origin = None
+            self._cond.notify_all()
+        self._wake_loop(self._space_ready)
+        return dropped
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._buffer.clear()
+            self._cond.notify_all()
+        self._wake_loop(self._data_ready)
+        self._wake_loop(self._space_ready)
+
+    # ----- consumer side -----
+
+    def buffered_bytes(self) -> int:
+        return len(self._buffer)
+
+    def buffered_seconds(self) -> float:
+        return len(self._buffer) / self.bytes_per_second if self.bytes_per_second else 0.0
+
+    async def frames(self) -> AsyncIterator[bytes]:
+        """Yield coalesced frames until end() (after draining) or close()"""
+        while True:
+            frame = self._take_frame()
+            if frame is None:
+                if self._closed or (self._ended and not self._buffer):
+                    return
+                with self._cond:
+                    self._consumer_waiting = True
+                    self._wake_scheduled = False
+                    self._data_ready.clear()
+                    ready = bool(self._buffer) and (len(self._buffer) >= self.frame_bytes or self._flush_requested or self._ended)
+                if not ready:
+                    try:
+                        # A partial frame is sent once no new audio arrived for two frame durations
+                        await asyncio.wait_for(self._data_ready.wait(), timeout=self.frame_s * 2 if self._buffer else None)
+                    except asyncio.TimeoutError:
+                        self._flush_requested = True
+                self._consumer_waiting = False
+                continue
+            if self.pace:
+                await self._pace(len(frame))
+            self.stats["frames_out"] += 1
+            yield frame
+
+    def snapshot(self) -> Dict:
+        return {**self.stats, "buffered_bytes": len(self._buffer), "frame_bytes": self.frame_bytes}
+
+    # ----- internals -----
+
+    def _append_locked(self, data: bytes):
+        self._buffer.extend(data)
+        self.stats["bytes_in"] += len(data)
+        overflow = len(self._buffer) - self.max_bytes
+        if overflow > 0:
+            # Drop whole samples from the front: the oldest audio is the least useful
+            overflow += (-overflow) % self.sample_bytes
+            del self._buffer[:overflow]
+            self.stats["bytes_dropped"] += overflow
+            print(f"⚠️ AUDIO OUTPUT {self.label}: buffer full, dropped {overflow} bytes")
+        self.stats["max_buffered"] = max(self.stats["max_buffered"], len(self._buffer))
+
+    def _take_frame(self) -> Optional[bytes]:
+        with self._cond:
+            if len(self._buffer) >= self.frame_bytes:
+                size = self.frame_bytes
+            elif self._buffer and (self._flush_requested or self._ended):
+                size = len(self._buffer) - len(self._buffer) % self.sample_bytes or len(self._buffer)
+            else:
+                if not self._buffer:
+                    self._flush_requested = False
+                return None
+            frame = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            if not self._buffer:
+                self._flush_requested = False
+            self._cond.notify_all()
+        self._space_ready.set()
+        return frame
+
+    async def _pace(self, frame_len: int):
+        now = time.monotonic()
+        if self._pace_origin is None or now > self._pace_origin + self._paced_s:
+            # First frame, or playback already caught up with us: restart the clock
+            self._pace_origin, self._paced_s = now, 0.0
+        ahead = (self._pace_origin + self._paced_s) - now
+        if ahead > self.pace_lead_s:
+            await asyncio.sleep(ahead - self.pace_lead_s)
+        self._paced_s += frame_len / self.bytes_per_second
+
+    def _signal(self, flush: bool = False, end: bool = False):
+        with self._cond:
+            if flush:
+                self._flush_requested = True
+            if end:
+                self._ended = True
+        self._wake_loop(self._data_ready)
+
+    def _wake_loop(self, event: asyncio.Event):
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            event.set()
+            return
+        try:
+            self._loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            pass  # Event loop already closed
@@ -0,0 +1,112 @@
+import numpy as np
+
+# Twilio Media Streams carry G.711 μ-law, mono, 8 kHz
+TWILIO_SAMPLE_RATE = 8000
+
+# Encoder constants in the 14-bit domain used by the G.711 reference implementation
+_MULAW_BIAS = 0x21
+_MULAW_CLIP = 8159
+_MULAW_SEGMENT_ENDS = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF])
+
+
+def _build_mulaw_decode_table() -> np.ndarray:
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    sign = codes & 0x80
+    exponent = (codes >> 4) & 0x07
+    mantissa = codes & 0x0F
+    magnitude = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    return np.where(sign != 0, -magnitude, magnitude).astype(np.int16)
+
+
+_MULAW_DECODE_TABLE = _build_mulaw_decode_table()
+
+
+def mulaw_to_pcm16(data: bytes) -> bytes:
+    """Decode μ-law bytes to 16-bit little-endian PCM (table lookup, no Python loop)"""
+    codes = np.frombuffer(data, dtype=np.uint8)
+    return _MULAW_DECODE_TABLE[codes].astype("<i2").tobytes()
+
+
+def pcm16_to_mulaw(data: bytes) -> bytes:
+    """Encode 16-bit little-endian PCM to μ-law bytes (same output as the G.711 reference coder)"""
+    samples = np.frombuffer(data, dtype="<i2").astype(np.int32) >> 2
+    negative = samples < 0
+    magnitude = np.minimum(np.where(negative, -samples, samples), _MULAW_CLIP) + _MULAW_BIAS
+    segment = np.searchsorted(_MULAW_SEGMENT_ENDS, magnitude)
+    value = np.where(segment >= 8, 0x7F, (np.minimum(segment, 7) << 4) | ((magnitude >> (np.minimum(segment, 7) + 1)) & 0x0F))
+    return (value ^ np.where(negative, 0x7F, 0xFF)).astype(np.uint8).tobytes()
+
+
+def resample_pcm16(data: bytes, src_rate: int, dst_rate: int) -> bytes:
+    """Linear-interpolation resample of one whole buffer of mono 16-bit PCM (streams: PCM16Resampler)"""
+    if src_rate == dst_rate or not data:
+        return data
+    samples = np.frombuffer(data, dtype="<i2").astype(np.float32)
+    count = int(len(samples) * dst_rate / src_rate)
+    if count == 0:
+        return b""
+    positions = np.arange(count, dtype=np.float32) * (src_rate / dst_rate)
+    resampled = np.interp(positions, np.arange(len(samples), dtype=np.float32), samples)
+    return np.clip(np.round(resampled), -32768, 32767).astype("<i2").tobytes()
+
+
+class PCM16Resampler:
+    """Linear-interpolation resampler for a chunked mono 16-bit PCM stream.
+
+    The fractional read position and the previous chunk's last sample carry over between calls,
+    so chunk boundaries neither drop samples nor reset the interpolation phase.
+    """
+
+    def __init__(self, src_rate: int, dst_rate: int):
+        self.step = src_rate / dst_rate
+        self._position = 0.0  # Next output position, relative to the first sample of the next buffer
+        self._last: "np.ndarray | None" = None
+
+    def process(self, data: bytes) -> bytes:
+        if not data:
+            return b""
+        samples = np.frombuffer(data, dtype="<i2").astype(np.float64)
+        if self._last is not None:
+            samples = np.concatenate((self._last, samples))
+        end = len(samples) - 1
+        count = int(np.floor((end - self._position) / self.step)) + 1 if end >= self._position else 0
+        positions = self._position + np.arange(count, dtype=np.float64) * self.step
+        resampled = np.interp(positions, np.arange(len(samples), dtype=np.float64), samples)
+        # The last sample is kept as index 0 of the next buffer
+        self._position += count * self.step - end
+        self._last = samples[-1:]
+        return np.clip(np.round(resampled), -32768, 32767).astype("<i2").tobytes()
+
+
+class MulawTranscoder:
+    """Turn a TTS audio stream into Twilio-ready μ-law 8 kHz.
+
+    μ-law 8 kHz input passes through untouched. Linear16 input (any rate) is resampled and
+    encoded; an odd trailing byte is carried over to the next chunk so samples never split, and
+    the resampler keeps its phase across chunks.
+    """
+
+    def __init__(self, encoding: str = "mulaw", sample_rate: int = TWILIO_SAMPLE_RATE):
+        self.encoding = encoding
+        self.sample_rate = sample_rate
+        self._carry = b""
+        self._resampler = PCM16Resampler(sample_rate, TWILIO_SAMPLE_RATE) if sample_rate != TWILIO_SAMPLE_RATE else None
+
+    @property
+    def passthrough(self) -> bool:
+        return self.encoding == "mulaw" and self.sample_rate == TWILIO_SAMPLE_RATE
+
+    def convert(self, chunk: bytes) -> bytes:
+        if self.passthrough:
+            return chunk
+        if self.encoding == "mulaw":
+            chunk = mulaw_to_pcm16(chunk)
+        elif self.encoding != "linear16":
+            raise ValueError(f"Unsupported TTS encoding for telephony: {self.encoding}")
+        data = self._carry + chunk
+        usable = len(data) - (len(data) % 2)
+        self._carry = data[usable:]
+        pcm = data[:usable]
+        if self._resampler is not None:
+            pcm = self._resampler.process(pcm)
+        return pcm16_to_mulaw(pcm)
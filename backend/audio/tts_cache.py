@@ -0,0 +1,72 @@
+import asyncio
+import hashlib
+import os
+import re
+from typing import Dict, Optional
+
+from tiered_cache import TieredLRUCache
+
+# Synthesized audio, keyed by provider + voice/model + audio format + normalized text.
+# Replies like the fallback "He procesado tu solicitud.", error messages, greetings and
+# confirmations repeat verbatim; a hit is served without a provider round trip or credits.
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+TTS_CACHE_MEMORY_BYTES = int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+# On-disk tier is optional: set TTS_CACHE_DIR to enable it
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "")
+TTS_CACHE_DISK_BYTES = int(os.getenv("TTS_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+# Long replies almost never repeat; caching them would only push the short, common ones out
+TTS_CACHE_MAX_TEXT_CHARS = int(os.getenv("TTS_CACHE_MAX_TEXT_CHARS", "300"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_tts_text(text: str) -> str:
+    # Case and punctuation change the prosody, so only whitespace is normalized
+    return _WHITESPACE.sub(" ", text or "").strip()
+
+
+def is_cacheable_text(text: str) -> bool:
+    normalized = normalize_tts_text(text)
+    return TTS_CACHE_ENABLED and 0 < len(normalized) <= TTS_CACHE_MAX_TEXT_CHARS
+
+
+def tts_cache_key(provider: str, voice: str, text: str, **audio_options) -> str:
+    options = ",".join(f"{k}={v}" for k, v in sorted(audio_options.items()) if v is not None)
+    raw = "\x1f".join([provider, voice, options, normalize_tts_text(text)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """Two-tier LRU cache of synthesized audio: memory (byte budget) and optional disk (size budget)"""
+
+    def __init__(self, memory_bytes: int = TTS_CACHE_MEMORY_BYTES, disk_dir: str = TTS_CACHE_DIR,
+                 disk_bytes: int = TTS_CACHE_DISK_BYTES):
+        self._store = TieredLRUCache("TTS CACHE", memory_bytes, disk_dir=disk_dir, disk_bytes=disk_bytes, suffix=".audio")
+        self._bytes_saved = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        audio = self._store.get_memory(key)
+        if audio is None and self._store.on_disk(key):
+            audio = await asyncio.to_thread(self._store.get_disk, key)
+        if audio is None:
+            self._store.record_miss()
+            return None
+        self._bytes_saved += len(audio)
+        return audio
+
+    async def put(self, key: str, audio: bytes):
+        if not audio:
+            return
+        self._store.put_memory(key, audio, len(audio))
+        if self._store.disk_dir:
+            await asyncio.to_thread(self._store.write_disk, key, audio, audio)
+
+    def snapshot(self) -> Dict:
+        return {**self._store.snapshot(), "bytes_saved": self._bytes_saved}
+
+
+tts_cache = TTSCache()
+
+
+def get_tts_cache_stats() -> Dict:
+    return tts_cache.snapshot()
@@ -3,8 +3,9 @@ from supabase import create_client, Client
 import os   
 from dotenv import load_dotenv
 import uuid
+import asyncio
 import google.generativeai as genai
-from tools import get_system_prompt, search_company_documents, format_rag_context, get_company_documents_from_storage
+from tools import get_system_prompt, search_company_documents, format_rag_context
 from session_data import session_metadata
 from company.storage.storage import store_message_in_history_helper
 from manage_tools.manage_tools import dispatch_tool_with_router
@@ -45,7 +46,8 @@ async def get_system_prompt_with_training(company_id: str):
     """Get the system prompt for the company, incorporating training data if available."""
     try:
         print(f"💬 Fetching system prompt for company {company_id} with training data...")
-        system_prompt = get_system_prompt(company_id)
+        # Blocking (document download + PDF parse): keep it off the event loop
+        system_prompt = await asyncio.to_thread(get_system_prompt, company_id)
         
         # If training session is active, append training data
         if is_training_session(company_id):
@@ -85,6 +87,8 @@ async def chatbot_start_session_helper(company_id: str, mode: str = "text", user
             "created_at": datetime.utcnow().isoformat()
         }
         
+        from session_lifecycle import touch_session
+        touch_session(session_id)
         print(f"✅ Created session: {session_id} with user_id: {user_id}")
         
         # Pre-warm the chat session in the background (non-blocking)
@@ -96,7 +100,6 @@ async def chatbot_start_session_helper(company_id: str, mode: str = "text", user
                 print(f"❌ Error in background pre-warming: {e}")
         
         # Start pre-warming in background (don't await)
-        import asyncio
         asyncio.create_task(pre_warm_background())
         
         return {"session_id": session_id}
@@ -140,7 +143,8 @@ async def chatbot_send_message_helper(session_id: str, message: str):
     else:
         print(f"🔍 No relevant documents found for text query")
         # Fallback: Get company documents from storage
-        company_docs = get_company_documents_from_storage(company_id)
+        from company.files.document_loader import load_company_documents
+        company_docs = await load_company_documents(company_id)
         if company_docs:
             enhanced_query = f"Company ID: {company_id}\n\nUser Question: {message}\n\nCompany Documents:\n{company_docs}"
             print(f"📄 Enhanced query with company documents from storage")
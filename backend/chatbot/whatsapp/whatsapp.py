@@ -1,6 +1,6 @@
 from fastapi.responses import PlainTextResponse
 import os
-import requests
+from http_client import http_request
 from fastapi import FastAPI, Request
 from dotenv import load_dotenv
 
@@ -30,7 +30,7 @@ async def send_template_helper(payload: dict):
         "type": "template",
         "template": {"name": template, "language": {"code": lang}}
     }
-    r = requests.post(url, json=data, headers={"Authorization": f"Bearer {ACCESS_TOKEN}"})
+    r = await http_request("whatsapp", "POST", url, json=data, headers={"Authorization": f"Bearer {ACCESS_TOKEN}"})
     return r.json()
 
 async def create_template_helper(payload: dict):
@@ -43,7 +43,7 @@ async def create_template_helper(payload: dict):
             { "type": "BODY", "text": "Your Pulpoo demo is ready." }
         ]
     }
-    r = requests.post(url, json=data, headers={"Authorization": f"Bearer {ACCESS_TOKEN}"})
+    r = await http_request("whatsapp", "POST", url, json=data, headers={"Authorization": f"Bearer {ACCESS_TOKEN}"})
     return r.json()
 
 # Webhook verification (GET) + receiver (POST)
@@ -6,9 +6,10 @@ from supabase import create_client, Client
 import os   
 from dotenv import load_dotenv
 from company.files.files import process_and_upload_pdf
-from extraction_processing.vectors.vector import chunk_text, store_embeddings_in_supabase
+from extraction_processing.vectors.vector import iter_text_chunks, store_embeddings_in_supabase
 from extraction_processing.extract_process import create_processed_pdf, process_and_upload_pdf
 from web_crawling.web_crawling import crawl_website_content
+from agent.profile_cache import invalidate_agent_profile
 
 from fastapi import HTTPException
 
@@ -159,15 +160,13 @@ async def create_company_helper(
         print(f"Total word count: {word_count}")
         
         rag_created = False
-        chunks = []
+        chunks_created = 0
         if word_count > 400 and client_id:
             print(f"Total word count: {word_count} - Creating RAG system...")
             
-            # Chunk the combined text
-            chunks = chunk_text(total_text)
-            
-            # Store embeddings in Supabase
-            rag_created = await store_embeddings_in_supabase(chunks, client_id, "combined_processed_files")
+            # Chunk the combined text as it is embedded and stored
+            chunks_created = await store_embeddings_in_supabase(iter_text_chunks(total_text), client_id, "combined_processed_files")
+            rag_created = chunks_created > 0
         print("now returning final stuff")
         return {
             "message": "Client created successfully with files uploaded and processed",
@@ -176,7 +175,7 @@ async def create_company_helper(
             "client_folder": client_folder,
             "word_count": word_count,
             "rag_created": rag_created,
-            "chunks_created": len(chunks) if rag_created else 0,
+            "chunks_created": chunks_created,
             "additional_text_stored": additional_text is not None and additional_text.strip() != "",
             "website_crawled": website_content is not None,
             "website_url": website_url if website_url and website_url.strip() else None,
@@ -295,6 +294,7 @@ async def delete_company_helper(company_id: str, current_user: Optional[str] = D
         
         # Delete the company
         delete_result = supabase.table("companies").delete().eq("company_id", company_id).execute()
+        invalidate_agent_profile(company_id)
         
         return {
             "message": "Company deleted successfully",
@@ -8,6 +8,7 @@ from fastapi import HTTPException
 from main import API_BASE_URL
 from pulpoo import crear_tarea_pulpoo
 from main import PULPOO_API_KEY
+from agent.profile_cache import invalidate_agent_profile
 load_dotenv()
 
 url: str = os.environ.get("SUPABASE_URL")
@@ -38,6 +39,7 @@ def create_company_tool_helper(company_id: str, tool: ToolCreate, sb: Client = D
             "example": arg.example,
             "enum_vals": arg.enum_vals
         }).execute()
+    invalidate_agent_profile(company_id)
 
     return {"message": "Tool created", "tool_id": created_tool["id"]}
 
@@ -111,6 +113,7 @@ def add_check_availability_tool_to_company_helper(company_id: str):
         
         for arg in tool_args:
             supabase.table('tool_args').insert(arg).execute()
+        invalidate_agent_profile(company_id)
         
         return {
             "message": "Check availability tool added successfully",
@@ -176,10 +179,11 @@ def add_create_appointment_tool_to_company_helper(company_id: str):
     ]
     for arg in tool_args:
         supabase.table("tool_args").insert(arg).execute()
+    invalidate_agent_profile(company_id)
     return {"message": "Create appointment tool added successfully", "company_id": company_id}
         # Insert API connection
 
-def create_appointment_tool_helper(company_id: str, day: str, start_time: str):
+async def create_appointment_tool_helper(company_id: str, day: str, start_time: str):
     """Create an appointment for a company"""
     try:
         # Get company name
@@ -235,10 +239,10 @@ def create_appointment_tool_helper(company_id: str, day: str, start_time: str):
             appointment_datetime = datetime.combine(target_date.date(), datetime.strptime(start_time, "%H:%M").time())
             
             # Create task in Pulpoo
-            crear_tarea_pulpoo(
+            await crear_tarea_pulpoo(
                 f"Appointment for {company_name}", 
                 f"Create appointment for {selected_worker_id} on {day} at {start_time}", 
-                appointment_datetime, 
+                appointment_datetime.isoformat(), 
                 PULPOO_API_KEY
             )
             
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import tempfile
+from typing import Dict, Iterable, Optional, Tuple
+
+from tiered_cache import TieredLRUCache
+
+# Extracted text of company documents, keyed by storage path + object version (the storage
+# eTag, or a hash of the downloaded bytes when the listing has none). A hit skips the download
+# and the PDF parse; a new upload under the same path gets a new eTag and so a new entry.
+# Two kinds per document: "text" (as extracted) and "filtered" (after filter_code_from_documents).
+# Texts live on local disk, shared by the workers on a host; texts up to
+# DOCUMENT_CACHE_MEMORY_MAX_TEXT_BYTES are also kept in an in-memory LRU, larger ones are
+# re-read from disk on each hit so a few big PDFs cannot push everything else out.
+DOCUMENT_CACHE_ENABLED = os.getenv("DOCUMENT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+DOCUMENT_CACHE_DIR = os.getenv("DOCUMENT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "pulpoo-document-cache"))
+DOCUMENT_CACHE_DISK_BYTES = int(os.getenv("DOCUMENT_CACHE_DISK_BYTES", str(1024 * 1024 * 1024)))
+DOCUMENT_CACHE_MEMORY_BYTES = int(os.getenv("DOCUMENT_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+DOCUMENT_CACHE_MEMORY_MAX_TEXT_BYTES = int(os.getenv("DOCUMENT_CACHE_MEMORY_MAX_TEXT_BYTES", str(4 * 1024 * 1024)))
+
+
+def split_storage_path(file_path: str) -> Tuple[str, str]:
+    """companies.files entries are "<bucket>/<path>"; bare names live in client-files"""
+    parts = file_path.split('/', 1)
+    if len(parts) == 2:
+        return parts[0], parts[1]
+    return "client-files", file_path
+
+
+def content_version(content: bytes) -> str:
+    return "sha256:" + hashlib.sha256(content).hexdigest()
+
+
+def storage_versions(supabase, file_paths: Iterable[str]) -> Dict[str, str]:
+    """file_path -> eTag from one storage listing per folder (no downloads); files the listing
+    does not cover are left out and fall back to content_version after download"""
+    folders: Dict[Tuple[str, str], list] = {}
+    for file_path in file_paths:
+        bucket, path = split_storage_path(file_path)
+        folder, _, name = path.rpartition('/')
+        folders.setdefault((bucket, folder), []).append((name, file_path))
+
+    versions = {}
+    for (bucket, folder), names in folders.items():
+        try:
+            listing = supabase.storage.from_(bucket).list(folder, {"limit": 1000})
+        except Exception as e:
+            print(f"⚠️ DOCUMENT CACHE: could not list {bucket}/{folder}: {e}")
+            continue
+        by_name = {item.get("name"): item for item in listing or []}
+        for name, file_path in names:
+            item = by_name.get(name)
+            if not item:
+                continue
+            metadata = item.get("metadata") or {}
+            etag = (metadata.get("eTag") or "").strip('"')
+            if etag:
+                versions[file_path] = f"etag:{etag}"
+            elif item.get("updated_at") and metadata.get("size") is not None:
+                versions[file_path] = f"mtime:{item['updated_at']}:{metadata['size']}"
+    return versions
+
+
+def _path_hash(file_path: str) -> str:
+    return hashlib.sha256(file_path.encode("utf-8")).hexdigest()[:32]
+
+
+class DocumentTextCache:
+    """Disk-backed text cache (size budget, LRU by mtime) with an in-memory LRU for small texts"""
+
+    def __init__(self, disk_dir: str = DOCUMENT_CACHE_DIR, disk_bytes: int = DOCUMENT_CACHE_DISK_BYTES,
+                 memory_bytes: int = DOCUMENT_CACHE_MEMORY_BYTES, memory_max_text_bytes: int = DOCUMENT_CACHE_MEMORY_MAX_TEXT_BYTES):
+        self.enabled = DOCUMENT_CACHE_ENABLED
+        self._store = TieredLRUCache("DOCUMENT CACHE", memory_bytes, disk_dir=disk_dir if self.enabled else "",
+                                     disk_bytes=disk_bytes, suffix=".txt", memory_max_entry_bytes=memory_max_text_bytes,
+                                     to_bytes=lambda text: text.encode("utf-8"),
+                                     from_bytes=lambda data: data.decode("utf-8"))
+        self._invalidations = 0
+
+    @staticmethod
+    def _key(file_path: str, version: str, kind: str) -> str:
+        # The path hash is a prefix so every version of a path can be dropped at once
+        version_hash = hashlib.sha256(f"{version}\x1f{kind}".encode("utf-8")).hexdigest()[:32]
+        return f"{_path_hash(file_path)}-{version_hash}"
+
+    def get(self, file_path: str, version: Optional[str], kind: str = "text") -> Optional[str]:
+        """Blocking on a disk hit"""
+        if not self.enabled or not version:
+            return None
+        try:
+            return self._store.get(self._key(file_path, version, kind))
+        except UnicodeDecodeError:
+            return None
+
+    def put(self, file_path: str, version: Optional[str], text: str, kind: str = "text"):
+        if not self.enabled or not version or text is None:
+            return
+        key = self._key(file_path, version, kind)
+        data = text.encode("utf-8")
+        self._store.put_memory(key, text, len(data))
+        self._store.write_disk(key, text, data)
+
+    def invalidate(self, file_paths: Iterable[str]):
+        """Drop every cached version of the given storage paths"""
+        prefixes = [_path_hash(p) + "-" for p in file_paths]
+        if prefixes:
+            self._store.discard_prefixes(prefixes)
+            self._invalidations += len(prefixes)
+
+    def snapshot(self) -> Dict:
+        return {**self._store.snapshot(), "invalidations": self._invalidations}
+
+
+document_cache = DocumentTextCache()
+
+
+def invalidate_company_documents(file_paths: Iterable[str]):
+    document_cache.invalidate(file_paths)
+
+
+def get_document_cache_stats() -> Dict:
+    return document_cache.snapshot()
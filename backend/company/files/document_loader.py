@@ -0,0 +1,195 @@
+import asyncio
+import concurrent.futures
+import multiprocessing
+from concurrent.futures.process import BrokenProcessPool
+import os
+import time
+from typing import AsyncIterator, List, Optional, Tuple
+
+from company.files.document_cache import document_cache, split_storage_path, storage_versions, content_version
+
+# Company documents are fetched concurrently (at most DOCUMENT_FETCH_CONCURRENCY downloads at a
+# time, each in a thread since the storage client is blocking) and PDFs are parsed in a process
+# pool, so loading 20 files takes about as long as the slowest one instead of the sum.
+# Documents are yielded as they finish; the assembled text keeps the companies.files order so the
+# prompt (and its Gemini context cache) stays stable between builds.
+DOCUMENT_FETCH_CONCURRENCY = int(os.getenv("DOCUMENT_FETCH_CONCURRENCY", "8"))
+# 0 parses PDFs in threads instead (e.g. where worker processes are not allowed)
+DOCUMENT_PDF_WORKERS = int(os.getenv("DOCUMENT_PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_pdf_pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+_supabase = None
+
+
+def extract_pdf_text(content: bytes) -> str:
+    """Runs in the PDF worker processes: module-level and free of app imports so it pickles cheaply"""
+    import PyPDF2
+    from io import BytesIO
+
+    pdf_reader = PyPDF2.PdfReader(BytesIO(content))
+    return '\n'.join(page.extract_text() or "" for page in pdf_reader.pages)
+
+
+def _get_pdf_pool() -> Optional[concurrent.futures.ProcessPoolExecutor]:
+    global _pdf_pool
+    if _pdf_pool is None and DOCUMENT_PDF_WORKERS > 0:
+        # spawn: forking a process that runs threads (uvicorn, storage downloads) can deadlock
+        _pdf_pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=DOCUMENT_PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pdf_pool
+
+
+def shutdown_document_workers():
+    global _pdf_pool
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(wait=False, cancel_futures=True)
+        _pdf_pool = None
+
+
+async def extract_document_text(file_path: str, content: bytes) -> Optional[str]:
+    """Text of a downloaded document: UTF-8 text files as-is, PDFs through PyPDF2; None if unsupported"""
+    global _pdf_pool
+    # First try to decode as UTF-8 (for text files)
+    try:
+        file_text = content.decode('utf-8')
+        print(f"✅ Loaded text document: {file_path} ({len(content)} bytes)")
+        return file_text
+    except UnicodeDecodeError:
+        pass
+    # It's a binary file, try to extract text from PDF
+    if not file_path.lower().endswith('.pdf'):
+        print(f"⚠️ Binary file (not PDF) - skipping: {file_path}")
+        return None
+    loop = asyncio.get_running_loop()
+    try:
+        pool = _get_pdf_pool()
+        try:
+            return await loop.run_in_executor(pool, extract_pdf_text, content)
+        except BrokenProcessPool:
+            print(f"⚠️ PDF worker pool broke; parsing {file_path} in a thread")
+            _pdf_pool = None
+            return await loop.run_in_executor(None, extract_pdf_text, content)
+    except ImportError:
+        print(f"⚠️ PyPDF2 not installed - skipping PDF: {file_path}")
+        print("   Install with: pip install PyPDF2")
+        return None
+    except Exception as pdf_error:
+        print(f"⚠️ Could not extract text from PDF {file_path}: {pdf_error}")
+        return None
+
+
+def _get_supabase():
+    global _supabase
+    if _supabase is None:
+        from supabase import create_client
+        _supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
+    return _supabase
+
+
+async def _load_document(supabase, file_path: str, version: Optional[str], filtered: bool,
+                         semaphore: asyncio.Semaphore) -> Tuple[Optional[str], bool]:
+    """(text, downloaded) for one file, from the document cache when possible"""
+    from tools import filter_code_from_documents
+
+    kind = "filtered" if filtered else "text"
+    file_text = document_cache.get(file_path, version, kind)
+    if file_text is not None:
+        return file_text, False
+    bucket_name, file_path_without_bucket = split_storage_path(file_path)
+    async with semaphore:
+        try:
+            content = await asyncio.to_thread(supabase.storage.from_(bucket_name).download, file_path_without_bucket)
+        except Exception as bucket_error:
+            print(f"❌ Failed to download from bucket '{bucket_name}': {bucket_error}")
+            return None, False
+    if not content:
+        print(f"⚠️ Could not load document: {file_path}")
+        return None, True
+    version = version or content_version(content)
+    # Same bytes already parsed under their content hash: skip the PDF parse
+    file_text = document_cache.get(file_path, version, kind)
+    if file_text is not None:
+        return file_text, True
+    extracted = document_cache.get(file_path, version, "text")
+    if extracted is None:
+        extracted = await extract_document_text(file_path, content)
+        if extracted is None:
+            return None, True
+        document_cache.put(file_path, version, extracted, "text")
+    if not filtered:
+        return extracted, True
+    file_text = await asyncio.to_thread(filter_code_from_documents, extracted)
+    document_cache.put(file_path, version, file_text, "filtered")
+    return file_text, True
+
+
+async def iter_company_documents(company_id: str, filtered: bool = False) -> AsyncIterator[Tuple[int, str, str, bool]]:
+    """Yield (position in companies.files, file_path, text, downloaded) as each document finishes"""
+    if not os.getenv("SUPABASE_URL") or not os.getenv("SUPABASE_SERVICE_ROLE_KEY"):
+        print("⚠️ Supabase credentials not available")
+        return
+    if not os.getenv("S3_ACCESS_KEY") or not os.getenv("S3_SECRET_KEY"):
+        print("⚠️ S3 credentials not available - add S3_ACCESS_KEY and S3_SECRET_KEY to .env")
+        return
+
+    supabase = _get_supabase()
+    company_result = await asyncio.to_thread(
+        lambda: supabase.table("companies").select("files").eq("company_id", company_id).single().execute())
+    if not company_result.data:
+        print(f"No company found for company_id: {company_id}")
+        return
+    files = company_result.data.get("files") or []
+    if not files:
+        return
+
+    # Object versions from the storage listing, so cached texts are found without downloading
+    versions = await asyncio.to_thread(storage_versions, supabase, files)
+    semaphore = asyncio.Semaphore(max(1, DOCUMENT_FETCH_CONCURRENCY))
+
+    async def load(index: int, file_path: str):
+        try:
+            text, downloaded = await _load_document(supabase, file_path, versions.get(file_path), filtered, semaphore)
+        except Exception as e:
+            print(f"Error loading document {file_path}: {e}")
+            text, downloaded = None, False
+        return index, file_path, text, downloaded
+
+    tasks = [asyncio.create_task(load(i, path)) for i, path in enumerate(files)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            index, file_path, text, downloaded = await finished
+            if text:
+                yield index, file_path, text, downloaded
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def load_company_document_list(company_id: str, filtered: bool = False) -> List[Tuple[str, str]]:
+    """(file_path, text) for each loadable document, in companies.files order"""
+    start_time = time.time()
+    slots: List[Optional[Tuple[str, str]]] = []
+    downloaded = 0
+    try:
+        async for index, file_path, text, was_downloaded in iter_company_documents(company_id, filtered):
+            if index >= len(slots):
+                slots.extend([None] * (index + 1 - len(slots)))
+            slots[index] = (file_path, text)
+            downloaded += was_downloaded
+    except Exception as e:
+        print(f"Error getting company documents for company_id {company_id}: {e}")
+        return []
+
+    documents = [doc for doc in slots if doc]
+    if not documents:
+        print(f"No documents could be loaded for company_id: {company_id}")
+        return []
+    print(f"📄 Loaded {len(documents)} documents for {company_id} in {time.time() - start_time:.2f}s "
+          f"({downloaded} downloaded, {len(documents) - downloaded} from cache)")
+    return documents
+
+
+async def load_company_documents(company_id: str, filtered: bool = False) -> str:
+    """All of a company's documents as one "Document: <path>" block per file, in companies.files order"""
+    documents = await load_company_document_list(company_id, filtered)
+    return "\n\n".join(f"Document: {file_path}\n{text}" for file_path, text in documents)
@@ -11,6 +11,8 @@ from fastapi import UploadFile
 from fastapi import Depends
 from main import get_current_user
 from typing import Optional
+from agent.profile_cache import invalidate_agent_profile
+from company.files.document_cache import invalidate_company_documents
 
 
 load_dotenv()
@@ -257,6 +259,12 @@ async def manage_files_helper(company_id: str, action: str, files: list[UploadFi
         update_result = supabase.table("companies").update(update_data).eq("company_id", company_id).execute()
         
         if update_result.data:
+            # Removed files, and files (re)uploaded by this call, drop their cached extracted text
+            changed_files = set(current_files) ^ set(updated_files)
+            if action.startswith("add"):
+                changed_files.update(updated_files[len(current_files):])
+            invalidate_company_documents(changed_files)
+            invalidate_agent_profile(company_id)
             return {
                 "message": f"Company files updated successfully",
                 "action": action,
@@ -0,0 +1,203 @@
+import hashlib
+import math
+import os
+import re
+import time
+from collections import Counter, deque
+from typing import Dict, List, Optional, Tuple
+
+from extraction_processing.vectors.chunking import count_tokens
+
+# Prompt-budget mode for company documents: instead of appending every document verbatim, the
+# documents are split into sections, near-duplicate sections are dropped, and the sections most
+# relevant to the company prompt/profile and its users' recent questions are kept until
+# PROMPT_DOCUMENT_TOKEN_BUDGET is reached. Selected sections keep their document order, so the
+# prompt stays stable (and context-cacheable) until the profile is rebuilt.
+PROMPT_BUDGET_ENABLED = os.getenv("PROMPT_BUDGET_ENABLED", "true").lower() in ("1", "true", "yes")
+PROMPT_DOCUMENT_TOKEN_BUDGET = int(os.getenv("PROMPT_DOCUMENT_TOKEN_BUDGET", "6000"))
+PROMPT_SECTION_TOKENS = int(os.getenv("PROMPT_SECTION_TOKENS", "300"))
+# Sections whose word 5-gram overlap with an already selected section is at least this are dropped
+PROMPT_DEDUPE_THRESHOLD = float(os.getenv("PROMPT_DEDUPE_THRESHOLD", "0.8"))
+PROMPT_RECENT_QUERIES = int(os.getenv("PROMPT_RECENT_QUERIES", "50"))
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+# BM25 parameters
+_K1 = 1.2
+_B = 0.75
+
+# company_id -> recent user questions (most recent last)
+_recent_queries: Dict[str, deque] = {}
+# company_id -> token breakdown of the last prompt built for it
+_breakdowns: Dict[str, Dict] = {}
+
+
+def record_company_query(company_id: str, text: str):
+    """Remember a user question; recent questions steer which document sections are kept"""
+    if company_id and text and text.strip():
+        _recent_queries.setdefault(company_id, deque(maxlen=PROMPT_RECENT_QUERIES)).append(text.strip())
+
+
+def _terms(text: str) -> List[str]:
+    return [w for w in _WORD.findall(text.lower()) if len(w) > 2]
+
+
+def _shingles(text: str) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) < 5:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + 5]) for i in range(len(words) - 4)}
+
+
+def split_sections(text: str, max_tokens: int = PROMPT_SECTION_TOKENS) -> List[str]:
+    """Paragraphs packed into sections of at most ~max_tokens (long paragraphs are split by lines)"""
+    sections, current, current_tokens = [], [], 0
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        pieces = [paragraph]
+        if count_tokens(paragraph) > max_tokens:
+            pieces = [line for line in paragraph.split("\n") if line.strip()]
+        for piece in pieces:
+            tokens = count_tokens(piece)
+            if current and current_tokens + tokens > max_tokens:
+                sections.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += tokens
+    if current:
+        sections.append("\n\n".join(current))
+    return sections
+
+
+def _bm25_scores(sections: List[List[str]], query_terms: Counter) -> List[float]:
+    n = len(sections)
+    avg_len = sum(len(s) for s in sections) / n if n else 0.0
+    document_frequency = Counter()
+    for terms in sections:
+        document_frequency.update(set(terms))
+    scores = []
+    for terms in sections:
+        tf = Counter(terms)
+        score = 0.0
+        for term, weight in query_terms.items():
+            if term not in tf:
+                continue
+            idf = math.log(1 + (n - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+            norm = tf[term] * (_K1 + 1) / (tf[term] + _K1 * (1 - _B + _B * len(terms) / (avg_len or 1)))
+            score += idf * norm * weight
+        scores.append(score)
+    return scores
+
+
+def select_document_sections(documents: List[Tuple[str, str]], relevance_text: str, queries: List[str] = (),
+                             budget_tokens: int = PROMPT_DOCUMENT_TOKEN_BUDGET) -> Tuple[str, Dict]:
+    """Pick deduplicated, relevance-ranked sections of (file_path, text) documents within budget_tokens.
+    Returns the text to inject and a report of what was kept."""
+    candidates = []  # (doc_index, section_index, file_path, text, tokens)
+    for doc_index, (file_path, text) in enumerate(documents):
+        for section_index, section in enumerate(split_sections(text)):
+            candidates.append((doc_index, section_index, file_path, section, count_tokens(section)))
+    total_tokens = sum(c[4] for c in candidates)
+
+    # Exact duplicates first (same section uploaded twice, repeated headers/footers...)
+    seen, unique = set(), []
+    for candidate in candidates:
+        digest = hashlib.sha256(" ".join(_WORD.findall(candidate[3].lower())).encode("utf-8")).digest()
+        if digest not in seen:
+            seen.add(digest)
+            unique.append(candidate)
+
+    query_terms = Counter(_terms(relevance_text))
+    # Users' questions weigh more than the prompt itself: they are what people actually ask about
+    for query in queries:
+        for term in _terms(query):
+            query_terms[term] += 2
+    scores = _bm25_scores([_terms(c[3]) for c in unique], query_terms)
+    # Ties (and sections nothing matches) fall back to document order, earlier sections first
+    ranked = sorted(range(len(unique)), key=lambda i: (-scores[i], unique[i][1], unique[i][0]))
+
+    selected, selected_shingles, used_tokens, near_duplicates = [], [], 0, 0
+    selected_docs = set()
+    for i in ranked:
+        doc_index, _, file_path, section, tokens = unique[i]
+        header_tokens = 0 if doc_index in selected_docs else count_tokens(f"Document: {file_path}\n")
+        if used_tokens + tokens + header_tokens > budget_tokens:
+            continue
+        shingles = _shingles(section)
+        if any(len(shingles & other) / max(1, min(len(shingles), len(other))) >= PROMPT_DEDUPE_THRESHOLD
+               for other in selected_shingles):
+            near_duplicates += 1
+            continue
+        selected.append(unique[i])
+        selected_docs.add(doc_index)
+        selected_shingles.append(shingles)
+        used_tokens += tokens + header_tokens
+
+    # Back to document order; one "Document:" header per document, "[...]" where sections were left out
+    selected.sort(key=lambda c: (c[0], c[1]))
+    blocks, current_doc, last_section = [], None, -1
+    for doc_index, section_index, file_path, section, _ in selected:
+        if doc_index != current_doc:
+            blocks.append(f"Document: {file_path}\n{section}")
+            current_doc = doc_index
+        else:
+            blocks[-1] += ("\n\n" if section_index == last_section + 1 else "\n\n[...]\n\n") + section
+        last_section = section_index
+
+    report = {
+        "documents": len(documents),
+        "documents_injected": len({c[0] for c in selected}),
+        "sections": len(candidates),
+        "sections_injected": len(selected),
+        "duplicates_dropped": len(candidates) - len(unique) + near_duplicates,
+        "document_tokens_total": total_tokens,
+        "document_tokens_injected": used_tokens,
+        "budget_tokens": budget_tokens,
+    }
+    return "\n\n".join(blocks), report
+
+
+def budget_company_documents(company_id: str, documents: List[Tuple[str, str]], relevance_text: str) -> Tuple[str, Dict]:
+    """Document context for a company's prompt: everything when it fits the budget, else the best sections"""
+    full_text = "\n\n".join(f"Document: {path}\n{text}" for path, text in documents)
+    full_tokens = count_tokens(full_text)
+    if not PROMPT_BUDGET_ENABLED or full_tokens <= PROMPT_DOCUMENT_TOKEN_BUDGET:
+        return full_text, {"documents": len(documents), "documents_injected": len(documents),
+                           "document_tokens_total": full_tokens, "document_tokens_injected": full_tokens,
+                           "budget_tokens": PROMPT_DOCUMENT_TOKEN_BUDGET if PROMPT_BUDGET_ENABLED else None}
+    start_time = time.time()
+    text, report = select_document_sections(documents, relevance_text, list(_recent_queries.get(company_id, ())))
+    print(f"✂️ PROMPT BUDGET: {company_id} documents {report['document_tokens_total']} -> "
+          f"{report['document_tokens_injected']} tokens ({report['sections_injected']}/{report['sections']} sections, "
+          f"{report['duplicates_dropped']} duplicates) in {time.time() - start_time:.2f}s")
+    return text, report
+
+
+def record_prompt_breakdown(company_id: str, **parts):
+    """Merge token counts of prompt parts (base, documents, training, ...) into the company's report"""
+    breakdown = _breakdowns.setdefault(company_id, {})
+    breakdown.update(parts)
+    breakdown["updated_at"] = time.time()
+
+
+def get_prompt_breakdown(company_id: str) -> Optional[Dict]:
+    return _breakdowns.get(company_id)
+
+
+def get_prompt_budget_stats() -> Dict:
+    companies = {}
+    for company_id, breakdown in list(_breakdowns.items())[-50:]:
+        breakdown = dict(breakdown)
+        parts = ("base_tokens", "document_section_tokens", "voice_constraint_tokens", "instruction_tokens")
+        if "total_tokens" in breakdown and all(p in breakdown for p in parts):
+            # Whatever the prompt builders add in between (training data)
+            breakdown["training_tokens"] = max(0, breakdown["total_tokens"] - sum(breakdown[p] for p in parts))
+        companies[company_id] = breakdown
+    return {
+        "enabled": PROMPT_BUDGET_ENABLED,
+        "document_token_budget": PROMPT_DOCUMENT_TOKEN_BUDGET,
+        "section_tokens": PROMPT_SECTION_TOKENS,
+        "companies": companies,
+    }
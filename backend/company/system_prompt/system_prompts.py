@@ -1,10 +1,12 @@
 from supabase import create_client, Client
 import os   
+import asyncio
 from dotenv import load_dotenv
 from fastapi import Depends
 from main import PromptCreate
 from tools import get_system_prompt
 from database_utils import get_sb
+from agent.profile_cache import invalidate_agent_profile
 
 load_dotenv()
 
@@ -38,7 +40,7 @@ def create_system_prompt_helper(company_id: str, prompt: PromptCreate, sb: Clien
     sb.table("prompts").update({
         "active_version_id": version_id
     }).eq("id", prompt_id).execute()
-
+    invalidate_agent_profile(company_id)
 
     return {"message": "Prompt and version created", "prompt_id": prompt_id}
 
@@ -63,13 +65,18 @@ async def get_prompts_helper(company_id: str):
 
 async def get_system_prompt_helper(company_id: str):
     """Get the system prompt for a company"""
+    base_prompt_task = None
     try:
-        # Get base system prompt
-        base_prompt = get_system_prompt(company_id)
+        # Base system prompt (Supabase queries + company documents) and the training data are
+        # fetched in threads, concurrently, so the event loop is not blocked meanwhile
+        base_prompt_task = asyncio.create_task(asyncio.to_thread(get_system_prompt, company_id))
+        training_task = asyncio.create_task(asyncio.to_thread(
+            lambda: supabase.rpc("get_company_training_data", {"company_uuid": company_id}).execute())) if supabase else None
+        base_prompt = await base_prompt_task
         
         # Get training data from database
         if supabase:
-            training_result = supabase.rpc("get_company_training_data", {"company_uuid": company_id}).execute()
+            training_result = await training_task
             
             # Handle different response formats
             training_data = None
@@ -119,5 +126,8 @@ async def get_system_prompt_helper(company_id: str):
         
     except Exception as e:
         print(f"❌ Error getting system prompt with training: {e}")
-        return get_system_prompt(company_id)  # Fallback to base prompt
+        # Fallback to base prompt
+        if base_prompt_task is not None and base_prompt_task.done() and not base_prompt_task.cancelled() and base_prompt_task.exception() is None:
+            return base_prompt_task.result()
+        return await asyncio.to_thread(get_system_prompt, company_id)
         
@@ -5,6 +5,8 @@ from fastapi import Depends, HTTPException
 from pydantic import BaseModel
 from authentication.authentication import get_current_user
 from typing import Optional
+import asyncio
+from agent.profile_cache import invalidate_agent_profile
 
 load_dotenv()
 
@@ -120,6 +122,8 @@ async def add_training_message_helper(message: TrainingMessageCreate, current_us
             "total_messages": next_order,
             "last_training_date": "now()"
         }).eq("id", message.training_session_id).execute()
+        # Training messages are part of the company's system prompt
+        invalidate_agent_profile(session_result.data[0]["company_id"])
         
         return {
             "success": True,
@@ -253,6 +257,7 @@ async def get_training_response_helper(session_id: str, user_message: str, curre
                     "message_order": next_order
                 }).execute()
                 print(f"✅ Added agent response only: {response[:50]}...")
+                invalidate_agent_profile(session_result.data[0]["company_id"])
             else:
                 print(f"⚠️ Both user and agent messages already exist, skipping both")
             
@@ -294,6 +299,7 @@ async def get_training_response_helper(session_id: str, user_message: str, curre
             "total_messages": next_order + 1,
             "last_training_date": "now()"
         }).eq("id", session_id).execute()
+        invalidate_agent_profile(session_result.data[0]["company_id"])
         
         return {
             "success": True,
@@ -307,9 +313,11 @@ async def get_training_response_helper(session_id: str, user_message: str, curre
     
 async def get_system_prompt_helper(company_id: str):
     """Get the system prompt for a company"""
+    from tools import get_system_prompt
+
     try:
-        # Get base system prompt
-        base_prompt = get_system_prompt(company_id)
+        # Get base system prompt (blocking document load, so off the event loop)
+        base_prompt = await asyncio.to_thread(get_system_prompt, company_id)
         
         # Get training data from database
         if supabase:
@@ -363,5 +371,5 @@ async def get_system_prompt_helper(company_id: str):
         
     except Exception as e:
         print(f"❌ Error getting system prompt with training: {e}")
-        return get_system_prompt(company_id)  # Fallback to base prompt
+        return await asyncio.to_thread(get_system_prompt, company_id)  # Fallback to base prompt
         
\ No newline at end of file
@@ -4,6 +4,7 @@ from main import supabase
 from authentication.authentication import get_current_user
 from typing import Optional
 from pydantic import BaseModel
+from agent.profile_cache import invalidate_agent_profile
 
 
 class ConsentUpdate(BaseModel):
@@ -95,6 +96,7 @@ async def delete_user_data_helper(user_id: str, current_user: Optional[str] = De
             supabase.table("workers").delete().eq("company_id", company_id).execute()
             supabase.table("whatsapp_configs").delete().eq("company_id", company_id).execute()
             supabase.table("interest").delete().eq("company_id", company_id).execute()
+            invalidate_agent_profile(company_id)
         
         # Delete companies
         supabase.table("companies").delete().eq("user_id", user_id).execute()
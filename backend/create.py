@@ -9,7 +9,7 @@ from openai import OpenAI
 import tiktoken
 import json
 from extraction_processing.extract_process import process_and_upload_pdf, extract_text_from_pdf, process_pdf_with_openai, create_processed_pdf
-from extraction_processing.vectors.vector import store_embeddings_in_supabase, search_similar_chunks, count_tokens, chunk_text, get_embedding
+from extraction_processing.vectors.vector import store_embeddings_in_supabase, search_similar_chunks, count_tokens, chunk_text, iter_text_chunks, get_embedding
 from tools import get_gemini_tools, get_system_prompt
 
 
@@ -208,15 +208,13 @@ async def create_client_with_files(
         print(f"Total word count: {word_count}")
         
         rag_created = False
-        chunks = []
+        chunks_created = 0
         if word_count > 400 and client_id:
             print(f"Total word count: {word_count} - Creating RAG system...")
             
-            # Chunk the combined text
-            chunks = chunk_text(total_text)
-            
-            # Store embeddings in Supabase
-            rag_created = await store_embeddings_in_supabase(chunks, client_id, "combined_processed_files")
+            # Chunk the combined text as it is embedded and stored
+            chunks_created = await store_embeddings_in_supabase(iter_text_chunks(total_text), client_id, "combined_processed_files")
+            rag_created = chunks_created > 0
         print("now returning final stuff")
         return {
             "message": "Client created successfully with files uploaded and processed",
@@ -225,7 +223,7 @@ async def create_client_with_files(
             "client_folder": client_folder,
             "word_count": word_count,
             "rag_created": rag_created,
-            "chunks_created": len(chunks) if rag_created else 0,
+            "chunks_created": chunks_created,
             "additional_text_stored": additional_text is not None and additional_text.strip() != ""
         }
         
@@ -0,0 +1,225 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from deepgram import DeepgramClient, LiveOptions, LiveTranscriptionEvents, SpeakWebSocketEvents
+
+# Warm Deepgram websocket connections, opened ahead of time so a call does not wait for the
+# TLS + websocket handshake. Connections are single use: sessions attach their own handlers,
+# so a checked-out connection is never returned; the pool refills in the background instead.
+DEEPGRAM_POOL_SIZE = int(os.getenv("DEEPGRAM_POOL_SIZE", "2"))  # idle connections per options key
+DEEPGRAM_POOL_MAX_IDLE_S = float(os.getenv("DEEPGRAM_POOL_MAX_IDLE_S", "120"))
+DEEPGRAM_POOL_KEEPALIVE_S = float(os.getenv("DEEPGRAM_POOL_KEEPALIVE_S", "5"))
+# Option sets seen at checkout are warmed too, up to this many per pool
+DEEPGRAM_POOL_MAX_KEYS = int(os.getenv("DEEPGRAM_POOL_MAX_KEYS", "4"))
+
+
+def options_key(options: Any) -> str:
+    if hasattr(options, "to_dict"):
+        options = options.to_dict()
+    return json.dumps({k: v for k, v in dict(options).items() if v is not None}, sort_keys=True, default=str)
+
+
+class DeepgramConnectionPool:
+    """Pool of started Deepgram websocket connections keyed by their options"""
+
+    def __init__(self, name: str, new_connection: Callable[[], Any], open_event: Any,
+                 size: int = DEEPGRAM_POOL_SIZE, max_idle_s: float = DEEPGRAM_POOL_MAX_IDLE_S,
+                 keepalive_s: float = DEEPGRAM_POOL_KEEPALIVE_S):
+        self.name = name
+        self._new_connection = new_connection
+        self._open_event = open_event
+        self.size = size
+        self.max_idle_s = max_idle_s
+        self.keepalive_s = keepalive_s
+        self._options: Dict[str, Any] = {}
+        self._idle: Dict[str, List[Dict]] = {}
+        self._opening: Dict[str, int] = {}
+        self._maintenance_task: Optional[asyncio.Task] = None
+        self.stats = {"hits": 0, "misses": 0, "opened": 0, "recycled": 0, "open_failures": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._maintenance_task is not None and not self._maintenance_task.done()
+
+    def register(self, options: Any) -> str:
+        """Keep connections for these options warm"""
+        key = options_key(options)
+        if key not in self._options:
+            self._options[key] = options
+            self._idle.setdefault(key, [])
+            if self.running:
+                self._refill(key)
+        return key
+
+    async def start(self):
+        if self.running or self.size <= 0:
+            return
+        self._maintenance_task = asyncio.create_task(self._maintain())
+        for key in list(self._options):
+            self._refill(key)
+        print(f"🏊 DG POOL {self.name}: started (size={self.size}, keys={len(self._options)})")
+
+    async def close(self):
+        if self._maintenance_task:
+            self._maintenance_task.cancel()
+            self._maintenance_task = None
+        for key, entries in self._idle.items():
+            for entry in entries:
+                await self._finish(entry["conn"])
+            entries.clear()
+
+    async def checkout(self, options: Any, handlers: Dict[Any, Callable]) -> Any:
+        """Return a started connection with handlers attached.
+        A warm connection is already open, so its Open handler is invoked right away; otherwise
+        a new connection is opened here (the old, slow path) and its options get warmed from now on.
+        """
+        key = options_key(options)
+        entry = None
+        entries = self._idle.get(key, [])
+        while entries and entry is None:
+            candidate = entries.pop(0)
+            if self._healthy(candidate):
+                entry = candidate
+            else:
+                self.stats["recycled"] += 1
+                asyncio.create_task(self._finish(candidate["conn"]))
+
+        if self.running:
+            if key not in self._options and len(self._options) < DEEPGRAM_POOL_MAX_KEYS:
+                self._options[key] = options
+                self._idle.setdefault(key, [])
+            if key in self._options:
+                self._refill(key)
+
+        if entry is not None:
+            self.stats["hits"] += 1
+            conn = entry["conn"]
+            for event, handler in handlers.items():
+                conn.on(event, handler)
+            open_handler = handlers.get(self._open_event)
+            if open_handler:
+                open_handler(conn, None)
+            print(f"🏊 DG POOL {self.name}: checked out warm connection (age {time.monotonic() - entry['opened_at']:.1f}s)")
+            return conn
+
+        self.stats["misses"] += 1
+        t0 = time.monotonic()
+        conn = await self._open(options, handlers)
+        print(f"🏊 DG POOL {self.name}: no warm connection, opened one in {time.monotonic() - t0:.3f}s")
+        return conn
+
+    def snapshot(self) -> Dict:
+        return {
+            "size": self.size,
+            "running": self.running,
+            "idle": {key: len(entries) for key, entries in self._idle.items()},
+            **self.stats,
+        }
+
+    # ----- internals -----
+
+    async def _open(self, options: Any, handlers: Optional[Dict[Any, Callable]] = None) -> Any:
+        conn = self._new_connection()
+        for event, handler in (handlers or {}).items():
+            conn.on(event, handler)
+        started = await asyncio.to_thread(conn.start, options)
+        if started is False:
+            raise RuntimeError(f"Failed to start Deepgram {self.name} connection")
+        self.stats["opened"] += 1
+        return conn
+
+    def _refill(self, key: str):
+        missing = self.size - len(self._idle.get(key, [])) - self._opening.get(key, 0)
+        for _ in range(max(0, missing)):
+            self._opening[key] = self._opening.get(key, 0) + 1
+            asyncio.create_task(self._open_idle(key))
+
+    async def _open_idle(self, key: str):
+        try:
+            conn = await self._open(self._options[key])
+            now = time.monotonic()
+            self._idle.setdefault(key, []).append({"conn": conn, "opened_at": now, "last_keepalive": now})
+        except Exception as e:
+            self.stats["open_failures"] += 1
+            print(f"⚠️ DG POOL {self.name}: failed to open warm connection: {e}")
+        finally:
+            self._opening[key] = max(0, self._opening.get(key, 1) - 1)
+
+    def _healthy(self, entry: Dict) -> bool:
+        if time.monotonic() - entry["opened_at"] > self.max_idle_s:
+            return False
+        is_connected = getattr(entry["conn"], "is_connected", None)
+        try:
+            return bool(is_connected()) if is_connected else True
+        except Exception:
+            return False
+
+    async def _finish(self, conn: Any):
+        try:
+            await asyncio.to_thread(conn.finish)
+        except Exception:
+            pass
+
+    async def _maintain(self):
+        """Keep idle connections alive, recycle stale or broken ones and top the pool up"""
+        while True:
+            await asyncio.sleep(self.keepalive_s)
+            try:
+                for key, entries in self._idle.items():
+                    for entry in list(entries):
+                        if not self._healthy(entry):
+                            entries.remove(entry)
+                            self.stats["recycled"] += 1
+                            asyncio.create_task(self._finish(entry["conn"]))
+                            continue
+                        keep_alive = getattr(entry["conn"], "keep_alive", None)
+                        if keep_alive:
+                            try:
+                                keep_alive()
+                                entry["last_keepalive"] = time.monotonic()
+                            except Exception as e:
+                                print(f"⚠️ DG POOL {self.name}: keepalive failed: {e}")
+                    self._refill(key)
+            except Exception as e:
+                print(f"❌ DG POOL {self.name}: maintenance error: {e}")
+
+
+_dg_client: Optional[DeepgramClient] = None
+
+
+def _client() -> DeepgramClient:
+    global _dg_client
+    if _dg_client is None:
+        _dg_client = DeepgramClient(api_key=os.getenv("DEEPGRAM_API_KEY"))
+    return _dg_client
+
+
+stt_pool = DeepgramConnectionPool("stt", lambda: _client().listen.websocket.v("1"), LiveTranscriptionEvents.Open)
+tts_pool = DeepgramConnectionPool("tts", lambda: _client().speak.websocket.v("1"), SpeakWebSocketEvents.Open)
+
+
+async def start_deepgram_pools():
+    """Warm the option sets used by the voice websockets (called on app startup)"""
+    if not os.getenv("DEEPGRAM_API_KEY"):
+        print("⚠️ DG POOL: DEEPGRAM_API_KEY not set; pools disabled")
+        return
+    from manage_twilio.websocket_voice import live_options
+    from deepgram_websocket_handler import DEEPGRAM_TEST_LIVE_OPTIONS
+    from deepgram_tts_websocket import DEFAULT_TTS_OPTIONS
+    stt_pool.register(live_options)
+    stt_pool.register(DEEPGRAM_TEST_LIVE_OPTIONS)
+    tts_pool.register(DEFAULT_TTS_OPTIONS)
+    await stt_pool.start()
+    await tts_pool.start()
+
+
+async def stop_deepgram_pools():
+    await stt_pool.close()
+    await tts_pool.close()
+
+
+def get_deepgram_pool_stats() -> Dict:
+    return {"stt": stt_pool.snapshot(), "tts": tts_pool.snapshot()}
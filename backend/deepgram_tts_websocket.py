@@ -1,20 +1,69 @@
 import asyncio
 import json
 import os
-from typing import Dict, Optional
+import time
+from typing import Callable, Dict, Optional
 
 from fastapi import WebSocket, WebSocketDisconnect
 from deepgram import DeepgramClient, SpeakWebSocketEvents, SpeakOptions
 from session_data import session_metadata
+from session_lifecycle import register_eviction_hook
+from session_store import set_session_affinity, clear_session_affinity, get_session_affinity, WORKER_ID
+from turn_trace import trace_mark
+from audio.output_stage import AudioOutputStage
+
+# Speak options used when the client sends no config message (also warmed in the pool)
+DEFAULT_TTS_OPTIONS = {"model": "aura-2-estrella-es", "encoding": "linear16", "sample_rate": 16000}
 
 # Global registry to allow server-side Speak into an active TTS session
 TTS_REGISTRY: Dict[str, object] = {}
 
+# Per-session playback controls registered by the active TTS stream:
+# {"interrupt": fn, "resume": fn, "is_playing": fn}
+TTS_CONTROLS: Dict[str, Dict[str, Callable]] = {}
+
+def tts_server_interrupt(session_id: str) -> bool:
+    """Stop playback on the session's TTS stream: clear Deepgram, drop queued audio, tell the client"""
+    controls = TTS_CONTROLS.get(session_id)
+    if not controls:
+        return False
+    try:
+        controls["interrupt"]()
+        return True
+    except Exception as e:
+        print(f"❌ TTS INTERRUPT error for {session_id}: {e}")
+        return False
+
+def tts_is_playing(session_id: str) -> bool:
+    """True while audio sent on the session's TTS stream is estimated to still be playing"""
+    controls = TTS_CONTROLS.get(session_id)
+    try:
+        return bool(controls and controls["is_playing"]())
+    except Exception:
+        return False
+
+def release_tts_session(session_id: str):
+    """Eviction hook: drop a stale registry entry and close its Deepgram connection"""
+    dg_conn = TTS_REGISTRY.pop(session_id, None)
+    TTS_CONTROLS.pop(session_id, None)
+    if dg_conn is not None:
+        try:
+            asyncio.get_running_loop().run_in_executor(None, dg_conn.finish)
+        except RuntimeError:
+            dg_conn.finish()
+
+
+register_eviction_hook(release_tts_session)
+
+
 async def tts_server_speak(session_id: str, text: str, flush: bool = False) -> bool:
     try:
         dg_conn = TTS_REGISTRY.get(session_id)
         if not dg_conn:
             print(f"⚠️ TTS SERVER SPEAK: No active TTS connection for session {session_id}")
+            owner = get_session_affinity(session_id).get("tts_ws", {}).get("worker")
+            if owner and owner != WORKER_ID:
+                print(f"⚠️ TTS SERVER SPEAK: session {session_id} is held by worker {owner}, not {WORKER_ID}")
             return False
         from .deepgram_tts_websocket import sanitize_speak_text  # local import guard
     except Exception:
@@ -23,6 +72,10 @@ async def tts_server_speak(session_id: str, text: str, flush: bool = False) -> b
         cleaned = sanitize_speak_text(text)
         if not cleaned:
             return False
+        controls = TTS_CONTROLS.get(session_id)
+        if controls:
+            controls["resume"]()
+        trace_mark(session_id, "tts_request", once=True, mode="stream")
         dg_conn.send_text(cleaned)
         if flush:
             dg_conn.flush()
@@ -86,10 +139,9 @@ class DeepgramTTSWebSocketHandler:
             session_id = websocket.query_params.get("session_id") or "tts"
 
             # Optional first JSON config message
-            default_model = "aura-2-estrella-es"
-            model_id = default_model
-            encoding = "linear16"
-            sample_rate = 16000
+            model_id = DEFAULT_TTS_OPTIONS["model"]
+            encoding = DEFAULT_TTS_OPTIONS["encoding"]
+            sample_rate = DEFAULT_TTS_OPTIONS["sample_rate"]
             container = "wav"
             language_code = websocket.query_params.get("language") or "es"
 
@@ -111,11 +163,41 @@ class DeepgramTTSWebSocketHandler:
                 "defaults": {"model": model_id, "encoding": encoding, "sample_rate": sample_rate, "container": container}
             }))
 
-            # Prepare Deepgram connection
-            dg_conn = self.dg.speak.websocket.v("1")
+            # Deepgram connection, checked out of the pool once the options are known
+            dg_conn = None
             loop = asyncio.get_running_loop()
-            audio_queue: asyncio.Queue[bytes] = asyncio.Queue()
+            # Bounded, frame-coalescing buffer between the SDK thread and the client socket;
+            # created once the audio format is known
+            output: Optional[AudioOutputStage] = None
             total_audio_bytes = 0
+            # Set on barge-in: late audio from the cleared utterance is dropped until Deepgram
+            # confirms the Clear or new text is sent
+            clearing = False
+            # Monotonic time at which the audio already sent to the client finishes playing
+            playback_until = 0.0
+
+            def interrupt_playback():
+                nonlocal clearing, playback_until
+                clearing = True
+                playback_until = 0.0
+                try:
+                    dg_conn.clear()
+                except Exception as e:
+                    print(f"⚠️ TTS INTERRUPT: clear failed for {session_id}: {e}")
+                dropped = output.clear() if output else 0
+                print(f"✋ TTS INTERRUPT: session={session_id} dropped {dropped} buffered bytes")
+                asyncio.create_task(websocket.send_text(json.dumps({"type": "stop_playback", "reason": "barge_in"})))
+
+            def resume_audio():
+                nonlocal clearing
+                clearing = False
+
+            def is_playing() -> bool:
+                return time.monotonic() < playback_until or (output is not None and output.buffered_bytes() > 0)
+
+            def send_speak(text: str):
+                resume_audio()
+                dg_conn.send_text(text)
 
             def on_open(self_ref, open, **kwargs):
                 asyncio.run_coroutine_threadsafe(
@@ -125,8 +207,10 @@ class DeepgramTTSWebSocketHandler:
 
             def on_audio(self_ref, data: bytes, **kwargs):
                 nonlocal total_audio_bytes
+                if clearing or output is None:
+                    return
                 total_audio_bytes += len(data)
-                asyncio.run_coroutine_threadsafe(audio_queue.put(data), loop)
+                output.push(data)
 
             def on_close(self_ref, close, **kwargs):
                 asyncio.run_coroutine_threadsafe(
@@ -140,10 +224,19 @@ class DeepgramTTSWebSocketHandler:
                     loop
                 )
 
-            dg_conn.on(SpeakWebSocketEvents.Open, on_open)
-            dg_conn.on(SpeakWebSocketEvents.AudioData, on_audio)
-            dg_conn.on(SpeakWebSocketEvents.Close, on_close)
-            dg_conn.on(SpeakWebSocketEvents.Error, on_error)
+            handlers = {
+                SpeakWebSocketEvents.Open: on_open,
+                SpeakWebSocketEvents.AudioData: on_audio,
+                SpeakWebSocketEvents.Close: on_close,
+                SpeakWebSocketEvents.Error: on_error,
+            }
+            cleared_event = getattr(SpeakWebSocketEvents, "Cleared", None)
+            if cleared_event is not None:
+                handlers[cleared_event] = lambda self_ref, cleared=None, **kwargs: loop.call_soon_threadsafe(resume_audio)
+            flushed_event = getattr(SpeakWebSocketEvents, "Flushed", None)
+            if flushed_event is not None:
+                # End of a Speak+Flush: send the partial last frame instead of waiting for more audio
+                handlers[flushed_event] = lambda self_ref, flushed=None, **kwargs: output and output.flush()
 
             # Try to read an initial config message (non-blocking short timeout)
             try:
@@ -169,20 +262,30 @@ class DeepgramTTSWebSocketHandler:
                 "encoding": encoding,
                 "sample_rate": sample_rate,
             }
-            if dg_conn.start(opts) is False:
+            output = AudioOutputStage(loop, sample_rate=sample_rate, encoding=encoding, label=session_id)
+            from deepgram_pool import tts_pool
+            try:
+                dg_conn = await tts_pool.checkout(opts, handlers)
+            except Exception as e:
+                print(f"❌ TTS: failed to start Deepgram connection: {e}")
                 await websocket.send_text(json.dumps({"type": "error", "message": "Failed to start Deepgram TTS"}))
                 return
 
-            # Register this session for server-driven Speak
+            # Register this session for server-driven Speak and barge-in
             TTS_REGISTRY[session_id] = dg_conn
+            TTS_CONTROLS[session_id] = {"interrupt": interrupt_playback, "resume": resume_audio, "is_playing": is_playing}
+            set_session_affinity(session_id, "tts_ws")
+
+            bytes_per_second = max(1, sample_rate * (1 if encoding in ("mulaw", "alaw") else 2))
 
             async def forward_audio_to_client():
+                nonlocal playback_until
                 first_chunk_sent = False
                 try:
-                    while True:
-                        data = await audio_queue.get()
+                    async for data in output.frames():
                         if websocket.client_state.value >= 3:
                             break
+                        trace_mark(session_id, "tts_first_byte", once=True)
                         if not first_chunk_sent:
                             first_chunk_sent = True
                             try:
@@ -200,6 +303,9 @@ class DeepgramTTSWebSocketHandler:
                             except Exception:
                                 pass
                         await websocket.send_bytes(data)
+                        trace_mark(session_id, "playback_start", once=True, via="tts_stream")
+                        now = time.monotonic()
+                        playback_until = max(playback_until, now) + len(data) / bytes_per_second
                 except Exception:
                     pass
 
@@ -212,7 +318,7 @@ class DeepgramTTSWebSocketHandler:
                     if obj.get("type") == "Speak":
                         cleaned = sanitize_speak_text(obj.get("text", ""))
                         if cleaned:
-                            dg_conn.send_text(cleaned)
+                            send_speak(cleaned)
                         else:
                             asyncio.run_coroutine_threadsafe(websocket.send_text(json.dumps({"type":"warning","message":"Ignored non-plain Speak payload"})), loop)
                     elif obj.get("type") == "Flush":
@@ -220,7 +326,7 @@ class DeepgramTTSWebSocketHandler:
                 except Exception:
                     cleaned = sanitize_speak_text(first_pending_speak)
                     if cleaned:
-                        dg_conn.send_text(cleaned)
+                        send_speak(cleaned)
                         dg_conn.flush()
                     else:
                         asyncio.run_coroutine_threadsafe(websocket.send_text(json.dumps({"type":"warning","message":"Ignored non-plain first message"})), loop)
@@ -248,7 +354,7 @@ class DeepgramTTSWebSocketHandler:
                             if mtype == "Speak":
                                 cleaned = sanitize_speak_text(payload.get("text", ""))
                                 if cleaned:
-                                    dg_conn.send_text(cleaned)
+                                    send_speak(cleaned)
                                 else:
                                     await websocket.send_text(json.dumps({"type": "warning", "message": "Ignored non-plain Speak payload"}))
                             elif mtype == "Flush":
@@ -261,7 +367,7 @@ class DeepgramTTSWebSocketHandler:
                             else:
                                 cleaned = sanitize_speak_text(message["text"])
                                 if cleaned:
-                                    dg_conn.send_text(cleaned)
+                                    send_speak(cleaned)
                                     dg_conn.flush()
                                 else:
                                     await websocket.send_text(json.dumps({"type": "warning", "message": "Ignored non-plain text payload"}))
@@ -276,7 +382,9 @@ class DeepgramTTSWebSocketHandler:
                     dg_conn.finish()
                 except Exception:
                     pass
+                output.close()
                 audio_task.cancel()
+                print(f"🔊 TTS OUTPUT: session={session_id} {output.snapshot()}")
 
             # Telemetry + credits
             try:
@@ -327,7 +435,9 @@ class DeepgramTTSWebSocketHandler:
                 pass
         finally:
             try:
-                TTS_REGISTRY.pop(session_id, None)
+                if TTS_REGISTRY.pop(session_id, None) is not None:
+                    clear_session_affinity(session_id, "tts_ws")
+                TTS_CONTROLS.pop(session_id, None)
             except Exception:
                 pass
             try:
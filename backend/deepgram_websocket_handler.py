@@ -11,6 +11,19 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Live options of the /deepgram/websocket/test transcription endpoint (also warmed in the pool)
+DEEPGRAM_TEST_LIVE_OPTIONS = LiveOptions(
+    model="nova-2",
+    language="es-419",  # Spanish (Latin America)
+    punctuate=True,
+    interim_results=True,
+    encoding="linear16",
+    channels=1,
+    sample_rate=16000,
+    vad_events=True,
+    endpointing=300,  # ms of silence to end an utterance
+)
+
 class DeepgramWebSocketHandler:
     def __init__(self):
         self.deepgram_api_key = os.getenv("DEEPGRAM_API_KEY")
@@ -62,9 +75,6 @@ class DeepgramWebSocketHandler:
                 "original_session_id": session_id
             }))
             
-            # Create Deepgram live connection
-            conn = self.dg.listen.websocket.v("1")
-            
             # Set up Deepgram event handlers
             def on_open(conn, open, **kwargs):
                 if not is_disconnected:
@@ -191,27 +201,14 @@ class DeepgramWebSocketHandler:
                         loop
                     )
             
-            # Register event handlers
-            conn.on(LiveTranscriptionEvents.Open, on_open)
-            conn.on(LiveTranscriptionEvents.Transcript, on_transcript)
-            conn.on(LiveTranscriptionEvents.Error, on_error)
-            conn.on(LiveTranscriptionEvents.Close, on_close)
-            
-            # Configure Deepgram options (matching your terminal version)
-            opts = LiveOptions(
-                model="nova-2",
-                language="es-419",  # Spanish (Latin America)
-                punctuate=True,
-                interim_results=True,
-                encoding="linear16",
-                channels=1,
-                sample_rate=16000,
-                vad_events=True,
-                endpointing=300,  # ms of silence to end an utterance
-            )
-            
-            # Start Deepgram connection
-            conn.start(opts)
+            # Take a pre-opened Deepgram connection (or open one) with our handlers attached
+            from deepgram_pool import stt_pool
+            conn = await stt_pool.checkout(DEEPGRAM_TEST_LIVE_OPTIONS, {
+                LiveTranscriptionEvents.Open: on_open,
+                LiveTranscriptionEvents.Transcript: on_transcript,
+                LiveTranscriptionEvents.Error: on_error,
+                LiveTranscriptionEvents.Close: on_close,
+            })
             
             # Handle incoming audio data from frontend and outgoing messages from Deepgram
             try:
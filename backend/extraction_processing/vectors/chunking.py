@@ -0,0 +1,124 @@
+import os
+import re
+from collections import deque
+from typing import Iterator, List
+
+# RAG chunks are built from whole sentences packed up to CHUNK_TOKENS (cl100k tokens, the
+# embedding model's tokenizer), preferring to close a chunk at a paragraph break, and overlap
+# by the trailing sentences that fit in CHUNK_OVERLAP_TOKENS. Only a sentence longer than a
+# whole chunk is split, at word boundaries.
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+
+_PARAGRAPH = re.compile(r"\S(?:.*?\S)?(?=\s*\n\s*\n|\s*$)", re.DOTALL)
+_SENTENCE_END = re.compile(r"(?<=[.!?…。])[\"')\]]*\s+")
+
+_encoding = None
+_encoding_failed = False
+
+
+def get_encoding():
+    """The cl100k_base encoder, loaded once per process; None when tiktoken is unavailable"""
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            _encoding_failed = True
+            print(f"⚠️ tiktoken unavailable, estimating tokens as chars/4: {e}")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens in text using tiktoken"""
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // 4  # Rough estimation (1 token ≈ 4 characters)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _split_long(sentence: str, max_tokens: int) -> Iterator[str]:
+    """A sentence over max_tokens, split at word boundaries (words longer than a chunk by characters)"""
+    words, current, current_tokens = sentence.split(), [], 0
+    for word in words:
+        tokens = count_tokens(" " + word)
+        if tokens > max_tokens:
+            step = max(1, max_tokens * 4)
+            pieces = [word[i:i + step] for i in range(0, len(word), step)]
+        else:
+            pieces = [word]
+        for piece in pieces:
+            piece_tokens = tokens if len(pieces) == 1 else count_tokens(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                yield " ".join(current)
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        yield " ".join(current)
+
+
+def _units(text: str, max_tokens: int) -> Iterator[tuple]:
+    """(sentence, tokens, starts_paragraph) in text order"""
+    for paragraph in _PARAGRAPH.finditer(text):
+        first = True
+        for sentence in _SENTENCE_END.split(paragraph.group()):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            tokens = count_tokens(sentence)
+            pieces = [(sentence, tokens)] if tokens <= max_tokens else \
+                [(piece, count_tokens(piece)) for piece in _split_long(sentence, max_tokens)]
+            for piece, piece_tokens in pieces:
+                yield piece, piece_tokens, first
+                first = False
+
+
+def _join(units) -> str:
+    text = ""
+    for sentence, _, starts_paragraph in units:
+        if text:
+            text += "\n\n" if starts_paragraph else " "
+        text += sentence
+    return text
+
+
+def iter_text_chunks(text: str, chunk_tokens: int = CHUNK_TOKENS,
+                     overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> Iterator[str]:
+    """Yield chunks of at most ~chunk_tokens as the text is read, so large documents are never
+    held as a full chunk list"""
+    if not text or not text.strip():
+        return
+    chunk_tokens = max(1, chunk_tokens)
+    overlap_tokens = max(0, min(overlap_tokens, chunk_tokens // 2))
+    current: deque = deque()
+    current_tokens = 0
+    fresh = 0  # Units in current that were not in the previous chunk
+
+    for unit in _units(text, chunk_tokens):
+        _, tokens, starts_paragraph = unit
+        full = current_tokens + tokens > chunk_tokens
+        # A paragraph break past half a chunk is a better place to stop than mid-paragraph
+        at_break = starts_paragraph and current_tokens >= chunk_tokens // 2
+        if fresh and (full or at_break):
+            yield _join(current)
+            # Keep the trailing sentences that fit the overlap
+            kept, kept_tokens = deque(), 0
+            while current and kept_tokens + current[-1][1] <= overlap_tokens \
+                    and kept_tokens + current[-1][1] + tokens <= chunk_tokens:
+                kept_tokens += current[-1][1]
+                kept.appendleft(current.pop())
+            current, current_tokens, fresh = kept, kept_tokens, 0
+        current.append(unit)
+        current_tokens += tokens
+        fresh += 1
+    if fresh:
+        yield _join(current)
+
+
+def chunk_text(text: str, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """Split text into overlapping, sentence-aligned chunks"""
+    return list(iter_text_chunks(text, chunk_tokens, overlap_tokens))
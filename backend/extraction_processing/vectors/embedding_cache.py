@@ -0,0 +1,161 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+# Embeddings keyed by (model, sha256 of the exact chunk text), so re-uploaded files, re-crawled
+# sites and re-created companies only pay for chunks that actually changed. Stored in a local
+# SQLite file (WAL, shared by the workers on a host) as float32 blobs: 6 KB per ada-002 vector.
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(tempfile.gettempdir(), "pulpoo-embeddings.sqlite3"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+# For the savings estimate (text-embedding-ada-002 list price)
+EMBEDDING_PRICE_PER_1M_TOKENS = float(os.getenv("EMBEDDING_PRICE_PER_1M_TOKENS", "0.10"))
+
+# SQLite variables per IN (...) query
+_LOOKUP_SLICE = 500
+
+
+def embedding_cache_key(model: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model}\x1f{text}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path if EMBEDDING_CACHE_ENABLED else ""
+        self.max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "pruned": 0, "errors": 0,
+                      "tokens_saved": 0, "seconds_saved": 0.0}
+        # Running average of the API time per embedded input, to estimate the time hits save
+        self._api_seconds = 0.0
+        self._api_inputs = 0
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None and self.path:
+            try:
+                conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute("""CREATE TABLE IF NOT EXISTS embeddings (
+                    key BLOB PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    dim INTEGER NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                )""")
+                conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+                conn.commit()
+                self._conn = conn
+                print(f"🗄️ EMBEDDING CACHE: {self.path}")
+            except Exception as e:
+                print(f"⚠️ EMBEDDING CACHE: disabled: {e}")
+                self.path = ""
+        return self._conn
+
+    def get_many(self, model: str, texts: Sequence[str], token_counts: Sequence[int] = None) -> List[Optional[List[float]]]:
+        """Cached embeddings in texts order; None for misses"""
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        if not texts:
+            return results
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return results
+            keys = [embedding_cache_key(model, text) for text in texts]
+            found = {}
+            try:
+                unique_keys = list(dict.fromkeys(keys))
+                for start in range(0, len(unique_keys), _LOOKUP_SLICE):
+                    part = unique_keys[start:start + _LOOKUP_SLICE]
+                    rows = conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part).fetchall()
+                    found.update(rows)
+                if found:
+                    now = time.time()
+                    conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+                    conn.commit()
+            except sqlite3.Error as e:
+                self.stats["errors"] += 1
+                print(f"⚠️ EMBEDDING CACHE: lookup failed: {e}")
+                return results
+            per_input = self._api_seconds / self._api_inputs if self._api_inputs else 0.0
+            for i, key in enumerate(keys):
+                blob = found.get(key)
+                if blob is None:
+                    self.stats["misses"] += 1
+                    continue
+                results[i] = array("f", blob).tolist()
+                self.stats["hits"] += 1
+                self.stats["seconds_saved"] += per_input
+                if token_counts is not None:
+                    self.stats["tokens_saved"] += token_counts[i]
+        return results
+
+    def put_many(self, model: str, texts: Sequence[str], embeddings: Sequence[Optional[List[float]]]):
+        rows = [(embedding_cache_key(model, text), model, len(embedding), array("f", embedding).tobytes(), time.time())
+                for text, embedding in zip(texts, embeddings) if embedding]
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return
+            try:
+                conn.executemany("INSERT OR REPLACE INTO embeddings (key, model, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)", rows)
+                conn.commit()
+                self.stats["stores"] += len(rows)
+                self._writes_since_prune += len(rows)
+                if self._writes_since_prune >= 1000:
+                    self._writes_since_prune = 0
+                    self._prune(conn)
+            except sqlite3.Error as e:
+                self.stats["errors"] += 1
+                print(f"⚠️ EMBEDDING CACHE: store failed: {e}")
+
+    def record_api_time(self, inputs: int, seconds: float):
+        with self._lock:
+            self._api_inputs += inputs
+            self._api_seconds += seconds
+
+    def _prune(self, conn: sqlite3.Connection):
+        """Drop the least recently used entries above max_entries"""
+        (count,) = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            conn.execute("DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,))
+            conn.commit()
+            self.stats["pruned"] += excess
+
+    def snapshot(self) -> Dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        entries = None
+        with self._lock:
+            conn = self._connection()
+            if conn is not None:
+                try:
+                    (entries,) = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+                except sqlite3.Error:
+                    pass
+        return {
+            **self.stats,
+            "seconds_saved": round(self.stats["seconds_saved"], 2),
+            "hit_ratio": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            "estimated_cost_saved_usd": round(self.stats["tokens_saved"] * EMBEDDING_PRICE_PER_1M_TOKENS / 1_000_000, 4),
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "path": self.path or None,
+        }
+
+
+embedding_cache = EmbeddingCache()
+
+
+def get_embedding_cache_stats() -> Dict:
+    return embedding_cache.snapshot()
@@ -1,8 +1,13 @@
 import os 
+import asyncio
+from itertools import islice
+from typing import Iterable, Optional
 from dotenv import load_dotenv
 from supabase import create_client
-from openai import OpenAI
-import tiktoken
+from openai import OpenAI, AsyncOpenAI
+import time
+from extraction_processing.vectors.embedding_cache import embedding_cache
+from extraction_processing.vectors.chunking import count_tokens, chunk_text, iter_text_chunks
 
 load_dotenv()
 
@@ -17,72 +22,152 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 openai_client = OpenAI(api_key=OPENAI_API_KEY)
+async_openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
 
+#----------Embeddings---------
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+# Inputs per embeddings request (the API takes up to 2048) and a token cap per request
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "128"))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "200000"))
+# Embedding requests in flight at once, across batches
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "3"))
+# Rows per document_embeddings insert
+EMBEDDING_INSERT_BATCH_SIZE = int(os.getenv("EMBEDDING_INSERT_BATCH_SIZE", "500"))
+# Chunks pulled from the chunk stream per embed+insert round, so ingestion memory stays bounded
+EMBEDDING_INGEST_WINDOW = int(os.getenv("EMBEDDING_INGEST_WINDOW", str(EMBEDDING_BATCH_SIZE * EMBEDDING_CONCURRENCY)))
 
-def count_tokens(text: str) -> int:
-    """Count tokens in text using tiktoken"""
-    try:
-        encoding = tiktoken.get_encoding("cl100k_base")
-        return len(encoding.encode(text))
-    except:
-        # Fallback: rough estimation (1 token ≈ 4 characters)
-        return len(text) // 4
-
-def chunk_text(text: str, chunk_size: int = 500, overlap: int = 200) -> list[str]:
-    """Split text into overlapping chunks"""
-    chunks = []
-    start = 0
-    
-    while start < len(text):
-        end = start + chunk_size
-        chunk = text[start:end]
-        chunks.append(chunk)
-        start = end - overlap
-        
-        if start >= len(text):
-            break
-    
-    return chunks
 
 async def get_embedding(text: str) -> list[float]:
-    """Get embedding for text using OpenAI"""
-    try:
-        response = openai_client.embeddings.create(
-            input=text,
-            model="text-embedding-ada-002"
-        )
-        return response.data[0].embedding
-    except Exception as e:
-        print(f"Error getting embedding: {e}")
-        return []
+    """Get embedding for text using OpenAI (through the embedding cache)"""
+    return (await get_embeddings([text]))[0] or []
+
+def _embedding_batches(indexes: list[int], token_counts: list[int]) -> list[list[int]]:
+    """indexes grouped by EMBEDDING_BATCH_SIZE and EMBEDDING_BATCH_MAX_TOKENS"""
+    batches, current, current_tokens = [], [], 0
+    for i in indexes:
+        tokens = token_counts[i]
+        if current and (len(current) >= EMBEDDING_BATCH_SIZE or current_tokens + tokens > EMBEDDING_BATCH_MAX_TOKENS):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+async def _embed_batch(texts: list[str]) -> list[Optional[list[float]]]:
+    """Embed one batch, retrying with backoff; a batch that keeps failing is split in halves so
+    one bad input does not cost the whole batch"""
+    for attempt in range(EMBEDDING_MAX_RETRIES + 1):
+        try:
+            response = await async_openai_client.embeddings.create(input=texts, model=EMBEDDING_MODEL)
+            embeddings = [None] * len(texts)
+            for item in response.data:
+                embeddings[item.index] = item.embedding
+            return embeddings
+        except Exception as e:
+            # A rejected input (400) fails the same way every time: go straight to splitting
+            if attempt == EMBEDDING_MAX_RETRIES or getattr(e, "status_code", None) == 400:
+                print(f"Error getting embeddings for batch of {len(texts)}: {e}")
+                break
+            await asyncio.sleep(min(8.0, 0.5 * 2 ** attempt))
+    if len(texts) == 1:
+        return [None]
+    middle = len(texts) // 2
+    return await _embed_batch(texts[:middle]) + await _embed_batch(texts[middle:])
+
+async def get_embeddings(texts: list[str]) -> list[Optional[list[float]]]:
+    """Embeddings for many texts, batched and with up to EMBEDDING_CONCURRENCY requests in flight.
+    Texts already in the embedding cache are not sent again.
+    Same order as texts; None where a text is empty or could not be embedded."""
+    embeddings: list[Optional[list[float]]] = [None] * len(texts)
+    # The API rejects empty input
+    indexes = [i for i, text in enumerate(texts) if text and text.strip()]
+    token_counts = [count_tokens(text) if text else 0 for text in texts]
+    cached = await asyncio.to_thread(embedding_cache.get_many, EMBEDDING_MODEL, [texts[i] for i in indexes],
+                                     [token_counts[i] for i in indexes])
+    for i, embedding in zip(indexes, cached):
+        embeddings[i] = embedding
+    missing = [i for i in indexes if embeddings[i] is None]
+    semaphore = asyncio.Semaphore(max(1, EMBEDDING_CONCURRENCY))
 
-async def store_embeddings_in_supabase(chunks: list[str], company_id: str, file_path: str):
-    """Store text chunks and their embeddings in Supabase"""
+    async def run(batch: list[int]):
+        batch_texts = [texts[i] for i in batch]
+        async with semaphore:
+            start_time = time.time()
+            results = await _embed_batch(batch_texts)
+            embedding_cache.record_api_time(len(batch), time.time() - start_time)
+        for i, embedding in zip(batch, results):
+            embeddings[i] = embedding
+        await asyncio.to_thread(embedding_cache.put_many, EMBEDDING_MODEL, batch_texts, results)
+
+    await asyncio.gather(*(run(batch) for batch in _embedding_batches(missing, token_counts)))
+    if len(texts) > 1:
+        print(f"🧮 EMBEDDINGS: {len(indexes) - len(missing)} of {len(indexes)} chunks from cache, {len(missing)} embedded")
+    return embeddings
+
+async def _insert_embedding_rows(rows: list[dict]) -> int:
+    """Bulk insert in EMBEDDING_INSERT_BATCH_SIZE slices (retried); returns the rows stored"""
+    stored = 0
+    for start in range(0, len(rows), EMBEDDING_INSERT_BATCH_SIZE):
+        batch = rows[start:start + EMBEDDING_INSERT_BATCH_SIZE]
+        for attempt in range(EMBEDDING_MAX_RETRIES + 1):
+            try:
+                await asyncio.to_thread(lambda: supabase.table('document_embeddings').insert(batch).execute())
+                stored += len(batch)
+                break
+            except Exception as e:
+                if attempt == EMBEDDING_MAX_RETRIES:
+                    print(f"Error inserting {len(batch)} embeddings (rows {start}-{start + len(batch) - 1}): {e}")
+                else:
+                    await asyncio.sleep(min(8.0, 0.5 * 2 ** attempt))
+    return stored
+
+async def store_embeddings_in_supabase(chunks: Iterable[str], company_id: str, file_path: str) -> int:
+    """Store text chunks and their embeddings in Supabase; returns how many were stored.
+    chunks may be a generator (iter_text_chunks): it is consumed EMBEDDING_INGEST_WINDOW chunks
+    at a time, and each window's insert overlaps the next window's embedding requests."""
+    chunks = iter(chunks)
+    total, stored, chunk_index = 0, 0, 0
+    pending_insert: Optional[asyncio.Task] = None
     try:
-        embeddings_data = []
-        
-        for i, chunk in enumerate(chunks):
-            embedding = await get_embedding(chunk)
-            if embedding:
-                embeddings_data.append({
-                    'company_id': company_id,
-                    'file_path': file_path,
-                    'chunk_index': i,
-                    'content': chunk,
-                    'embedding': embedding,
-                    'token_count': count_tokens(chunk)
-                })
-        
-        # Insert embeddings into Supabase
-        if embeddings_data:
-            result = supabase.table('document_embeddings').insert(embeddings_data).execute()
-            print(f"Stored {len(embeddings_data)} embeddings for {file_path}")
-            return True
-        return False
-        
+        while True:
+            window = list(islice(chunks, max(1, EMBEDDING_INGEST_WINDOW)))
+            if not window:
+                break
+            total += len(window)
+            embeddings = await get_embeddings(window)
+            embeddings_data = []
+            for chunk, embedding in zip(window, embeddings):
+                if embedding:
+                    embeddings_data.append({
+                        'company_id': company_id,
+                        'file_path': file_path,
+                        'chunk_index': chunk_index,
+                        'content': chunk,
+                        'embedding': embedding,
+                        'token_count': count_tokens(chunk)
+                    })
+                chunk_index += 1
+            if pending_insert is not None:
+                stored += await pending_insert
+            pending_insert = asyncio.create_task(_insert_embedding_rows(embeddings_data)) if embeddings_data else None
+        if pending_insert is not None:
+            stored += await pending_insert
+            pending_insert = None
     except Exception as e:
         print(f"Error storing embeddings: {e}")
-        return False
+    finally:
+        if pending_insert is not None:
+            pending_insert.cancel()
+
+    failed = total - stored
+    if failed:
+        print(f"⚠️ {failed} of {total} chunks could not be embedded or stored for {file_path}")
+    print(f"Stored {stored} embeddings for {file_path}")
+    return stored
 
 async def search_similar_chunks(query: str, company_id: str, top_k: int = 5) -> list[dict]:
     """Search for similar chunks using vector similarity"""
@@ -0,0 +1,85 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+import httpx
+
+# Shared async HTTP clients, one per provider. Each keeps its own keep-alive pool (HTTP/2 when
+# the h2 package is installed), timeouts and concurrency limit, so a slow provider neither
+# blocks the event loop nor starves calls to the others.
+# Per-provider overrides: HTTP_<PROVIDER>_TIMEOUT_S, HTTP_<PROVIDER>_MAX_CONCURRENCY
+PROVIDER_SETTINGS = {
+    "deepgram": {"timeout_s": 60.0, "connect_timeout_s": 5.0, "max_concurrency": 32},
+    "elevenlabs": {"timeout_s": 60.0, "connect_timeout_s": 5.0, "max_concurrency": 16},
+    "whatsapp": {"timeout_s": 15.0, "connect_timeout_s": 5.0, "max_concurrency": 16},
+    "pulpoo": {"timeout_s": 10.0, "connect_timeout_s": 5.0, "max_concurrency": 8},
+    "default": {"timeout_s": 30.0, "connect_timeout_s": 5.0, "max_concurrency": 16},
+}
+HTTP_KEEPALIVE_EXPIRY_S = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_S", "60"))
+
+try:
+    import h2  # noqa: F401  (httpx only speaks HTTP/2 with it installed)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def _settings(provider: str) -> Dict:
+    settings = dict(PROVIDER_SETTINGS.get(provider, PROVIDER_SETTINGS["default"]))
+    prefix = f"HTTP_{provider.upper()}_"
+    settings["timeout_s"] = float(os.getenv(prefix + "TIMEOUT_S", settings["timeout_s"]))
+    settings["max_concurrency"] = int(os.getenv(prefix + "MAX_CONCURRENCY", settings["max_concurrency"]))
+    return settings
+
+
+def get_http_client(provider: str) -> httpx.AsyncClient:
+    """Process-wide client for a provider, created on first use"""
+    client = _clients.get(provider)
+    if client is None or client.is_closed:
+        settings = _settings(provider)
+        client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(settings["timeout_s"], connect=settings["connect_timeout_s"]),
+            limits=httpx.Limits(
+                max_connections=settings["max_concurrency"],
+                max_keepalive_connections=settings["max_concurrency"],
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_S,
+            ),
+        )
+        _clients[provider] = client
+        _semaphores[provider] = asyncio.Semaphore(settings["max_concurrency"])
+        print(f"🌐 HTTP CLIENT {provider}: created (http2={HTTP2_AVAILABLE}, timeout={settings['timeout_s']}s, max_concurrency={settings['max_concurrency']})")
+    return client
+
+
+async def http_request(provider: str, method: str, url: str, **kwargs) -> httpx.Response:
+    """Send a request on the provider's pooled client; the body is read before returning"""
+    client = get_http_client(provider)
+    async with _semaphores[provider]:
+        return await client.request(method, url, **kwargs)
+
+
+@asynccontextmanager
+async def http_stream(provider: str, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+    """Streaming request: the body is read inside the block (aiter_bytes); the concurrency slot
+    is held until the block exits
+    """
+    client = get_http_client(provider)
+    async with _semaphores[provider]:
+        async with client.stream(method, url, **kwargs) as response:
+            yield response
+
+
+async def close_http_clients():
+    for provider, client in list(_clients.items()):
+        try:
+            await client.aclose()
+        except Exception as e:
+            print(f"⚠️ HTTP CLIENT {provider}: error on close: {e}")
+    _clients.clear()
+    _semaphores.clear()
+
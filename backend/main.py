@@ -527,6 +527,8 @@ def activate_prompt_for_company(company_id:str, prompt_id:str):
     deactivate_result = supabase.table("prompts").update({"active": False}).eq("company_id", company_id).execute()
     #then activate the new prompt
     activate_result = supabase.table("prompts").update({"active": True}).eq("company_id", company_id).eq("id", prompt_id).execute()
+    from agent.profile_cache import invalidate_agent_profile
+    invalidate_agent_profile(company_id)
     if activate_result.data:
         return "prompt activated"
     else:
@@ -705,8 +707,11 @@ async def get_system_prompt_with_training(company_id: str) -> str:
     return await get_system_prompt_helper(company_id)
 
 # ===== MODIFIED AGENT RESPONSE FUNCTION =====
-async def initialize_gemini_model_async():
-    return genai.GenerativeModel('gemini-2.5-flash-lite')
+GEMINI_AGENT_MODEL = os.getenv("GEMINI_AGENT_MODEL", "gemini-2.5-flash")
+
+async def initialize_gemini_model_async(system_instruction: str = None, tools: list = None):
+    """Agent model; the company prompt and tools travel as system_instruction/tools instead of chat messages"""
+    return genai.GenerativeModel(GEMINI_AGENT_MODEL, system_instruction=system_instruction or None, tools=tools or None)
 
 async def start_chat_async(model):
     """Async wrapper for start_chat"""
@@ -716,10 +721,6 @@ async def get_system_prompt_with_training_async(company_id: str) -> str:
     """Async wrapper for system prompt function"""
     return get_system_prompt_with_training(company_id)
 
-async def initialize_gemini_model_async():
-    """Async wrapper for model initialization"""
-    return genai.GenerativeModel('gemini-2.5-flash')
-
 
 from agent.agent import get_agent_response_with_training_helper
 
@@ -739,10 +740,13 @@ async def voice_agent(session_id: str = Form(...), audio: UploadFile = File(...)
     return await voice_agent_helper(session_id, audio)
 
 @app.post("/agent/voice/text")
-async def voice_agent_text(session_id: str = Form(...), user_text: str = Form(...)):
-    """Voice agent endpoint that accepts transcribed text and returns AI response"""
+async def voice_agent_text(session_id: str = Form(...), user_text: str = Form(...), stream_tts: bool = Form(False)):
+    """Voice agent endpoint that accepts transcribed text and returns AI response.
+    With stream_tts=true the reply is spoken sentence by sentence into the session's open
+    /tts/deepgram/stream connection instead of being returned as base64 audio.
+    """
     from voice_agent_text import voice_agent_text_helper
-    return await voice_agent_text_helper(session_id, user_text)
+    return await voice_agent_text_helper(session_id, user_text, tts_mode="stream" if stream_tts else "rest")
 
 @app.get("/api/credits/check-voice-session")
 async def check_voice_session_credits(current_user: str = Depends(get_current_user)):
@@ -792,6 +796,8 @@ async def create_api_connection(company_id: str, conn: APIConnectionCreate, sb:
     }
 
     created = sb.table("api_connections").insert(conn_data).execute().data[0]
+    from agent.profile_cache import invalidate_agent_profile
+    invalidate_agent_profile(company_id)
     return {"message": "API connection created", "api_connection_id": created["id"]}
 
 from consent.consents import update_user_consent_helper, get_user_consents_helper, export_user_data_helper, delete_user_data_helper
@@ -1293,6 +1299,12 @@ async def voice_websocket(websocket: WebSocket, company_id: str, session_id: str
     user_id = websocket.query_params.get("user_id")
     await handle_voice_websocket(websocket, session_id, company_id, user_id)
 
+@app.websocket("/voice/twilio/media/{company_id}")
+async def twilio_media_stream(websocket: WebSocket, company_id: str):
+    """Twilio Media Streams endpoint: μ-law 8 kHz call audio in, agent speech out"""
+    from manage_twilio.twilio_media_stream import handle_twilio_media_stream
+    await handle_twilio_media_stream(websocket, company_id)
+
 @app.post("/whatsapp/webhook")
 async def handle_whatsapp_webhook(request: Request):
     """Handle incoming WhatsApp messages via Twilio"""
@@ -2215,22 +2227,35 @@ async def startup_event():
     asyncio.create_task(periodic_cleanup())
     asyncio.create_task(monitor_bundle_statuses())
     
+    # Pre-open Deepgram STT/TTS connections so calls skip the provider handshake
+    try:
+        from deepgram_pool import start_deepgram_pools
+        await start_deepgram_pools()
+    except Exception as e:
+        print(f"⚠️ Deepgram pool warm-up failed: {e}")
+    
     print("✅ Application started successfully")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    from deepgram_pool import stop_deepgram_pools
+    from http_client import close_http_clients
+    from company.files.document_loader import shutdown_document_workers
+    await stop_deepgram_pools()
+    await close_http_clients()
+    shutdown_document_workers()
+
 async def periodic_cleanup():
-    """Periodically clean up old chat sessions"""
+    """Periodically evict idle sessions (TTL + LRU cap, live connections are kept)"""
+    from session_lifecycle import evict_idle_sessions, SESSION_SWEEP_INTERVAL_S
+    # Register the eviction hooks of the modules holding per-session state
+    import agent.agent, deepgram_tts_websocket, manage_twilio.websocket_voice  # noqa: F401
     while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL_S)
         try:
-            # Import the cleanup function from agent module
-            from agent.agent import cleanup_chat_sessions
-            # Temporarily disable cleanup to prevent session loss
-            # await cleanup_chat_sessions()
-            print("🧹 Periodic cleanup disabled to prevent session loss")
+            evict_idle_sessions()
         except Exception as e:
             print(f"❌ Error in periodic cleanup: {e}")
-        
-        # Wait 5 minutes before next cleanup
-        await asyncio.sleep(300)  # 5 minutes
 
 # Regulatory Bundle Management Endpoints
 @app.get("/api/regulatory/bundles/{company_id}")
@@ -3163,6 +3188,102 @@ from deepgram_tts_websocket import handle_deepgram_tts_websocket
 async def deepgram_tts_stream(websocket: WebSocket):
     await handle_deepgram_tts_websocket(websocket)
 
+@app.get("/api/metrics/deepgram-pool")
+async def deepgram_pool_metrics():
+    """Idle connections per options key and hit/miss counters of the Deepgram connection pools"""
+    from deepgram_pool import get_deepgram_pool_stats
+    return get_deepgram_pool_stats()
+
+@app.get("/api/metrics/turn-traces")
+async def turn_traces(company_id: str, session_id: Optional[str] = None, limit: int = 50,
+                      current_user: Optional[str] = Depends(get_current_user)):
+    """Most recent voice turn waterfalls of a company, newest first, optionally filtered by session"""
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    if not await asyncio.to_thread(verify_company_admin, current_user, company_id):
+        raise HTTPException(status_code=403, detail="Access denied: Not a company admin")
+    from turn_trace import get_recent_traces
+    return {"traces": get_recent_traces(session_id=session_id, company_id=company_id, limit=limit)}
+
+@app.get("/api/metrics/turn-traces/stages")
+async def turn_trace_stages(company_id: Optional[str] = None):
+    """p50/p95/p99 per stage, in ms since the final transcript, over the traces in memory"""
+    from turn_trace import get_stage_percentiles
+    return {"stages": get_stage_percentiles(company_id=company_id)}
+
+@app.get("/api/metrics/speculation")
+async def speculation_metrics():
+    """Hit/miss counters and latency saved by speculative voice turns"""
+    from manage_twilio.speculation import get_speculation_stats
+    return get_speculation_stats()
+
+@app.get("/api/metrics/tts-cache")
+async def tts_cache_metrics():
+    """Hit ratio, bytes saved and tier sizes of the synthesized-audio cache"""
+    from audio.tts_cache import get_tts_cache_stats
+    return get_tts_cache_stats()
+
+@app.get("/api/metrics/document-cache")
+async def document_cache_metrics():
+    """Hit ratio and tier sizes of the extracted company-document text cache"""
+    from company.files.document_cache import get_document_cache_stats
+    return get_document_cache_stats()
+
+@app.get("/api/metrics/prompt-budget")
+async def prompt_budget_metrics():
+    """Token breakdown of each company's system prompt and what the document budget kept"""
+    from company.files.prompt_budget import get_prompt_budget_stats
+    return get_prompt_budget_stats()
+
+@app.get("/api/metrics/embedding-cache")
+async def embedding_cache_metrics():
+    """Hit ratio, entries and the tokens/time/cost saved by the chunk embedding cache"""
+    from extraction_processing.vectors.embedding_cache import get_embedding_cache_stats
+    return get_embedding_cache_stats()
+
+@app.get("/api/metrics/chat-history")
+async def chat_history_metrics():
+    """Prompt tokens per turn, history compactions and the estimated tokens they saved"""
+    from agent.history_window import get_history_window_stats
+    return get_history_window_stats()
+
+@app.get("/api/metrics/agent-profiles")
+async def agent_profile_metrics():
+    """Per-company agent profile cache: hit ratio, build times and cached profiles"""
+    from agent.profile_cache import get_agent_profile_stats
+    return get_agent_profile_stats()
+
+@app.post("/api/agent-profiles/{company_id}/invalidate")
+async def invalidate_agent_profile_endpoint(company_id: str, current_user: Optional[str] = Depends(get_current_user)):
+    """Drop a company's cached agent profile (e.g. after editing its data directly in Supabase)"""
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    if not await asyncio.to_thread(verify_company_admin, current_user, company_id):
+        raise HTTPException(status_code=403, detail="Access denied: Not a company admin")
+    from agent.profile_cache import invalidate_agent_profile
+    invalidate_agent_profile(company_id)
+    return {"message": "Agent profile invalidated", "company_id": company_id}
+
+@app.get("/api/metrics/session-store")
+async def session_store_metrics():
+    """Session store backend, this worker's id and entry counts"""
+    from session_store import get_session_store_stats
+    from session_lifecycle import get_session_lifecycle_stats
+    return {**get_session_store_stats(), "lifecycle": get_session_lifecycle_stats()}
+
+@app.get("/api/sessions/{session_id}/affinity")
+async def session_affinity(session_id: str, current_user: Optional[str] = Depends(get_current_user)):
+    """Which worker holds the session's live connections (websocket, TTS stream, Twilio call)"""
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    company_id = (session_metadata.get(session_id) or {}).get("company_id")
+    if not company_id:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if not await asyncio.to_thread(verify_company_admin, current_user, company_id):
+        raise HTTPException(status_code=403, detail="Access denied: Not a company admin")
+    from session_store import get_session_affinity, WORKER_ID
+    return {"session_id": session_id, "connections": get_session_affinity(session_id), "this_worker": WORKER_ID}
+
 from pydantic import BaseModel
 
 class UserCompanyVoicePref(BaseModel):
@@ -30,6 +30,7 @@ def arg(name, type_, location, required, description, example="", enum_vals=None
 def upsert_tool_with_args(sb: Client, company_id: str, api_connection_id: str,
                           name: str, description: str, method: str,
                           endpoint_template: str, args: list[dict]):
+    from agent.profile_cache import invalidate_agent_profile
     # Find existing by (company_id, name)
     existing = sb.table("tools").select("*").eq("company_id", company_id).eq("name", name).execute().data
     if existing:
@@ -46,6 +47,7 @@ def upsert_tool_with_args(sb: Client, company_id: str, api_connection_id: str,
         sb.table("tool_args").delete().eq("tool_id", tool["id"]).execute()
         for a in args:
             sb.table("tool_args").insert({**a, "tool_id": tool["id"]}).execute()
+        invalidate_agent_profile(company_id)
         return tool
     else:
         tool = sb.table("tools").insert({
@@ -59,6 +61,7 @@ def upsert_tool_with_args(sb: Client, company_id: str, api_connection_id: str,
         }).execute().data[0]
         for a in args:
             sb.table("tool_args").insert({**a, "tool_id": tool["id"]}).execute()
+        invalidate_agent_profile(company_id)
         return tool
 
 class ToolRouter:
@@ -226,25 +229,27 @@ def fetch_gemini_tools_and_router(company_id: str):
         print(f"Error fetching tools for company_id {company_id}: {e}")
         return [], {}
 
-def build_gemini_tools_from_supabase(tools_rows: list, company_id: str):
-    """Build Gemini-compatible tools from Supabase data"""
+def build_gemini_tools_from_supabase(tools_rows: list, company_id: str, args_by_tool: dict = None):
+    """Build Gemini-compatible tools from Supabase data; pass args_by_tool (tool_id -> args)
+    when they were already fetched to skip the tool_args query"""
     try:
         if not tools_rows:
             return []
 
-        tool_ids = [t["id"] for t in tools_rows]
-        
-        # Get args for all tools
-        args_res = (supabase.table("tool_args")
-                    .select("*")
-                    .in_("tool_id", tool_ids)
-                    .execute())
-        args_rows = args_res.data or []
+        if args_by_tool is None:
+            tool_ids = [t["id"] for t in tools_rows]
 
-        # Group args by tool_id
-        args_by_tool = {}
-        for a in args_rows:
-            args_by_tool.setdefault(a["tool_id"], []).append(a)
+            # Get args for all tools
+            args_res = (supabase.table("tool_args")
+                        .select("*")
+                        .in_("tool_id", tool_ids)
+                        .execute())
+            args_rows = args_res.data or []
+
+            # Group args by tool_id
+            args_by_tool = {}
+            for a in args_rows:
+                args_by_tool.setdefault(a["tool_id"], []).append(a)
 
         gemini_tools = []
         for t in tools_rows:
@@ -277,6 +282,18 @@ def build_gemini_tools_from_supabase(tools_rows: list, company_id: str):
         print(f"Error building Gemini tools for company_id {company_id}: {e}")
         return []
 
+def build_tool_router(router_spec: dict):
+    """ToolRouter for a router spec, allowing the API host plus the local/dev hosts"""
+    if not router_spec:
+        return None
+    allowed_domains = [
+        re.escape(router_spec["api_base_url"].split("://",1)[-1].split("/")[0]),
+        "39e547b6a29c\\.ngrok-free\\.app",  # Allow ngrok domain
+        "localhost",
+        "127\\.0\\.0\\.1"
+    ]
+    return ToolRouter(router_spec, allowed_domains=allowed_domains)
+
 def build_tool_schema(tool_spec: dict) -> dict:
     """Build a single Gemini tool schema from tool spec"""
     props = {}
@@ -325,22 +342,14 @@ async def dispatch_tool_with_router(name: str, args: dict, company_id: str, user
         
         print(f"🔧 Converted args: {args_dict}")
         
-        # Fetch tools and router from Supabase
-        tools_rows, router_spec =  fetch_gemini_tools_and_router(company_id)
+        # Router from the company's cached agent profile
+        from agent.profile_cache import get_agent_profile
+        router = (await get_agent_profile(company_id))["router"]
         
-        if not tools_rows or not router_spec:
+        if router is None:
             print(f"⚠️ No tools found for company_id: {company_id}")
             return f"No tools configured for company {company_id}"
         
-        # Create router with allowed domains
-        allowed_domains = [
-            re.escape(router_spec["api_base_url"].split("://",1)[-1].split("/")[0]),
-            "39e547b6a29c\\.ngrok-free\\.app",  # Allow ngrok domain
-            "localhost",
-            "127\\.0\\.0\\.1"
-        ]
-        router = ToolRouter(router_spec, allowed_domains=allowed_domains)
-        
         # Execute tool through router
         result = await router.execute(name, args_dict)
         
@@ -192,6 +192,8 @@ def create_or_get_session(company_id: str, source: str, identifier: str = None,
                 print(f"📞 Creating new UUID session for identifier: {identifier} -> {session_id}")
         
         # Create new session in memory
+        from session_lifecycle import touch_session
+        touch_session(session_id)
         sessions[session_id] = {
             "company_id": company_id,
             "mode": source,
@@ -352,9 +354,14 @@ def handle_incoming_voice_call_helper(call_data: IncomingCallData) -> Response:
         # Welcome message
         response.say("Welcome to our AI assistant. Please wait while I connect you.", voice="alice")
         
-        # Connect to voice stream
-        stream_url = f"{BASE_URL}/voice/stream/{company_id}?session_id={session_id}"
-        response.connect().stream(url=stream_url)
+        # Connect the call audio to our media-stream websocket; context goes in <Parameter>s
+        # because Twilio does not forward query strings on stream URLs
+        from manage_twilio.websocket_voice import get_websocket_url
+        stream = response.connect().stream(url=get_websocket_url(company_id))
+        stream.parameter(name="company_id", value=company_id)
+        stream.parameter(name="session_id", value=session_id)
+        if user_id:
+            stream.parameter(name="user_id", value=user_id)
         
         print(f"📞 Voice call routed to AI: {call_data.call_sid} -> {company_id} -> Session: {session_id} -> User: {user_id}")
         
@@ -424,16 +431,15 @@ def handle_voice_stream_helper(stream_config: VoiceStreamConfig) -> Response:
             user_id=user_id  # Now we pass user_id for cost tracking!
         )
         
-        # Get WebSocket URL with user_id parameter
+        # Get the media-stream WebSocket URL; user_id travels as a stream <Parameter>
         websocket_url = get_websocket_url(stream_config.company_id, session_id)
-        if user_id:
-            websocket_url += f"&user_id={user_id}"
         
         # Create TwiML that connects to WebSocket
         twiml_response = create_voice_twiml_with_websocket(
             stream_config.company_id, 
             session_id, 
-            websocket_url
+            websocket_url,
+            user_id=user_id
         )
         
         print(f"🎤 Voice stream configured for session: {session_id} with user_id: {user_id}")
@@ -0,0 +1,194 @@
+import asyncio
+import difflib
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from manage_twilio.utterance_aggregator import normalize_utterance
+
+# Speculative turns: start the agent reply on a stable interim transcript instead of waiting for
+# the end of the utterance. Off by default; can also be enabled per connection (?speculate=1).
+SPECULATION_ENABLED = os.getenv("VOICE_SPECULATION", "false").lower() in ("1", "true", "yes")
+# How long the interim text must stay unchanged before speculating
+SPECULATION_STABLE_MS = int(os.getenv("VOICE_SPECULATION_STABLE_MS", "400"))
+# Minimum similarity between the speculated text and the final utterance to commit the reply
+SPECULATION_MATCH_RATIO = float(os.getenv("VOICE_SPECULATION_MATCH_RATIO", "0.9"))
+# LLM calls allowed per utterance; at most one is in flight per session at any time
+SPECULATION_MAX_PER_UTTERANCE = int(os.getenv("VOICE_SPECULATION_MAX_PER_UTTERANCE", "2"))
+SPECULATION_MIN_CHARS = int(os.getenv("VOICE_SPECULATION_MIN_CHARS", "8"))
+
+# Process-wide counters, exposed on /api/metrics/speculation
+SPECULATION_STATS: Dict[str, float] = {
+    "started": 0,         # speculative LLM calls launched
+    "hits": 0,            # speculations committed as the real turn
+    "misses": 0,          # final utterance differed from the speculated text
+    "tool_fallbacks": 0,  # reply needed a tool call, normal turn ran instead
+    "stale": 0,           # history moved on or reply was empty
+    "errors": 0,
+    "superseded": 0,      # cancelled because the interim text changed or the call ended
+    "saved_ms_total": 0.0,
+    "llm_tokens_total": 0,      # tokens of every speculative LLM call (all billed)
+    "llm_tokens_committed": 0,  # of those, tokens of replies committed as the real turn
+}
+
+
+def texts_match(speculated: str, final: str) -> bool:
+    a, b = normalize_utterance(speculated), normalize_utterance(final)
+    if not a or not b:
+        return False
+    return a == b or difflib.SequenceMatcher(None, a, b).ratio() >= SPECULATION_MATCH_RATIO
+
+
+def record_speculative_tokens(tokens: int):
+    SPECULATION_STATS["llm_tokens_total"] += tokens
+
+
+def record_committed_tokens(tokens: int):
+    SPECULATION_STATS["llm_tokens_committed"] += tokens
+
+
+def get_speculation_stats() -> Dict[str, float]:
+    stats = dict(SPECULATION_STATS)
+    resolved = stats["hits"] + stats["misses"] + stats["tool_fallbacks"] + stats["stale"] + stats["errors"]
+    stats["hit_rate"] = round(stats["hits"] / resolved, 3) if resolved else 0.0
+    stats["avg_saved_ms"] = round(stats["saved_ms_total"] / stats["hits"], 1) if stats["hits"] else 0.0
+    stats["saved_ms_total"] = round(stats["saved_ms_total"], 1)
+    stats["llm_tokens_discarded"] = stats["llm_tokens_total"] - stats["llm_tokens_committed"]
+    return stats
+
+
+class TurnSpeculator:
+    """Run the agent turn early on a stable interim transcript.
+
+    Interim text (plus the FINAL segments the aggregator already holds) that stays unchanged for
+    SPECULATION_STABLE_MS starts a speculative LLM call. When the real utterance is dispatched,
+    take() hands the call over if the texts match and cancels it otherwise. Like the aggregator,
+    the public entry points may be called from the Deepgram thread; state lives on the loop.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, speculate: Callable[[str], Awaitable],
+                 pending_text: Callable[[], str], label: str = ""):
+        self._loop = loop
+        self._speculate = speculate
+        self._pending_text = pending_text
+        self._label = label
+        self._candidate = ""
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._task: Optional[asyncio.Task] = None
+        self._task_text = ""
+        self._attempts = 0
+        self._closed = False
+
+    # ----- thread-safe entry points (called from Deepgram callbacks) -----
+
+    def interim(self, text: str):
+        self._call_soon(self._interim, text)
+
+    def close(self):
+        self._call_soon(self._close)
+
+    # ----- loop-side implementation -----
+
+    def take(self, utterance: str) -> Optional[asyncio.Task]:
+        """Claim the speculation for a dispatched utterance (loop side).
+        Returns the running/finished speculation task when it matches, else cancels it.
+        """
+        self._cancel_timer()
+        task, text = self._task, self._task_text
+        self._task, self._task_text, self._candidate, self._attempts = None, "", "", 0
+        if task is None:
+            return None
+        if task.done() and (task.cancelled() or task.exception() is not None):
+            SPECULATION_STATS["errors"] += 1
+            return None
+        if not texts_match(text, utterance):
+            task.cancel()
+            SPECULATION_STATS["misses"] += 1
+            print(f"🔮 SPECULATION {self._label}: miss ('{text[:40]}' vs '{utterance[:40]}')")
+            return None
+        return task
+
+    def _call_soon(self, callback, *args):
+        if self._closed:
+            return
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            pass  # Event loop already closed
+
+    def _interim(self, text: str):
+        if self._closed:
+            return
+        candidate = " ".join(part for part in (self._pending_text(), (text or "").strip()) if part)
+        if normalize_utterance(candidate) == normalize_utterance(self._candidate):
+            return  # Unchanged: let the stability timer run
+        self._candidate = candidate
+        self._cancel_timer()
+        if len(candidate) >= SPECULATION_MIN_CHARS:
+            self._timer = self._loop.call_later(SPECULATION_STABLE_MS / 1000.0, self._start)
+
+    def _start(self):
+        self._timer = None
+        candidate = self._candidate
+        if self._closed or self._attempts >= SPECULATION_MAX_PER_UTTERANCE:
+            return
+        if self._task and not self._task.done() and texts_match(self._task_text, candidate):
+            return
+        self._cancel_task()
+        self._attempts += 1
+        SPECULATION_STATS["started"] += 1
+        print(f"🔮 SPECULATION {self._label}: starting on '{candidate}'")
+        self._task_text = candidate
+        self._task = asyncio.ensure_future(self._run(candidate))
+
+    async def _run(self, text: str):
+        started_at = time.monotonic()
+        result = await self._speculate(text)
+        return {"result": result, "started_at": started_at, "finished_at": time.monotonic()}
+
+    def _cancel_timer(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    def _cancel_task(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            SPECULATION_STATS["superseded"] += 1
+        self._task, self._task_text = None, ""
+
+    def _close(self):
+        self._closed = True
+        self._cancel_timer()
+        self._cancel_task()
+
+
+async def use_speculation(task: asyncio.Task, dispatched_at: float, commit: Callable[[dict], Optional[str]]) -> Optional[str]:
+    """Wait for a claimed speculation and commit it.
+    Returns the reply to speak, or None when the normal turn must run instead. Saved time is the
+    part of the speculative LLM call that overlapped the caller still finishing the utterance.
+    """
+    try:
+        outcome = await task
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"❌ SPECULATION: failed: {e}")
+        SPECULATION_STATS["errors"] += 1
+        return None
+
+    speculation = outcome["result"]
+    if speculation and speculation.get("needs_tools"):
+        SPECULATION_STATS["tool_fallbacks"] += 1
+        print("🔮 SPECULATION: reply needs a tool call; running the normal turn")
+        return None
+    reply = commit(speculation) if speculation else None
+    if not reply:
+        SPECULATION_STATS["stale"] += 1
+        return None
+
+    saved_ms = max(0.0, (min(dispatched_at, outcome["finished_at"]) - outcome["started_at"]) * 1000)
+    SPECULATION_STATS["hits"] += 1
+    SPECULATION_STATS["saved_ms_total"] += saved_ms
+    print(f"🔮 SPECULATION: hit, saved ~{saved_ms:.0f}ms")
+    return reply
@@ -0,0 +1,269 @@
+import asyncio
+import base64
+import json
+import os
+import time
+from typing import Dict, List, Optional
+from fastapi import WebSocket, WebSocketDisconnect
+from deepgram import LiveOptions, LiveTranscriptionEvents
+from company.training.training import is_training_session
+from manage_twilio.utterance_aggregator import UtteranceAggregator
+from audio.telephony import MulawTranscoder, TWILIO_SAMPLE_RATE
+from audio.output_stage import AudioOutputStage
+from turn_trace import start_turn_trace, trace_mark, finish_turn_trace
+from session_store import set_session_affinity, clear_session_affinity
+
+# Twilio sends μ-law/8 kHz; Deepgram accepts it directly, so inbound audio is never transcoded
+TWILIO_STT_MODEL = os.getenv("TWILIO_STT_MODEL", "nova-2")
+# TTS provider ("deepgram" or "elevenlabs") and the output format requested from it;
+# anything other than mulaw/8000 is transcoded
+TWILIO_TTS_PROVIDER = os.getenv("TWILIO_TTS_PROVIDER", "deepgram")
+TWILIO_TTS_ENCODING = os.getenv("TWILIO_TTS_ENCODING", "mulaw")
+TWILIO_TTS_SAMPLE_RATE = int(os.getenv("TWILIO_TTS_SAMPLE_RATE", str(TWILIO_SAMPLE_RATE)))
+BARGE_IN_MIN_CHARS = int(os.getenv("VOICE_BARGE_IN_MIN_CHARS", "3"))
+# Twilio plays 20 ms frames; pacing keeps at most a short lead buffered on Twilio's side so a
+# barge-in clear has little queued audio to throw away
+TWILIO_FRAME_MS = 20
+TWILIO_PACE_OUTPUT = os.getenv("TWILIO_PACE_OUTPUT", "true").lower() in ("1", "true", "yes")
+
+
+def build_twilio_live_options(language_code: str) -> LiveOptions:
+    return LiveOptions(
+        model=TWILIO_STT_MODEL,
+        language=language_code or "es",
+        encoding="mulaw",
+        sample_rate=TWILIO_SAMPLE_RATE,
+        channels=1,
+        punctuate=True,
+        interim_results=True,
+        smart_format=True,
+        vad_events=True,
+        endpointing=int(os.getenv("VOICE_ENDPOINTING_MS", "300")),
+        utterance_end_ms=int(os.getenv("VOICE_UTTERANCE_END_MS", "1000")),
+    )
+
+
+class TwilioMediaStreamHandler:
+    """Bridge a Twilio <Connect><Stream> call to Deepgram STT, the agent and Deepgram TTS.
+
+    Twilio sends JSON events (connected/start/media/mark/stop) with base64 μ-law payloads.
+    Caller audio goes straight to Deepgram; the reply is synthesized as μ-law 8 kHz and sent
+    back as 20 ms media frames followed by a mark, so we know when playback has finished.
+    """
+
+    async def handle(self, websocket: WebSocket, company_id: str):
+        await websocket.accept()
+        loop = asyncio.get_running_loop()
+        call: Dict = {"stream_sid": None, "session_id": None, "user_id": None, "company_id": company_id, "language_code": "es"}
+        pending_marks = set()
+        turn_tasks = set()
+        # turn task -> utterance, until its reply exists; words of turns cancelled before that
+        # lead the next utterance, so a caller who paused mid-sentence is answered for all of it
+        unanswered: Dict[asyncio.Task, str] = {}
+        carryover: List[str] = []
+        turn_lock = asyncio.Lock()
+        turn_counter = 0
+        send_lock = asyncio.Lock()
+        conn = None
+        aggregator: Optional[UtteranceAggregator] = None
+        closed = False
+
+        async def send_event(event: Dict):
+            async with send_lock:
+                await websocket.send_text(json.dumps(event))
+
+        def agent_is_speaking() -> bool:
+            return bool(pending_marks) or any(not task.done() for task in turn_tasks)
+
+        async def barge_in(reason: str):
+            if not agent_is_speaking():
+                return
+            for task in list(turn_tasks):
+                if not task.done():
+                    task.cancel()
+                    if task in unanswered:
+                        carryover.append(unanswered.pop(task))
+            pending_marks.clear()
+            print(f"✋ TWILIO BARGE-IN: session={call['session_id']} reason={reason}")
+            try:
+                await send_event({"event": "clear", "streamSid": call["stream_sid"]})
+            except Exception as e:
+                print(f"⚠️ TWILIO: failed to send clear: {e}")
+
+        async def speak(text: str, turn_id: int):
+            """Synthesize the reply and stream it to Twilio in 20 ms μ-law frames"""
+            from audio.audio import stream_audio_response
+
+            trace_mark(call["session_id"], "tts_request", mode="twilio", provider=TWILIO_TTS_PROVIDER)
+            transcoder = MulawTranscoder(TWILIO_TTS_ENCODING, TWILIO_TTS_SAMPLE_RATE)
+            output = AudioOutputStage(loop, sample_rate=TWILIO_SAMPLE_RATE, encoding="mulaw",
+                                      frame_ms=TWILIO_FRAME_MS, pace=TWILIO_PACE_OUTPUT, label=call["session_id"])
+            sent = 0
+            start_time = time.time()
+
+            async def send_frames():
+                nonlocal sent
+                async for frame in output.frames():
+                    await send_event({
+                        "event": "media",
+                        "streamSid": call["stream_sid"],
+                        "media": {"payload": base64.b64encode(frame).decode("ascii")},
+                    })
+                    if sent == 0:
+                        trace_mark(call["session_id"], "playback_start", once=True, via="twilio")
+                        print(f"⏱️ TWILIO: first audio frame after {time.time() - start_time:.3f}s")
+                    sent += 1
+
+            sender = asyncio.create_task(send_frames())
+            try:
+                async for chunk in stream_audio_response(
+                    text, call["language_code"], user_id=call["user_id"], company_id=call["company_id"], session_id=call["session_id"],
+                    provider=TWILIO_TTS_PROVIDER, encoding=TWILIO_TTS_ENCODING, sample_rate=TWILIO_TTS_SAMPLE_RATE,
+                ):
+                    await output.put(transcoder.convert(chunk))
+                output.end()
+                await sender
+            finally:
+                output.close()
+                sender.cancel()
+            mark = f"turn-{turn_id}"
+            pending_marks.add(mark)
+            await send_event({"event": "mark", "streamSid": call["stream_sid"], "mark": {"name": mark}})
+            print(f"🎵 TWILIO: sent {sent} frames for {mark}")
+
+        async def run_turn(utterance: str, turn_id: int, dispatched_at: float):
+            from voice_agent_text import voice_agent_text_helper
+
+            async with turn_lock:
+                session_id = call["session_id"]
+                start_turn_trace(session_id, company_id=call["company_id"], source="twilio", started_at=dispatched_at)
+                try:
+                    if is_training_session(session_id):
+                        print(f"⚠️ TWILIO: training session {session_id}; ignoring utterance")
+                        finish_turn_trace(session_id, status="skipped")
+                        return
+                    result = await voice_agent_text_helper(session_id, utterance, tts_mode="none")
+                    unanswered.pop(asyncio.current_task(), None)
+                    text = result.get("textResponse", "")
+                    if "error" in result or not text:
+                        print(f"❌ TWILIO: no reply for {session_id}: {result.get('error')}")
+                        finish_turn_trace(session_id, status="error")
+                        return
+                    await speak(text, turn_id)
+                    finish_turn_trace(session_id)
+                except asyncio.CancelledError:
+                    finish_turn_trace(session_id, status="cancelled")
+                    raise
+                except Exception as e:
+                    finish_turn_trace(session_id, status="error")
+                    print(f"❌ TWILIO: turn failed: {e}")
+                    import traceback
+                    traceback.print_exc()
+
+        def dispatch_utterance(utterance: str):
+            nonlocal turn_counter
+            turn_counter += 1
+            if carryover:
+                utterance = " ".join(carryover + [utterance])
+                carryover.clear()
+            task = asyncio.create_task(run_turn(utterance, turn_counter, time.monotonic()))
+            turn_tasks.add(task)
+            task.add_done_callback(turn_tasks.discard)
+            unanswered[task] = utterance
+            task.add_done_callback(lambda done: unanswered.pop(done, None))
+
+        def on_transcript(dg_conn, result, **kwargs):
+            if closed or not getattr(result, "channel", None):
+                return
+            alt = result.channel.alternatives[0]
+            if not alt.transcript:
+                return
+            is_final = getattr(result, "is_final", False)
+            print(f"📞 TWILIO {call['session_id']}: {'FINAL' if is_final else 'INTERIM'}: {alt.transcript}")
+            if not is_final:
+                if len(alt.transcript.strip()) >= BARGE_IN_MIN_CHARS:
+                    try:
+                        loop.call_soon_threadsafe(lambda: asyncio.ensure_future(barge_in("interim_transcript")))
+                    except RuntimeError:
+                        pass
+                return
+            aggregator.add_final(alt.transcript, speech_final=getattr(result, "speech_final", False))
+            try:
+                from credits_helper import deepgram_stt_chars_with_credits
+                asyncio.run_coroutine_threadsafe(
+                    deepgram_stt_chars_with_credits(call["user_id"], call["company_id"], len(alt.transcript)),
+                    loop
+                )
+            except Exception:
+                pass
+
+        def on_utterance_end(dg_conn, utterance_end, **kwargs):
+            if not closed and aggregator:
+                aggregator.utterance_end()
+
+        def on_error(dg_conn, error, **kwargs):
+            print(f"❌ TWILIO Deepgram error: {error}")
+
+        async def start_stream(start: Dict):
+            nonlocal conn, aggregator
+            from manage_twilio.calls import create_or_get_session, get_company_language
+
+            params = start.get("customParameters") or {}
+            call["stream_sid"] = start.get("streamSid")
+            call["user_id"] = params.get("user_id") or None
+            call["company_id"] = params.get("company_id") or call["company_id"]
+            call["session_id"] = create_or_get_session(call["company_id"], "voice", params.get("session_id"), user_id=call["user_id"])
+            print(f"📞 TWILIO stream started: call={start.get('callSid')} stream={call['stream_sid']} session={call['session_id']}")
+            set_session_affinity(call["session_id"], "twilio")
+
+            aggregator = UtteranceAggregator(loop, dispatch_utterance, label=call["session_id"])
+            language_code = await asyncio.to_thread(get_company_language, call["company_id"])
+            call["language_code"] = language_code
+            from deepgram_pool import stt_pool
+            conn = await stt_pool.checkout(build_twilio_live_options(language_code), {
+                LiveTranscriptionEvents.Transcript: on_transcript,
+                LiveTranscriptionEvents.UtteranceEnd: on_utterance_end,
+                LiveTranscriptionEvents.Error: on_error,
+            })
+
+        try:
+            while True:
+                message = await websocket.receive_text()
+                data = json.loads(message)
+                event = data.get("event")
+                if event == "media":
+                    media = data.get("media") or {}
+                    if conn and media.get("track", "inbound") == "inbound":
+                        conn.send(base64.b64decode(media.get("payload", "")))
+                elif event == "start":
+                    await start_stream(data.get("start") or {})
+                elif event == "mark":
+                    pending_marks.discard((data.get("mark") or {}).get("name"))
+                elif event == "stop":
+                    print(f"📞 TWILIO stream stopped: session={call['session_id']}")
+                    break
+                elif event == "connected":
+                    print(f"📞 TWILIO media stream connected (protocol {data.get('protocol')})")
+        except WebSocketDisconnect:
+            print(f"📞 TWILIO websocket disconnected: session={call['session_id']}")
+        except Exception as e:
+            print(f"❌ TWILIO media stream error: {e}")
+        finally:
+            closed = True
+            if call["session_id"]:
+                clear_session_affinity(call["session_id"], "twilio")
+            if aggregator:
+                aggregator.close()
+            for task in list(turn_tasks):
+                task.cancel()
+            if conn:
+                try:
+                    conn.finish()
+                except Exception:
+                    pass
+
+
+twilio_media_stream_handler = TwilioMediaStreamHandler()
+
+async def handle_twilio_media_stream(websocket: WebSocket, company_id: str):
+    await twilio_media_stream_handler.handle(websocket, company_id)
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import re
+import time
+from typing import Callable, List, Optional
+
+# Silence after the last FINAL segment before a turn is dispatched anyway, for when
+# Deepgram never sends speech_final / UtteranceEnd (e.g. background noise keeps VAD open)
+UTTERANCE_SILENCE_GAP_MS = int(os.getenv("VOICE_UTTERANCE_SILENCE_GAP_MS", "1200"))
+
+# Identical utterances dispatched within this window are treated as duplicates
+UTTERANCE_DEDUPE_WINDOW_S = float(os.getenv("VOICE_UTTERANCE_DEDUPE_WINDOW_S", "3"))
+
+
+def normalize_utterance(text: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace for duplicate detection"""
+    text = re.sub(r"[^\w\s]", " ", (text or "").lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class UtteranceAggregator:
+    """Collect consecutive FINAL transcript segments into a single caller turn.
+
+    A turn is dispatched once, when Deepgram marks the end of speech (speech_final or an
+    UtteranceEnd event) or when no new final arrives within the silence gap. Deepgram
+    callbacks run on the SDK thread, so the public methods hop onto the event loop and all
+    buffering and timers live there.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, on_utterance: Callable[[str], None],
+                 silence_gap_ms: Optional[int] = None, label: str = ""):
+        self._loop = loop
+        self._on_utterance = on_utterance
+        self._silence_gap_s = (silence_gap_ms if silence_gap_ms is not None else UTTERANCE_SILENCE_GAP_MS) / 1000.0
+        self._label = label
+        self._segments: List[str] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._last_dispatched = ""
+        self._last_dispatched_at = 0.0
+        self._closed = False
+
+    # ----- thread-safe entry points (called from Deepgram callbacks) -----
+
+    def add_final(self, text: str, speech_final: bool = False):
+        self._call_soon(self._add_final, text, speech_final)
+
+    def utterance_end(self):
+        self._call_soon(self._dispatch, "utterance_end")
+
+    def close(self):
+        self._call_soon(self._close)
+
+    # ----- loop-side implementation -----
+
+    def pending_text(self) -> str:
+        """FINAL segments buffered for the current turn (loop side only)"""
+        return " ".join(self._segments)
+
+    def _call_soon(self, callback, *args):
+        if self._closed:
+            return
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            pass  # Event loop already closed
+
+    def _add_final(self, text: str, speech_final: bool):
+        if self._closed:
+            return
+        normalized = normalize_utterance(text)
+        if not normalized:
+            return
+        # Deepgram occasionally repeats the same final segment; keep it once
+        if self._segments and normalize_utterance(self._segments[-1]) == normalized:
+            print(f"🔁 UTTERANCE {self._label}: dropped repeated segment")
+        else:
+            self._segments.append(text.strip())
+        if speech_final:
+            self._dispatch("speech_final")
+        else:
+            self._arm_timer()
+
+    def _arm_timer(self):
+        if self._timer:
+            self._timer.cancel()
+        self._timer = self._loop.call_later(self._silence_gap_s, self._dispatch, "silence_gap")
+
+    def _dispatch(self, reason: str):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if self._closed or not self._segments:
+            return
+        utterance = " ".join(self._segments)
+        self._segments = []
+
+        normalized = normalize_utterance(utterance)
+        now = time.monotonic()
+        if normalized == self._last_dispatched and now - self._last_dispatched_at < UTTERANCE_DEDUPE_WINDOW_S:
+            print(f"🔁 UTTERANCE {self._label}: skipped duplicate turn '{utterance[:60]}'")
+            return
+        self._last_dispatched = normalized
+        self._last_dispatched_at = now
+
+        print(f"🗣️ UTTERANCE {self._label}: dispatching turn ({reason}): {utterance}")
+        try:
+            self._on_utterance(utterance)
+        except Exception as e:
+            print(f"❌ UTTERANCE {self._label}: dispatch error: {e}")
+
+    def _close(self):
+        self._closed = True
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        self._segments = []
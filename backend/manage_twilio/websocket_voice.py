@@ -6,8 +6,13 @@ from voice_agent_text import voice_agent_text_helper
 from company.training.training import is_training_session
 import os
 from datetime import datetime
-from deepgram import DeepgramClient, DeepgramClientOptions, LiveTranscriptionEvents
+from deepgram import DeepgramClient, DeepgramClientOptions, LiveOptions, LiveTranscriptionEvents
 from session_data import session_metadata
+from session_store import set_session_affinity, clear_session_affinity
+from session_lifecycle import register_eviction_hook, touch_session
+from manage_twilio.utterance_aggregator import UtteranceAggregator
+from manage_twilio.speculation import TurnSpeculator, SPECULATION_ENABLED, use_speculation
+from turn_trace import start_turn_trace, trace_mark, finish_turn_trace
 import time
 
 # Initialize Deepgram
@@ -27,6 +32,28 @@ deepgram_options = DeepgramClientOptions(
     }
 )
 
+# Live transcription options; VAD events and endpointing let Deepgram tell us when the
+# caller has finished a turn (speech_final / UtteranceEnd)
+live_options = LiveOptions(
+    model="nova-2",
+    language="en-US",
+    punctuate=True,
+    interim_results=True,
+    smart_format=True,
+    vad_events=True,
+    endpointing=int(os.getenv("VOICE_ENDPOINTING_MS", "300")),  # ms of silence to end an utterance
+    utterance_end_ms=int(os.getenv("VOICE_UTTERANCE_END_MS", "1000")),
+)
+
+# Barge-in: an interim transcript with at least this many characters while the agent is
+# answering cancels the answer. VAD SpeechStarted can also trigger it, but it fires on noise.
+BARGE_IN_MIN_CHARS = int(os.getenv("VOICE_BARGE_IN_MIN_CHARS", "3"))
+BARGE_IN_ON_VAD = os.getenv("VOICE_BARGE_IN_ON_VAD", "false").lower() in ("1", "true", "yes")
+# Speaking rate used to estimate how long a REST (base64) reply plays on the client
+PLAYBACK_WORDS_PER_SECOND = 2.5
+# Provider for binary-audio replies ("deepgram" or "elevenlabs"); ?tts_provider= overrides per call
+VOICE_TTS_PROVIDER = os.getenv("VOICE_TTS_PROVIDER", "deepgram")
+
 # WebSocket connection manager
 class ConnectionManager:
     def __init__(self):
@@ -42,6 +69,7 @@ class ConnectionManager:
     def disconnect(self, session_id: str):
         if session_id in self.active_connections:
             del self.active_connections[session_id]
+            clear_session_affinity(session_id, "voice_ws")
         if session_id in self.websocket_queues:
             del self.websocket_queues[session_id]
         print(f"🔌 WebSocket disconnected: {session_id}")
@@ -56,12 +84,101 @@ class ConnectionManager:
                 return False
         return False
 
+    async def send_bytes(self, session_id: str, data: bytes):
+        if session_id in self.active_connections:
+            try:
+                await self.active_connections[session_id].send_bytes(data)
+                return True
+            except Exception as e:
+                print(f"❌ Error sending audio to {session_id}: {e}")
+                return False
+        return False
+
 manager = ConnectionManager()
 
 class ModernVoiceWebSocketHandler:
     def __init__(self):
         self.manager = manager
         self.dg = DeepgramClient(DEEPGRAM_API_KEY, deepgram_options)
+        # session_id -> in-flight agent turns (run one at a time under the session lock)
+        self.turn_tasks: Dict[str, set] = {}
+        self.turn_locks: Dict[str, asyncio.Lock] = {}
+        # session_id -> monotonic time the last REST audio reply is expected to finish playing
+        self.playback_until: Dict[str, float] = {}
+        # session_id -> {turn task: transcript} for turns whose reply has not been produced yet
+        self.unanswered_turns: Dict[str, Dict[asyncio.Task, str]] = {}
+        # session_id -> words of turns cancelled before they were answered; they lead the next utterance
+        self.carryover: Dict[str, str] = {}
+
+    def start_turn(self, session_id: str, transcript: str, company_id: str, user_id: str = None,
+                   speculation: asyncio.Task = None) -> asyncio.Task:
+        """Run one agent turn for a complete utterance; turns of a session never overlap"""
+        lock = self.turn_locks.setdefault(session_id, asyncio.Lock())
+
+        async def run_turn():
+            async with lock:
+                await self.process_final_transcript(session_id, transcript, company_id, user_id, speculation=speculation)
+
+        task = asyncio.create_task(run_turn())
+        tasks = self.turn_tasks.setdefault(session_id, set())
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        unanswered = self.unanswered_turns.setdefault(session_id, {})
+        unanswered[task] = transcript
+        task.add_done_callback(lambda done: unanswered.pop(done, None))
+        return task
+
+    def mark_turn_answered(self, session_id: str):
+        """Called by the running turn once its reply exists: cancelling it now only drops the reply"""
+        self.unanswered_turns.get(session_id, {}).pop(asyncio.current_task(), None)
+
+    def take_carryover(self, session_id: str, utterance: str) -> str:
+        """Prefix an utterance with the words of turns interrupted before they were answered"""
+        carried = self.carryover.pop(session_id, "")
+        return f"{carried} {utterance}".strip() if carried else utterance
+
+    def cancel_turns(self, session_id: str) -> int:
+        """Cancel every in-flight turn of a session; returns how many were still running.
+        The words of unanswered turns are kept (take_carryover) so a caller who paused mid-sentence
+        and kept talking is answered for the whole sentence, not only its continuation."""
+        cancelled = 0
+        unanswered = self.unanswered_turns.get(session_id, {})
+        carried = []
+        for task in list(self.turn_tasks.get(session_id, ())):
+            if not task.done():
+                task.cancel()
+                cancelled += 1
+                if task in unanswered:
+                    carried.append(unanswered.pop(task))
+        if carried:
+            self.carryover[session_id] = " ".join(filter(None, [self.carryover.get(session_id, "")] + carried))
+        return cancelled
+
+    def agent_is_speaking(self, session_id: str) -> bool:
+        """True while a turn is generating or its audio is still playing on the client"""
+        from deepgram_tts_websocket import tts_is_playing
+        if any(not task.done() for task in self.turn_tasks.get(session_id, ())):
+            return True
+        if time.monotonic() < self.playback_until.get(session_id, 0.0):
+            return True
+        return tts_is_playing(session_id)
+
+    async def barge_in(self, session_id: str, reason: str) -> bool:
+        """Caller started talking over the agent: drop the stale answer and stop its audio"""
+        if not self.agent_is_speaking(session_id):
+            return False
+        from deepgram_tts_websocket import tts_server_interrupt
+        cancelled = self.cancel_turns(session_id)
+        tts_cleared = tts_server_interrupt(session_id)
+        finish_turn_trace(session_id, status="interrupted")
+        self.playback_until.pop(session_id, None)
+        print(f"✋ BARGE-IN: session={session_id} reason={reason} cancelled_turns={cancelled} tts_cleared={tts_cleared}")
+        await self.manager.send_message(session_id, {
+            "type": "stop_playback",
+            "reason": reason,
+            "timestamp": datetime.utcnow().isoformat()
+        })
+        return True
 
     async def handle_websocket(self, websocket: WebSocket, session_id: str, company_id: str, user_id: str = None):
         """Handle WebSocket connection for real-time voice streaming with Deepgram"""
@@ -91,15 +208,46 @@ class ModernVoiceWebSocketHandler:
             
             actual_session_id = create_or_get_session(company_id, "voice", session_id, user_id=user_id)
             
+            # Opt-in streaming turn mode: replies are spoken sentence by sentence into the
+            # session's /tts/deepgram/stream connection instead of returned as base64 audio
+            if websocket.query_params.get("stream_tts", "").lower() in ("1", "true", "yes"):
+                meta = session_metadata.get(actual_session_id, {})
+                meta["stream_tts"] = True
+                session_metadata[actual_session_id] = meta
+            
+            # Opt-in binary audio: replies arrive as raw audio frames between audio_start/audio_end
+            # control messages instead of base64 inside the audio_response JSON
+            if websocket.query_params.get("audio_format", "").lower() == "binary":
+                meta = session_metadata.get(actual_session_id, {})
+                meta["audio_format"] = "binary"
+                meta["tts_provider"] = websocket.query_params.get("tts_provider", VOICE_TTS_PROVIDER).lower()
+                # Voice/model selection follows the company's language, resolved once per session
+                from tools import get_company_language
+                meta["tts_language"] = await asyncio.to_thread(get_company_language, company_id)
+                session_metadata[actual_session_id] = meta
+            
             # Use the actual session_id for the connection
             self.manager.active_connections[actual_session_id] = websocket
             self.manager.websocket_queues[actual_session_id] = asyncio.Queue()
+            set_session_affinity(actual_session_id, "voice_ws")
+            touch_session(actual_session_id)
             
             # Capture the current event loop for use in Deepgram handlers
             loop = asyncio.get_running_loop()
+            queue = self.manager.websocket_queues[actual_session_id]
             
-            # Flag to track if connection is disconnected
-            is_disconnected = False
+            # Set once by whichever side ends the session (client, Deepgram or an error);
+            # the reader and writer coroutines both exit on it
+            shutdown = asyncio.Event()
+            
+            def post(message: Dict):
+                """Hand a message from the Deepgram thread to the writer without creating a coroutine"""
+                if not shutdown.is_set():
+                    try:
+                        loop.call_soon_threadsafe(queue.put_nowait, message)
+                    except RuntimeError:
+                        pass  # Event loop already closed
+
             
             # Send welcome message with actual session_id
             await self.manager.send_message(actual_session_id, {
@@ -109,25 +257,56 @@ class ModernVoiceWebSocketHandler:
                 "original_session_id": session_id
             })
             
-            # Create Deepgram live connection
-            conn = self.dg.listen.live(deepgram_options)
+            # Optional speculative turns, created below once the aggregator exists
+            speculator = None
+            
+            def dispatch_utterance(utterance: str):
+                # Mark time for latency measurement
+                try:
+                    meta = session_metadata.get(actual_session_id, {})
+                    meta["final_tx_at_monotonic"] = time.monotonic()
+                    session_metadata[actual_session_id] = meta
+                    print(f"⏱️ FINAL_SENT: session={actual_session_id} t={meta['final_tx_at_monotonic']:.6f}")
+                except Exception:
+                    pass
+                start_turn_trace(actual_session_id, company_id=company_id, source="voice_ws",
+                                 started_at=session_metadata.get(actual_session_id, {}).get("final_tx_at_monotonic"))
+                utterance = self.take_carryover(actual_session_id, utterance)
+                speculation = speculator.take(utterance) if speculator else None
+                self.start_turn(actual_session_id, utterance, company_id, user_id, speculation=speculation)
+            
+            # Buffers FINAL segments until the caller stops talking, then fires exactly one turn
+            aggregator = UtteranceAggregator(loop, dispatch_utterance, label=actual_session_id)
+            
+            if SPECULATION_ENABLED or websocket.query_params.get("speculate", "").lower() in ("1", "true", "yes"):
+                async def speculate(text: str):
+                    if is_training_session(actual_session_id):
+                        return None
+                    from agent.agent import speculate_agent_response_helper
+                    return await speculate_agent_response_helper(actual_session_id, text, user_id=user_id, company_id=company_id)
+                
+                speculator = TurnSpeculator(loop, speculate, aggregator.pending_text, label=actual_session_id)
+            
+            def request_barge_in(reason: str):
+                """Called from the Deepgram thread; the check and cancellation run on the loop"""
+                if shutdown.is_set():
+                    return
+                try:
+                    loop.call_soon_threadsafe(lambda: asyncio.ensure_future(self.barge_in(actual_session_id, reason)))
+                except RuntimeError:
+                    pass  # Event loop already closed
             
             # Set up Deepgram event handlers
             def on_open(conn, open, **kwargs):
-                if not is_disconnected:
+                if not shutdown.is_set():
                     print(f"🎤 Deepgram connection open for session: {actual_session_id}")
-                    # Use queue to send message from thread
-                    if actual_session_id in self.manager.websocket_queues:
-                        asyncio.run_coroutine_threadsafe(
-                            self.manager.websocket_queues[actual_session_id].put({
-                                "type": "status",
-                                "message": "Deepgram connection established"
-                            }),
-                            loop
-                        )
+                    post({
+                        "type": "status",
+                        "message": "Deepgram connection established"
+                    })
             
             def on_transcript(conn, result, **kwargs):
-                if is_disconnected:
+                if shutdown.is_set():
                     return
                     
                 # Handle the new result format
@@ -141,36 +320,29 @@ class ModernVoiceWebSocketHandler:
                     # Always log both interim and final for debugging
                     print(f"🎤 Session {actual_session_id}: {'FINAL' if is_final else 'INTERIM'}: {alt.transcript}")
                     
-                    # Only process FINAL transcriptions with AI
+                    # New speech while the agent is answering interrupts it
+                    if not is_final and len(alt.transcript.strip()) >= BARGE_IN_MIN_CHARS:
+                        request_barge_in("interim_transcript")
+                    
+                    # Stable interim text may start the agent turn speculatively
+                    if speculator and not is_final:
+                        speculator.interim(alt.transcript)
+                    
+                    # Only FINAL transcriptions feed the turn aggregator
                     if is_final:
-                        # Mark time for latency measurement
-                        try:
-                            meta = session_metadata.get(actual_session_id, {})
-                            meta["final_tx_at_monotonic"] = time.monotonic()
-                            session_metadata[actual_session_id] = meta
-                            print(f"⏱️ FINAL_SENT: session={actual_session_id} t={meta['final_tx_at_monotonic']:.6f}")
-                        except Exception:
-                            pass
                         # Send final transcript back to frontend via queue
-                        transcript_data = {
+                        post({
                             "type": "transcript",
                             "transcript": alt.transcript,
                             "is_final": True,
                             "confidence": alt.confidence if hasattr(alt, 'confidence') else None,
                             "final_sent_at": datetime.utcnow().isoformat() + "Z"
-                        }
-                        
-                        if actual_session_id in self.manager.websocket_queues:
-                            asyncio.run_coroutine_threadsafe(
-                                self.manager.websocket_queues[actual_session_id].put(transcript_data),
-                                loop
-                            )
+                        })
                         
-                        # Process with AI in background
-                        asyncio.run_coroutine_threadsafe(
-                            self.process_final_transcript(actual_session_id, alt.transcript, company_id, user_id),
-                            loop
-                        )
+                        # Buffer until the end of the utterance; the aggregator dispatches the turn
+                        aggregator.add_final(alt.transcript, speech_final=getattr(result, "speech_final", False))
+                        if speculator:
+                            speculator.interim("")
                         # Charge Deepgram STT by characters (non-blocking)
                         try:
                             from credits_helper import deepgram_stt_chars_with_credits
@@ -181,131 +353,112 @@ class ModernVoiceWebSocketHandler:
                         except Exception as _:
                             pass
             
+            def on_utterance_end(conn, utterance_end, **kwargs):
+                if not shutdown.is_set():
+                    aggregator.utterance_end()
+            
+            def on_speech_started(conn, speech_started, **kwargs):
+                request_barge_in("speech_started")
+            
             def on_error(conn, error, **kwargs):
-                if is_disconnected:
+                if shutdown.is_set():
                     return
                     
                 error_msg = f"Deepgram error: {error}"
                 print(f"❌ {error_msg}")
-                if actual_session_id in self.manager.websocket_queues:
-                    asyncio.run_coroutine_threadsafe(
-                        self.manager.websocket_queues[actual_session_id].put({
-                            "type": "error",
-                            "message": error_msg
-                        }),
-                        loop
-                    )
+                post({
+                    "type": "error",
+                    "message": error_msg
+                })
             
             def on_close(conn, close, **kwargs):
-                if not is_disconnected:
+                if not shutdown.is_set():
                     print(f"🎤 Deepgram connection closed for session: {actual_session_id}")
-                if actual_session_id in self.manager.websocket_queues:
-                    asyncio.run_coroutine_threadsafe(
-                        self.manager.websocket_queues[actual_session_id].put({
-                            "type": "status",
-                            "message": "Deepgram connection closed"
-                        }),
-                        loop
-                    )
-            
-            # Set up Deepgram event handlers using the new API
-            conn.on(LiveTranscriptionEvents.Open, on_open)
-            conn.on(LiveTranscriptionEvents.Transcript, on_transcript)
-            conn.on(LiveTranscriptionEvents.Error, on_error)
-            conn.on(LiveTranscriptionEvents.Close, on_close)
-            
-            # Start Deepgram connection
-            conn.start()
-            
-            # Handle incoming audio data from frontend and outgoing messages from Deepgram
-            try:
-                while True:
-                    # Check if WebSocket is still connected
-                    if websocket.client_state.value >= 3:  # WebSocket is closed
-                        print(f"🔌 WebSocket closed: {session_id}")
-                        is_disconnected = True
-                        break
-                    
-                    # Wait for either audio data from frontend or messages from Deepgram
-                    try:
-                        # Check connection state before creating tasks
-                        if websocket.client_state.value >= 3:
-                            print(f"🔌 WebSocket closed before processing: {session_id}")
-                            is_disconnected = True
-                            break
-                            
-                        done, pending = await asyncio.wait(
-                            [
-                                asyncio.create_task(websocket.receive_bytes()),
-                                asyncio.create_task(self.manager.websocket_queues[actual_session_id].get())
-                            ],
-                            return_when=asyncio.FIRST_COMPLETED,
-                            timeout=1.0  # Add timeout to prevent hanging
-                        )
-                        
-                        for task in done:
-                            try:
-                                result = task.result()
-                                
-                                if isinstance(result, bytes):
-                                    # Audio data from frontend - send to Deepgram
-                                    if conn and hasattr(conn, 'send'):
-                                        conn.send(result)
-                                else:
-                                    # Message from Deepgram - send to frontend
-                                    if websocket.client_state.value < 3:  # Only send if still connected
-                                        await websocket.send_text(json.dumps(result))
-                                    
-                                    # If this is a final transcript, process it with AI
-                                    if isinstance(result, dict) and result.get("type") == "transcript" and result.get("is_final"):
-                                        await self.process_final_transcript(actual_session_id, result["transcript"], company_id, user_id)
-                                    
-                            except Exception as e:
-                                # Check if it's a disconnect error
-                                if "disconnect" in str(e).lower() or "receive" in str(e).lower():
-                                    print(f"🔌 WebSocket disconnected during processing: {session_id}")
-                                    is_disconnected = True
-                                    return  # Exit the function completely
-                                else:
-                                    print(f"❌ Error processing message: {e}")
-                        
-                        # Cancel pending tasks
-                        for task in pending:
-                            task.cancel()
-                            
-                    except asyncio.TimeoutError:
-                        # Timeout occurred, check if we should continue
-                        continue
-                    except Exception as e:
-                        # Check if it's a disconnect error
-                        if "disconnect" in str(e).lower() or "receive" in str(e).lower():
+                post({
+                    "type": "status",
+                    "message": "Deepgram connection closed"
+                })
+            
+            handlers = {
+                LiveTranscriptionEvents.Open: on_open,
+                LiveTranscriptionEvents.Transcript: on_transcript,
+                LiveTranscriptionEvents.UtteranceEnd: on_utterance_end,
+                LiveTranscriptionEvents.Error: on_error,
+                LiveTranscriptionEvents.Close: on_close,
+            }
+            if BARGE_IN_ON_VAD:
+                handlers[LiveTranscriptionEvents.SpeechStarted] = on_speech_started
+            
+            # Take a pre-opened Deepgram connection (or open one) with our handlers attached
+            from deepgram_pool import stt_pool
+            conn = await stt_pool.checkout(live_options, handlers)
+            
+            async def read_client_audio():
+                """Forward every audio frame from the client to Deepgram until the client goes away"""
+                try:
+                    while not shutdown.is_set():
+                        message = await websocket.receive()
+                        if message.get("type") == "websocket.disconnect":
                             print(f"🔌 WebSocket disconnected: {session_id}")
-                            is_disconnected = True
-                            return  # Exit the function completely
-                        else:
-                            print(f"❌ Error in message processing loop: {e}")
                             break
-                        
-            except WebSocketDisconnect:
-                print(f"🔌 WebSocket disconnected: {session_id}")
-                is_disconnected = True
-            except Exception as e:
-                # Check if it's a disconnect error
-                if "disconnect" in str(e).lower() or "receive" in str(e).lower():
+                        data = message.get("bytes")
+                        if data and conn and hasattr(conn, 'send'):
+                            conn.send(data)
+                except WebSocketDisconnect:
                     print(f"🔌 WebSocket disconnected: {session_id}")
-                    is_disconnected = True
-                else:
-                    print(f"❌ Error in WebSocket handler: {e}")
-                    if websocket.client_state.value < 3:  # Only send if still connected
-                        try:
-                            await websocket.send_text(json.dumps({
-                                "type": "error",
-                                "message": f"WebSocket error: {str(e)}"
-                            }))
-                        except:
-                            pass  # Ignore errors when sending error messages
+                except Exception as e:
+                    if "disconnect" in str(e).lower() or "receive" in str(e).lower():
+                        print(f"🔌 WebSocket disconnected: {session_id}")
+                    else:
+                        print(f"❌ Error reading client audio: {e}")
+                finally:
+                    shutdown.set()
+            
+            async def write_client_messages():
+                """Relay queued Deepgram messages to the client until shutdown"""
+                try:
+                    while not shutdown.is_set():
+                        result = await queue.get()
+                        if websocket.client_state.value >= 3:  # WebSocket is closed
+                            break
+                        await websocket.send_text(json.dumps(result))
+                except Exception as e:
+                    if "disconnect" in str(e).lower() or "send" in str(e).lower():
+                        print(f"🔌 WebSocket disconnected while sending: {session_id}")
+                    else:
+                        print(f"❌ Error sending to client: {e}")
+                        if websocket.client_state.value < 3:  # Only send if still connected
+                            try:
+                                await websocket.send_text(json.dumps({
+                                    "type": "error",
+                                    "message": f"WebSocket error: {str(e)}"
+                                }))
+                            except:
+                                pass  # Ignore errors when sending error messages
+                finally:
+                    shutdown.set()
+            
+            # One reader and one writer live for the whole session; whichever finishes first
+            # signals shutdown and the other is cancelled
+            reader = asyncio.create_task(read_client_audio())
+            writer = asyncio.create_task(write_client_messages())
+            try:
+                await asyncio.wait([reader, writer], return_when=asyncio.FIRST_COMPLETED)
             finally:
+                shutdown.set()
+                for task in (reader, writer):
+                    task.cancel()
+                await asyncio.gather(reader, writer, return_exceptions=True)
                 # Clean up
+                aggregator.close()
+                if speculator:
+                    speculator.close()
+                self.cancel_turns(actual_session_id)
+                self.turn_tasks.pop(actual_session_id, None)
+                self.unanswered_turns.pop(actual_session_id, None)
+                self.carryover.pop(actual_session_id, None)
+                self.turn_locks.pop(actual_session_id, None)
+                self.playback_until.pop(actual_session_id, None)
                 if actual_session_id in self.manager.active_connections:
                     self.manager.disconnect(actual_session_id)
                 if conn and hasattr(conn, 'finish'):
@@ -322,7 +475,8 @@ class ModernVoiceWebSocketHandler:
                 except:
                     pass  # Ignore errors when sending error messages
 
-    async def process_final_transcript(self, session_id: str, transcript: str, company_id: str, user_id: str = None):
+    async def process_final_transcript(self, session_id: str, transcript: str, company_id: str, user_id: str = None,
+                                       speculation: asyncio.Task = None):
         """Process final transcript with AI and return audio response"""
         try:
             print(f"🎤 Processing final transcript: {transcript}")
@@ -330,6 +484,7 @@ class ModernVoiceWebSocketHandler:
             
             # Check if this is a training session
             if is_training_session(session_id):
+                finish_turn_trace(session_id, status="skipped")
                 await self.manager.send_message(session_id, {
                     "type": "error",
                     "message": "This is a training session. Please use the training interface."
@@ -357,59 +512,153 @@ class ModernVoiceWebSocketHandler:
                 "user_text": transcript, 
             }
             
+            # Reuse the speculative reply if one was started on the interim transcript
+            agent_response = None
+            if speculation is not None:
+                from agent.agent import commit_speculative_response_helper
+                dispatched_at = session_metadata.get(actual_session_id, {}).get("final_tx_at_monotonic", time.monotonic())
+                agent_response = await use_speculation(
+                    speculation, dispatched_at,
+                    lambda result: commit_speculative_response_helper(actual_session_id, transcript, result, user_id=user_id)
+                )
+                trace_mark(actual_session_id, "speculation_hit" if agent_response else "speculation_miss")
+            
             # Call the voice agent text helper
-            result = await voice_agent_text_helper(**form_data)
+            session_meta = session_metadata.get(actual_session_id, {})
+            binary_audio = session_meta.get("audio_format") == "binary"
+            if session_meta.get("stream_tts"):
+                tts_mode = "stream"
+            else:
+                tts_mode = "none" if binary_audio else "rest"
+            result = await voice_agent_text_helper(**form_data, tts_mode=tts_mode, agent_response=agent_response)
+            self.mark_turn_answered(session_id)
             
             if "error" in result:
+                finish_turn_trace(session_id, status="error")
                 await self.manager.send_message(session_id, {
                     "type": "error",
                     "message": result["error"]
                 })
                 return
             
-            # Send audio response back
-            response_message = {
-                "type": "audio_response",
-                "text": result.get("textResponse", ""),
-                "audio": result.get("audio", ""),
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            
-            print(f"🎵 Sending audio response to session: {session_id}")
-            print(f"🎵 Response length: {len(result.get('audio', ''))} chars")
-            print(f"🎵 Text response: {result.get('textResponse', '')[:100]}...")
+            text_response = result.get("textResponse", "")
+            if binary_audio and not result.get("streamedToTTS") and text_response:
+                sent_audio = await self.send_binary_audio(session_id, text_response, company_id, user_id,
+                                                          provider=session_meta.get("tts_provider", VOICE_TTS_PROVIDER),
+                                                          language_code=session_meta.get("tts_language", "es"))
+            else:
+                # Send audio response back
+                response_message = {
+                    "type": "audio_response",
+                    "text": text_response,
+                    "audio": result.get("audio", ""),
+                    "streamed_to_tts": result.get("streamedToTTS", False),
+                    "timestamp": datetime.utcnow().isoformat()
+                }
+                
+                print(f"🎵 Sending audio response to session: {session_id}")
+                print(f"🎵 Response length: {len(result.get('audio', ''))} chars")
+                print(f"🎵 Text response: {text_response[:100]}...")
+                
+                await self.manager.send_message(session_id, response_message)
+                sent_audio = bool(response_message["audio"])
+                if sent_audio:
+                    trace_mark(session_id, "playback_start", once=True, via="base64")
             
-            await self.manager.send_message(session_id, response_message)
+            # The client plays this audio on its own; remember roughly when it ends so that
+            # speech during playback still counts as barge-in
+            if sent_audio:
+                words = len(text_response.split())
+                self.playback_until[session_id] = time.monotonic() + words / PLAYBACK_WORDS_PER_SECOND
             
             print(f"✅ AI response processed for session: {session_id}")
+            finish_turn_trace(session_id)
             
         except Exception as e:
             print(f"❌ Error processing final transcript: {e}")
+            finish_turn_trace(session_id, status="error")
             await self.manager.send_message(session_id, {
                 "type": "error",
                 "message": f"Error processing transcript: {str(e)}"
             })
 
+    async def send_binary_audio(self, session_id: str, text: str, company_id: str, user_id: str = None, provider: str = VOICE_TTS_PROVIDER,
+                                language_code: str = "es") -> bool:
+        """Synthesize the reply and forward the audio as binary frames as soon as the TTS provider sends them.
+        Frames are bracketed by audio_start (carries the text) and audio_end control messages.
+        """
+        from audio.audio import stream_audio_response
+        
+        total_bytes = 0
+        await self.manager.send_message(session_id, {
+            "type": "audio_start",
+            "text": text,
+            "encoding": "mp3",
+            "timestamp": datetime.utcnow().isoformat()
+        })
+        trace_mark(session_id, "tts_request", mode="binary", provider=provider)
+        try:
+            async for chunk in stream_audio_response(text, language_code, user_id=user_id, company_id=company_id, session_id=session_id, provider=provider):
+                if not await self.manager.send_bytes(session_id, chunk):
+                    break
+                if total_bytes == 0:
+                    trace_mark(session_id, "playback_start", once=True, via="binary")
+                total_bytes += len(chunk)
+        except Exception as e:
+            print(f"❌ Binary audio synthesis failed for {session_id}: {e}")
+        finally:
+            await self.manager.send_message(session_id, {
+                "type": "audio_end",
+                "bytes": total_bytes,
+                "timestamp": datetime.utcnow().isoformat()
+            })
+        print(f"🎵 Sent {total_bytes} audio bytes as binary frames to session: {session_id}")
+        return total_bytes > 0
+
+    def release_session(self, session_id: str):
+        """Eviction hook: per-session turn bookkeeping left behind by dropped connections"""
+        for task in self.turn_tasks.pop(session_id, ()):
+            task.cancel()
+        self.turn_locks.pop(session_id, None)
+        self.playback_until.pop(session_id, None)
+        self.unanswered_turns.pop(session_id, None)
+        self.carryover.pop(session_id, None)
+        self.manager.websocket_queues.pop(session_id, None)
+
 # Create handler instance
 modern_voice_handler = ModernVoiceWebSocketHandler()
+register_eviction_hook(modern_voice_handler.release_session)
 
 async def handle_voice_websocket(websocket: WebSocket, session_id: str, company_id: str, user_id: str = None):
     """Main WebSocket handler for voice calls with modern Deepgram approach"""
     await modern_voice_handler.handle_websocket(websocket, session_id, company_id, user_id)
 
 # Utility functions for Twilio integration
-def create_voice_twiml_with_websocket(company_id: str, session_id: str, websocket_url: str) -> str:
-    """Create TwiML that connects to WebSocket for real-time voice with Deepgram"""
+def create_voice_twiml_with_websocket(company_id: str, session_id: str, websocket_url: str, user_id: str = None) -> str:
+    """Create TwiML that connects the call to the Twilio media-stream websocket.
+    Twilio drops query strings on <Stream> URLs, so call context travels as <Parameter>s.
+    """
+    from xml.sax.saxutils import quoteattr
+    parameters = {"company_id": company_id, "session_id": session_id, "user_id": user_id}
+    parameter_tags = "".join(
+        f"\n            <Parameter name=\"{name}\" value={quoteattr(value)} />"
+        for name, value in parameters.items() if value
+    )
     twiml = f"""<?xml version="1.0" encoding="UTF-8"?>
 <Response>
     <Say voice="alice">Connecting you to your AI assistant with real-time transcription. Please wait.</Say>
     <Connect>
-        <Stream url="{websocket_url}" />
+        <Stream url={quoteattr(websocket_url)}>{parameter_tags}
+        </Stream>
     </Connect>
 </Response>"""
     return twiml
 
-def get_websocket_url(company_id: str, session_id: str) -> str:
-    """Get WebSocket URL for voice streaming"""
+def get_websocket_url(company_id: str, session_id: str = None) -> str:
+    """Get the wss:// URL of the Twilio media-stream endpoint for a company"""
     base_url = os.getenv("BASE_URL", "http://localhost:8000")
-    return f"{base_url}/voice/websocket/{company_id}/{session_id}?company_id={company_id}" 
\ No newline at end of file
+    if base_url.startswith("https://"):
+        base_url = "wss://" + base_url[len("https://"):]
+    elif base_url.startswith("http://"):
+        base_url = "ws://" + base_url[len("http://"):]
+    return f"{base_url}/voice/twilio/media/{company_id}"
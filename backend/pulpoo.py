@@ -1,15 +1,17 @@
-import requests
+import httpx
 from datetime import datetime, timedelta
 import pytz
 from dotenv import load_dotenv
 import os
 
+from http_client import http_request
+
 load_dotenv()
 
 PULPOO_API_KEY = os.getenv("PULPOO_API_KEY")
 
 
-def crear_tarea_pulpoo(title: str, description: str, deadline: str, pulpoo_api_key: str = None) -> dict:
+async def crear_tarea_pulpoo(title: str, description: str, deadline: str, pulpoo_api_key: str = None) -> dict:
     """
     Crea una tarea en Pulpoo usando su API.
     
@@ -41,16 +43,16 @@ def crear_tarea_pulpoo(title: str, description: str, deadline: str, pulpoo_api_k
     
     try:
         print(f"--- Creando tarea en Pulpoo: {title} ---")
-        response = requests.post(url, headers=headers, json=data, timeout=10)
+        response = await http_request("pulpoo", "POST", url, headers=headers, json=data)
         
         if response.status_code == 200 or response.status_code == 201:
             return {"success": True, "data": response.json()}
         else:
             return {"success": False, "error": f"Error HTTP {response.status_code}: {response.text}"}
             
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         return {"success": False, "error": "Timeout al conectar con Pulpoo"}
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         return {"success": False, "error": "Error de conexión con Pulpoo"}
     except Exception as e:
         return {"success": False, "error": f"Error inesperado: {str(e)}"}
\ No newline at end of file
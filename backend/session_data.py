@@ -1,3 +1,6 @@
-# Session metadata storage to avoid circular imports
-session_metadata = {}
-sessions = {} 
\ No newline at end of file
+# Session metadata storage to avoid circular imports.
+# Dict-like views over session_store: process memory by default, Redis when SESSION_STORE_URL is set.
+from session_store import StoredMapping
+
+session_metadata = StoredMapping("session_metadata")
+sessions = StoredMapping("sessions")
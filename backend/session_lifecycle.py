@@ -0,0 +1,128 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List
+
+from session_store import get_session_backend, has_local_connection, session_store_is_shared
+
+# Idle sessions are evicted after SESSION_IDLE_TTL_S; above SESSION_MAX_ACTIVE the least recently
+# used idle sessions go first. Sessions with a live connection on this worker (voice websocket,
+# TTS stream, Twilio call) are never evicted.
+SESSION_IDLE_TTL_S = float(os.getenv("SESSION_IDLE_TTL_S", "3600"))
+SESSION_MAX_ACTIVE = int(os.getenv("SESSION_MAX_ACTIVE", "1000"))
+SESSION_SWEEP_INTERVAL_S = float(os.getenv("SESSION_SWEEP_INTERVAL_S", "60"))
+# Save the chat history to the shared store before dropping the local ChatSession, so the
+# session can resume on any worker (only with a shared store)
+SESSION_PERSIST_HISTORY_ON_EVICT = os.getenv("SESSION_PERSIST_HISTORY_ON_EVICT", "true").lower() in ("1", "true", "yes")
+# Shared-store activity is written at most this often per session
+_SHARED_TOUCH_INTERVAL_S = 30.0
+
+# session_id -> monotonic time of last activity, least recently used first
+_last_activity: "OrderedDict[str, float]" = OrderedDict()
+_shared_touched_at: Dict[str, float] = {}
+# Per-session cleanup of process-local state, registered by the modules that own it
+_eviction_hooks: List[Callable[[str], None]] = []
+stats = {"evicted_idle": 0, "evicted_lru": 0, "skipped_live": 0, "sweeps": 0}
+
+
+def register_eviction_hook(hook: Callable[[str], None]):
+    """hook(session_id) releases whatever the caller keeps for that session; it must not raise"""
+    if hook not in _eviction_hooks:
+        _eviction_hooks.append(hook)
+
+
+def touch_session(session_id: str):
+    """Record activity (new session, turn, message) for a session"""
+    if not session_id:
+        return
+    now = time.monotonic()
+    _last_activity[session_id] = now
+    _last_activity.move_to_end(session_id)
+    if session_store_is_shared() and now - _shared_touched_at.get(session_id, 0.0) >= _SHARED_TOUCH_INTERVAL_S:
+        _shared_touched_at[session_id] = now
+        get_session_backend().set("activity", session_id, time.time())
+
+
+def _idle_elsewhere(session_id: str, idle_ttl_s: float) -> bool:
+    """With a shared store, another worker may still be serving the session"""
+    if not session_store_is_shared():
+        return True
+    last_seen = get_session_backend().get("activity", session_id)
+    return last_seen is None or time.time() - last_seen >= idle_ttl_s
+
+
+def evict_session(session_id: str, reason: str = "manual"):
+    from session_data import sessions, session_metadata
+    from session_store import delete_chat_history
+
+    for hook in list(_eviction_hooks):
+        try:
+            hook(session_id)
+        except Exception as e:
+            print(f"⚠️ SESSION EVICT: hook {getattr(hook, '__name__', hook)} failed for {session_id}: {e}")
+    _last_activity.pop(session_id, None)
+    _shared_touched_at.pop(session_id, None)
+    if _idle_elsewhere(session_id, SESSION_IDLE_TTL_S):
+        # Idle everywhere: the session itself is gone, not just this worker's copy
+        sessions.pop(session_id, None)
+        session_metadata.pop(session_id, None)
+        delete_chat_history(session_id)
+        get_session_backend().delete("activity", session_id)
+    print(f"🧹 SESSION EVICT: {session_id} ({reason})")
+
+
+def evict_idle_sessions(idle_ttl_s: float = None, max_active: int = None) -> Dict:
+    """Evict sessions idle for longer than idle_ttl_s, then LRU-evict idle sessions above max_active"""
+    from session_data import sessions
+
+    idle_ttl_s = SESSION_IDLE_TTL_S if idle_ttl_s is None else idle_ttl_s
+    max_active = SESSION_MAX_ACTIVE if max_active is None else max_active
+    now = time.monotonic()
+    stats["sweeps"] += 1
+    evicted = []
+
+    # Sessions created before tracking started (or by another path) start their clock now
+    if not session_store_is_shared():
+        for session_id in list(sessions):
+            if session_id not in _last_activity:
+                _last_activity[session_id] = now
+                _last_activity.move_to_end(session_id, last=False)
+
+    for session_id, last in list(_last_activity.items()):
+        if now - last < idle_ttl_s:
+            break  # Ordered by recency: everything after is fresher
+        if has_local_connection(session_id):
+            stats["skipped_live"] += 1
+            touch_session(session_id)
+            continue
+        evict_session(session_id, reason="idle")
+        stats["evicted_idle"] += 1
+        evicted.append(session_id)
+
+    overflow = len(_last_activity) - max_active
+    for session_id in list(_last_activity):
+        if overflow <= 0:
+            break
+        if has_local_connection(session_id):
+            continue
+        evict_session(session_id, reason="lru")
+        stats["evicted_lru"] += 1
+        evicted.append(session_id)
+        overflow -= 1
+
+    if evicted:
+        print(f"🧹 SESSION SWEEP: evicted {len(evicted)} sessions, {len(_last_activity)} remain")
+    return {"evicted": evicted, "remaining": len(_last_activity)}
+
+
+def get_session_lifecycle_stats() -> Dict:
+    now = time.monotonic()
+    oldest = next(iter(_last_activity.values()), None)
+    return {
+        **stats,
+        "tracked_sessions": len(_last_activity),
+        "oldest_idle_s": round(now - oldest, 1) if oldest is not None else None,
+        "idle_ttl_s": SESSION_IDLE_TTL_S,
+        "max_active": SESSION_MAX_ACTIVE,
+        "eviction_hooks": len(_eviction_hooks),
+    }
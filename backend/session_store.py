@@ -0,0 +1,207 @@
+import json
+import os
+import socket
+import time
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, List, Optional
+
+# Where per-session state lives. By default it is process memory (one uvicorn worker); with
+# SESSION_STORE_URL=redis://... the serializable parts (session records, metadata, chat history)
+# are shared, so any worker can serve any session. The websocket and Deepgram connections
+# cannot be shared: the worker holding them records an affinity hint instead, for the load
+# balancer (or a misrouted request) to find the owning worker.
+SESSION_STORE_URL = os.getenv("SESSION_STORE_URL", "")
+SESSION_STORE_PREFIX = os.getenv("SESSION_STORE_PREFIX", "pulpoo:")
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+_MISSING = object()
+# session_id -> kinds of live connection held by this worker (mirrors the affinity hints)
+_local_connections: Dict[str, set] = {}
+
+
+class InProcessSessionBackend:
+    """Plain dicts; values are stored as-is (the single-worker behaviour)"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._data: Dict[str, Dict[str, Any]] = {}
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        return self._data.get(namespace, {}).get(key, default)
+
+    def set(self, namespace: str, key: str, value: Any):
+        self._data.setdefault(namespace, {})[key] = value
+
+    def delete(self, namespace: str, key: str) -> bool:
+        return self._data.get(namespace, {}).pop(key, _MISSING) is not _MISSING
+
+    def contains(self, namespace: str, key: str) -> bool:
+        return key in self._data.get(namespace, {})
+
+    def keys(self, namespace: str) -> List[str]:
+        return list(self._data.get(namespace, {}))
+
+    def count(self, namespace: str) -> int:
+        return len(self._data.get(namespace, {}))
+
+
+class RedisSessionBackend:
+    """One Redis hash per namespace, values JSON-encoded.
+    Takes any client with the redis-py hash API, so tests can pass a fakeredis client.
+    """
+
+    name = "redis"
+
+    def __init__(self, client, prefix: str = SESSION_STORE_PREFIX):
+        self.client = client
+        self.prefix = prefix
+
+    def _hash(self, namespace: str) -> str:
+        return f"{self.prefix}{namespace}"
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        raw = self.client.hget(self._hash(namespace), key)
+        return default if raw is None else json.loads(raw)
+
+    def set(self, namespace: str, key: str, value: Any):
+        self.client.hset(self._hash(namespace), key, json.dumps(value, default=str))
+
+    def delete(self, namespace: str, key: str) -> bool:
+        return bool(self.client.hdel(self._hash(namespace), key))
+
+    def contains(self, namespace: str, key: str) -> bool:
+        return bool(self.client.hexists(self._hash(namespace), key))
+
+    def keys(self, namespace: str) -> List[str]:
+        return [k.decode() if isinstance(k, bytes) else k for k in self.client.hkeys(self._hash(namespace))]
+
+    def count(self, namespace: str) -> int:
+        return int(self.client.hlen(self._hash(namespace)))
+
+
+def _create_backend():
+    if SESSION_STORE_URL.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            import redis
+            client = redis.Redis.from_url(SESSION_STORE_URL)
+            client.ping()
+            print(f"🗃️ SESSION STORE: redis at {SESSION_STORE_URL.split('@')[-1]} (worker {WORKER_ID})")
+            return RedisSessionBackend(client)
+        except Exception as e:
+            print(f"⚠️ SESSION STORE: redis unavailable ({e}); falling back to in-process store")
+    return InProcessSessionBackend()
+
+
+_backend = _create_backend()
+
+
+def get_session_backend():
+    return _backend
+
+
+def session_store_is_shared() -> bool:
+    return _backend.name != "memory"
+
+
+def set_session_backend(backend):
+    """Swap the backend (e.g. a RedisSessionBackend over fakeredis in tests)"""
+    global _backend
+    _backend = backend
+
+
+class StoredMapping(MutableMapping):
+    """Dict view over one namespace of the session store.
+    With a shared backend, values are copies: read-modify-write them back with mapping[key] = value.
+    """
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+
+    def __getitem__(self, key: str) -> Any:
+        value = _backend.get(self.namespace, key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return _backend.get(self.namespace, key, default)
+
+    def __setitem__(self, key: str, value: Any):
+        _backend.set(self.namespace, key, value)
+
+    def __delitem__(self, key: str):
+        if not _backend.delete(self.namespace, key):
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and _backend.contains(self.namespace, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(_backend.keys(self.namespace))
+
+    def __len__(self) -> int:
+        return _backend.count(self.namespace)
+
+    def __repr__(self) -> str:
+        return f"StoredMapping({self.namespace!r}, backend={_backend.name})"
+
+
+# ----- chat history -----
+
+def save_chat_history(session_id: str, history: List[Dict]):
+    _backend.set("chat_history", session_id, history)
+
+
+def load_chat_history(session_id: str) -> Optional[List[Dict]]:
+    return _backend.get("chat_history", session_id)
+
+
+def delete_chat_history(session_id: str):
+    _backend.delete("chat_history", session_id)
+
+
+# ----- affinity hints for non-serializable state -----
+
+def set_session_affinity(session_id: str, kind: str):
+    """Record that this worker holds the session's `kind` connection (voice_ws, tts_ws, twilio...)"""
+    _local_connections.setdefault(session_id, set()).add(kind)
+    hints = _backend.get("affinity", session_id) or {}
+    hints[kind] = {"worker": WORKER_ID, "since": time.time()}
+    _backend.set("affinity", session_id, hints)
+
+
+def clear_session_affinity(session_id: str, kind: str):
+    kinds = _local_connections.get(session_id)
+    if kinds is not None:
+        kinds.discard(kind)
+        if not kinds:
+            _local_connections.pop(session_id, None)
+    hints = _backend.get("affinity", session_id) or {}
+    if hints.get(kind, {}).get("worker") != WORKER_ID:
+        return  # Another worker took the session over since
+    hints.pop(kind)
+    if hints:
+        _backend.set("affinity", session_id, hints)
+    else:
+        _backend.delete("affinity", session_id)
+
+
+def has_local_connection(session_id: str) -> bool:
+    """True while this worker holds a live connection for the session"""
+    return session_id in _local_connections
+
+
+def get_session_affinity(session_id: str) -> Dict[str, Dict]:
+    return _backend.get("affinity", session_id) or {}
+
+
+def get_session_store_stats() -> Dict:
+    return {
+        "backend": _backend.name,
+        "worker_id": WORKER_ID,
+        "sessions": _backend.count("sessions"),
+        "session_metadata": _backend.count("session_metadata"),
+        "chat_histories": _backend.count("chat_history"),
+        "connections_with_affinity": _backend.count("affinity"),
+    }
@@ -0,0 +1,189 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+
+class TieredLRUCache:
+    """Two-tier LRU store: memory (byte budget) and optional disk directory (size budget, LRU by
+    mtime so eviction order survives restarts). Values are kept in memory as given; to_bytes and
+    from_bytes convert them for the disk tier. Used by the TTS and document text caches."""
+
+    def __init__(self, name: str, memory_bytes: int, disk_dir: str = "", disk_bytes: int = 0,
+                 suffix: str = ".bin", memory_max_entry_bytes: int = None,
+                 to_bytes: Callable = bytes, from_bytes: Callable = bytes):
+        self.name = name
+        self.memory_bytes = memory_bytes
+        self.memory_max_entry_bytes = memory_bytes if memory_max_entry_bytes is None else memory_max_entry_bytes
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+        self.suffix = suffix
+        self._to_bytes = to_bytes
+        self._from_bytes = from_bytes
+        self._memory: "OrderedDict[str, Tuple[object, int]]" = OrderedDict()  # key -> (value, size)
+        self._memory_size = 0
+        self._disk_index: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0,
+                      "evictions": 0, "disk_evictions": 0}
+        if self.disk_dir:
+            self._load_disk_index()
+
+    def get_memory(self, key: str):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            self._memory.move_to_end(key)
+            self.stats["hits"] += 1
+            self.stats["memory_hits"] += 1
+            return entry[0]
+
+    def on_disk(self, key: str) -> bool:
+        with self._lock:
+            return key in self._disk_index
+
+    def get_disk(self, key: str):
+        """Blocking disk read; a hit is promoted to the memory tier"""
+        data = self._read_disk(key)
+        if data is None:
+            return None
+        value = self._from_bytes(data)
+        with self._lock:
+            self._store_memory(key, value, len(data))
+            self.stats["hits"] += 1
+            self.stats["disk_hits"] += 1
+        return value
+
+    def record_miss(self):
+        with self._lock:
+            self.stats["misses"] += 1
+
+    def get(self, key: str):
+        """Memory, then disk (blocking); counts a miss when neither has the key"""
+        value = self.get_memory(key)
+        if value is None and self.on_disk(key):
+            value = self.get_disk(key)
+        if value is None:
+            self.record_miss()
+        return value
+
+    def put_memory(self, key: str, value, size: int = None) -> int:
+        """Store in the memory tier; returns the value's size in bytes"""
+        size = len(self._to_bytes(value)) if size is None else size
+        with self._lock:
+            self._store_memory(key, value, size)
+            self.stats["stores"] += 1
+        return size
+
+    def write_disk(self, key: str, value, data: bytes = None):
+        """Blocking write to the disk tier (no-op without one); pass data when already converted"""
+        if not self.disk_dir:
+            return
+        data = self._to_bytes(value) if data is None else data
+        if len(data) > self.disk_bytes:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ {self.name}: failed to write {path}: {e}")
+            return
+        evict = []
+        with self._lock:
+            self._disk_size -= self._disk_index.pop(key, 0)
+            self._disk_index[key] = len(data)
+            self._disk_size += len(data)
+            while self._disk_size > self.disk_bytes and len(self._disk_index) > 1:
+                old_key, size = self._disk_index.popitem(last=False)
+                self._disk_size -= size
+                self.stats["disk_evictions"] += 1
+                evict.append(old_key)
+        self._remove_files(evict)
+
+    def discard_prefixes(self, prefixes: Iterable[str]):
+        """Drop every entry whose key starts with one of the prefixes, from both tiers"""
+        prefixes = tuple(prefixes)
+        if not prefixes:
+            return
+        with self._lock:
+            for key in [k for k in self._memory if k.startswith(prefixes)]:
+                self._memory_size -= self._memory.pop(key)[1]
+            doomed = [k for k in self._disk_index if k.startswith(prefixes)]
+            for key in doomed:
+                self._disk_size -= self._disk_index.pop(key)
+        self._remove_files(doomed)
+
+    def snapshot(self) -> Dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_ratio": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_size,
+            "memory_budget_bytes": self.memory_bytes,
+            "disk_entries": len(self._disk_index),
+            "disk_bytes": self._disk_size,
+            "disk_budget_bytes": self.disk_bytes if self.disk_dir else 0,
+        }
+
+    # ----- internals -----
+
+    def _store_memory(self, key: str, value, size: int):
+        if size > self.memory_max_entry_bytes or size > self.memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_size -= previous[1]
+        self._memory[key] = (value, size)
+        self._memory_size += size
+        while self._memory_size > self.memory_bytes:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_size -= evicted_size
+            self.stats["evictions"] += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}{self.suffix}")
+
+    def _load_disk_index(self):
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            entries = []
+            for name in os.listdir(self.disk_dir):
+                if name.endswith(self.suffix):
+                    st = os.stat(os.path.join(self.disk_dir, name))
+                    entries.append((st.st_mtime, name[:-len(self.suffix)], st.st_size))
+            # Oldest first, so eviction order survives restarts
+            for _, key, size in sorted(entries):
+                self._disk_index[key] = size
+                self._disk_size += size
+            print(f"🗄️ {self.name}: disk tier at {self.disk_dir} ({len(self._disk_index)} entries, {self._disk_size} bytes)")
+        except Exception as e:
+            print(f"⚠️ {self.name}: disk tier disabled: {e}")
+            self.disk_dir = ""
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            with self._lock:
+                if key in self._disk_index:
+                    self._disk_index.move_to_end(key)
+            return data
+        except OSError:
+            with self._lock:
+                self._disk_size -= self._disk_index.pop(key, 0)
+            return None
+
+    def _remove_files(self, keys):
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
@@ -5,6 +5,8 @@ from fastapi import FastAPI, Depends, HTTPException, APIRouter
 from pydantic import BaseModel
 from typing import Any, List, Optional, Dict
 from supabase import create_client, Client
+import asyncio
+import concurrent.futures
 import time
 
 
@@ -242,6 +244,12 @@ def get_system_prompt(company_id: str):
         
         final_prompt = enhanced_prompt + voice_constraints
 
+        from company.files.prompt_budget import count_tokens, record_prompt_breakdown
+        base_tokens = count_tokens(base_prompt)
+        record_prompt_breakdown(company_id, base_tokens=base_tokens,
+                                document_section_tokens=count_tokens(enhanced_prompt) - base_tokens,
+                                voice_constraint_tokens=count_tokens(voice_constraints))
+
         
         return final_prompt
         
@@ -510,122 +518,25 @@ def format_rag_context(query: str, search_results: list):
     
     return "\n\n" + "\n".join(context_parts)
 
-def get_company_documents_from_storage(company_id: str):
-    """Get company documents from Supabase storage"""
-    start_time = time.time()
+def get_company_documents_from_storage(company_id: str, filtered: bool = False):
+    """Get company documents from Supabase storage (code filtered out when filtered=True).
+    Blocking wrapper over company.files.document_loader; async callers should await
+    load_company_documents directly, or call this (and get_system_prompt) via asyncio.to_thread."""
+    from company.files.document_loader import load_company_documents
+
+    return _run_blocking(load_company_documents(company_id, filtered))
+
+def _run_blocking(coro):
+    """Run a coroutine to completion from synchronous code"""
     try:
-        supabase_url = os.getenv("SUPABASE_URL")
-        supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-        
-        # S3 credentials for Supabase storage
-        s3_access_key = os.getenv("S3_ACCESS_KEY")
-        s3_secret_key = os.getenv("S3_SECRET_KEY")
-        s3_region = os.getenv("S3_REGION", "us-east-1")
-        
-        if not supabase_url or not supabase_key:
-            print("⚠️ Supabase credentials not available")
-            return ""
-        
-        if not s3_access_key or not s3_secret_key:
-            print("⚠️ S3 credentials not available - add S3_ACCESS_KEY and S3_SECRET_KEY to .env")
-            return ""
-        
-        supabase = create_client(supabase_url, supabase_key)
-        
-        # Get company info to find storage path
-        company_result = (supabase.table("companies")
-                         .select("*")
-                         .eq("company_id", company_id)
-                         .single().execute())
-        
-        if not company_result.data:
-            print(f"No company found for company_id: {company_id}")
-            return ""
-        
-        company_data = company_result.data
-        files = company_data.get("files", [])
-        
-        if not files:
-            return ""
-        
-        # Get documents from storage
-        documents_content = []
-        for file_path in files:
-            try:
-                # Extract bucket name and file path
-                path_parts = file_path.split('/', 1)
-                if len(path_parts) == 2:
-                    bucket_name = path_parts[0]
-                    file_path_without_bucket = path_parts[1]
-                else:
-                    # If no bucket name in path, use client-files
-                    bucket_name = "client-files"
-                    file_path_without_bucket = file_path
-                
-                
-                try:
-                    file_response = supabase.storage.from_(bucket_name).download(file_path_without_bucket)
-                    if file_response:
-                        # Try to extract text from the file
-                        file_text = None
-                        
-                        # First try to decode as UTF-8 (for text files)
-                        try:
-                            file_text = file_response.decode('utf-8')
-                            print(f"✅ Loaded text document: {file_path} ({len(file_response)} bytes)")
-                        except UnicodeDecodeError:
-                            # It's a binary file, try to extract text from PDF
-                            if file_path.lower().endswith('.pdf'):
-                                try:
-                                    # Try to extract text from PDF using PyPDF2
-                                    import PyPDF2
-                                    from io import BytesIO
-                                    
-                                    pdf_file = BytesIO(file_response)
-                                    pdf_reader = PyPDF2.PdfReader(pdf_file)
-                                    
-                                    text_content = []
-                                    for page in pdf_reader.pages:
-                                        text_content.append(page.extract_text())
-                                    
-                                    file_text = '\n'.join(text_content)
-                                    
-                                except ImportError:
-                                    print(f"⚠️ PyPDF2 not installed - skipping PDF: {file_path}")
-                                    print("   Install with: pip install PyPDF2")
-                                    continue
-                                except Exception as pdf_error:
-                                    print(f"⚠️ Could not extract text from PDF {file_path}: {pdf_error}")
-                                    continue
-                            else:
-                                print(f"⚠️ Binary file (not PDF) - skipping: {file_path}")
-                                continue
-                        
-                        if file_text:
-                            documents_content.append(f"Document: {file_path}\n{file_text}")
-                    else:
-                        print(f"⚠️ Could not load document: {file_path}")
-                        
-                except Exception as bucket_error:
-                    print(f"❌ Failed to download from bucket '{bucket_name}': {bucket_error}")
-                    continue
-                    
-            except Exception as e:
-                print(f"Error loading document {file_path}: {e}")
-                continue
-        
-        if documents_content:
-            combined_content = "\n\n".join(documents_content)
-            end_time = time.time()
-            return combined_content
-        
-        else:
-            print(f"No documents could be loaded for company_id: {company_id}")
-            return ""
-        
-    except Exception as e:
-        print(f"Error getting company documents for company_id {company_id}: {e}")
-        return ""
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    # Called synchronously from the event loop thread: run it on its own loop. This still blocks
+    # the calling loop until done, so async code must not get here (use asyncio.to_thread)
+    print("⚠️ Blocking document load on the event loop thread; call it via asyncio.to_thread")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
 
 def filter_code_from_documents(content: str) -> str:
     """Filter out code blocks and code examples from document content"""
@@ -648,17 +559,22 @@ def filter_code_from_documents(content: str) -> str:
     return '\n'.join(filtered_lines)
 
 def inject_company_documents_to_prompt(base_prompt: str, company_id: str):
-    """Inject company documents into the system prompt"""
-    documents_content = get_company_documents_from_storage(company_id)
+    """Inject company documents into the system prompt, within the prompt document token budget"""
+    from company.files.document_loader import load_company_document_list
+    from company.files.prompt_budget import budget_company_documents, record_prompt_breakdown
+
+    # Code is filtered out per document, and the filtered text is cached with the document
+    documents = _run_blocking(load_company_document_list(company_id, filtered=True))
     
-    if documents_content:
-        # Filter out code from documents
-        filtered_content = filter_code_from_documents(documents_content)
-        
+    if documents:
+        # The prompt itself (instructions + company info) is what sections are ranked against
+        filtered_content, report = budget_company_documents(company_id, documents, base_prompt)
+        record_prompt_breakdown(company_id, documents=report)
         # Add documents to the prompt
         enhanced_prompt = f"{base_prompt}\n\nCompany Documents:\n{filtered_content}"
         return enhanced_prompt
     else:
+        record_prompt_breakdown(company_id, documents=None)
         print("📄 No company documents to inject")
         return base_prompt
 
@@ -0,0 +1,145 @@
+import math
+import os
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+# Per-turn latency waterfall. Each voice turn gets a trace that collects monotonic timestamps
+# for its stages (final transcript → session lookup → credit check → prompt/tools → LLM →
+# tools → TTS → first audio → playback). Stages are marked by session_id, so the code doing
+# the work does not need the trace object threaded through it.
+TURN_TRACE_BUFFER_SIZE = int(os.getenv("TURN_TRACE_BUFFER_SIZE", "500"))
+
+# Stage names, in the order they normally happen
+TRACE_STAGES = [
+    "final_transcript",
+    "session_lookup",
+    "credit_check",
+    "chat_ready",
+    "llm_request",
+    "llm_first_token",
+    "llm_complete",
+    "tool_call_start",
+    "tool_call_end",
+    "tts_request",
+    "tts_first_byte",
+    "playback_start",
+    "turn_complete",
+]
+
+
+class TurnTrace:
+    def __init__(self, session_id: str, company_id: str = None, source: str = "voice", started_at: float = None):
+        self.turn_id = uuid.uuid4().hex[:12]
+        self.session_id = session_id
+        self.company_id = company_id
+        self.source = source
+        self.started_at = started_at if started_at is not None else time.monotonic()
+        self.started_at_wall = datetime.utcnow().isoformat() + "Z"
+        self.marks: List[Dict] = []
+        self.status = "in_progress"
+
+    def mark(self, stage: str, once: bool = False, **info):
+        if once and self.has(stage):
+            return
+        entry = {"stage": stage, "at_ms": round((time.monotonic() - self.started_at) * 1000, 1)}
+        if info:
+            entry["info"] = info
+        self.marks.append(entry)
+
+    def has(self, stage: str) -> bool:
+        return any(m["stage"] == stage for m in self.marks)
+
+    def first(self, stage: str) -> Optional[float]:
+        for m in self.marks:
+            if m["stage"] == stage:
+                return m["at_ms"]
+        return None
+
+    def to_dict(self) -> Dict:
+        previous = 0.0
+        waterfall = []
+        for m in self.marks:
+            waterfall.append({**m, "delta_ms": round(m["at_ms"] - previous, 1)})
+            previous = m["at_ms"]
+        return {
+            "turn_id": self.turn_id,
+            "session_id": self.session_id,
+            "company_id": self.company_id,
+            "source": self.source,
+            "status": self.status,
+            "started_at": self.started_at_wall,
+            "stages": waterfall,
+        }
+
+
+_traces: Deque[TurnTrace] = deque(maxlen=TURN_TRACE_BUFFER_SIZE)
+_active: Dict[str, TurnTrace] = {}
+
+
+def start_turn_trace(session_id: str, company_id: str = None, source: str = "voice", started_at: float = None) -> TurnTrace:
+    """Open the trace of a new turn; it becomes the session's current trace"""
+    trace = TurnTrace(session_id, company_id=company_id, source=source, started_at=started_at)
+    trace.marks.append({"stage": "final_transcript", "at_ms": 0.0})
+    _traces.append(trace)
+    _active[session_id] = trace
+    if len(_active) > TURN_TRACE_BUFFER_SIZE:
+        _active.pop(next(iter(_active)))
+    return trace
+
+
+def get_turn_trace(session_id: str) -> Optional[TurnTrace]:
+    return _active.get(session_id)
+
+
+def trace_mark(session_id: str, stage: str, once: bool = False, **info):
+    """Record a stage on the session's current turn (no-op when the session is not traced).
+    Marks after the turn completed are still accepted: audio often starts playing afterwards.
+    """
+    trace = _active.get(session_id)
+    if trace is not None:
+        trace.mark(stage, once=once, **info)
+
+
+def finish_turn_trace(session_id: str, status: str = "ok"):
+    trace = _active.get(session_id)
+    if trace is not None and trace.status == "in_progress":
+        trace.status = status
+        trace.mark("turn_complete")
+
+
+def get_recent_traces(session_id: str = None, company_id: str = None, limit: int = 50) -> List[Dict]:
+    traces = [t for t in reversed(_traces)
+              if (not session_id or t.session_id == session_id) and (not company_id or t.company_id == company_id)]
+    return [t.to_dict() for t in traces[:limit]]
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    # Nearest-rank percentile
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def get_stage_percentiles(company_id: str = None) -> Dict[str, Dict]:
+    """p50/p95/p99 of the first time each stage was reached, in ms since the final transcript"""
+    samples: Dict[str, List[float]] = {}
+    for trace in _traces:
+        if company_id and trace.company_id != company_id:
+            continue
+        for stage in {m["stage"] for m in trace.marks}:
+            samples.setdefault(stage, []).append(trace.first(stage))
+    ordered = TRACE_STAGES + sorted(set(samples) - set(TRACE_STAGES))
+    result = {}
+    for stage in ordered:
+        values = sorted(samples.get(stage, []))
+        if not values:
+            continue
+        result[stage] = {
+            "count": len(values),
+            "p50_ms": _percentile(values, 50),
+            "p95_ms": _percentile(values, 95),
+            "p99_ms": _percentile(values, 99),
+        }
+    return result
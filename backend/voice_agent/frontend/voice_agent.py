@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import Form, File, UploadFile
 from company.training.training import is_training_session
 from session_data import session_metadata
@@ -8,6 +9,14 @@ from audio.audio import transcribe_audio_file, synthesize_audio_response
 from main import supabase
 
 
+def get_company_language_code(company_id: str) -> str:
+    try:
+        return supabase.table("companies").select("language").eq("company_id", company_id).execute().data[0]["language"]
+    except Exception as e:
+        print(f"⚠️ Error getting language code, using default: {e}")
+        return "es"
+
+
 async def voice_agent_helper(session_id: str = Form(...), audio: UploadFile = File(...)):
     try:
         
@@ -16,22 +25,26 @@ async def voice_agent_helper(session_id: str = Form(...), audio: UploadFile = Fi
             print(f"⚠️ Training session detected: {session_id}. Use /training/respond endpoint instead.")
             return {"error": "This is a training session. Use the /training/respond endpoint instead.", "text": "", "audio": None}
         
-        audio_bytes = await audio.read()
-        
         # Log voice processing for audit trail
         session_metadata_info = session_metadata.get(session_id, {})
         company_id = session_metadata_info.get("company_id", "default")
         user_id = session_metadata_info.get("user_id")  # Extract user_id from session
         
-        
-        # Log data processing
-        
-        
         #Count time of every function call and record
         start_time = time.time()
-        user_text = transcribe_audio_file(audio_bytes, user_id=user_id, company_id=company_id, session_id=session_id)
+        # The company language lookup (blocking Supabase call) runs in a thread while the upload is
+        # read and ElevenLabs transcribes it
+        language_task = asyncio.create_task(asyncio.to_thread(get_company_language_code, company_id))
+        try:
+            audio_bytes = await audio.read()
+            user_text = await transcribe_audio_file(audio_bytes, user_id=user_id, company_id=company_id, session_id=session_id,
+                                                    content_type=audio.content_type)
+        except BaseException:
+            language_task.cancel()
+            raise
+        language_code = await language_task
         end_time = time.time()
-        language_code = supabase.table("companies").select("language").eq("company_id", company_id).execute().data[0]["language"]
+        print(f"⏱️ STT + language lookup took {end_time - start_time:.3f} seconds")
         
 
         if not user_text or user_text.strip() == "":
@@ -55,7 +68,7 @@ async def voice_agent_helper(session_id: str = Form(...), audio: UploadFile = Fi
         model = "deepgram_aura_v2"
         from audio.audio import choose_model_for_tts
         print("🔊 CHOOSING MODEL FOR TTS")
-        audio_response = choose_model_for_tts(model, response, language_code, user_id, company_id, session_id)
+        audio_response = await choose_model_for_tts(model, response, language_code, user_id, company_id, session_id)
         end_time = time.time()
         
         return {
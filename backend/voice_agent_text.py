@@ -6,13 +6,64 @@ from main import get_agent_response_with_training
 from company.storage.storage import store_message_in_history_helper
 from audio.audio import synthesize_audio_response
 from main import supabase
+from turn_trace import get_turn_trace, start_turn_trace, trace_mark, finish_turn_trace
 
 
-async def voice_agent_text_helper(session_id: str = Form(...), user_text: str = Form(...)):
+async def stream_agent_response_to_tts(session_id: str, user_text: str, user_id: str = None, company_id: str = None) -> str:
+    """Stream the agent reply sentence by sentence into the session's live Deepgram TTS connection.
+    Returns the full text that was spoken.
+    """
+    from agent.agent import stream_agent_response_with_training_helper
+    from deepgram_tts_websocket import tts_server_speak
+
+    spoken = []
+    first_segment_at = None
+    start_time = time.time()
+    async for segment in stream_agent_response_with_training_helper(session_id, user_text, user_id=user_id, company_id=company_id):
+        if first_segment_at is None:
+            first_segment_at = time.time()
+            print(f"⏱️ STREAM TURN: first segment after {first_segment_at - start_time:.3f}s")
+        spoken.append(segment)
+        if not await tts_server_speak(session_id, segment, flush=True):
+            print(f"⚠️ STREAM TURN: TTS connection unavailable for {session_id}; continuing text-only")
+    print(f"⏱️ STREAM TURN: {len(spoken)} segments in {time.time() - start_time:.3f}s")
+    return " ".join(spoken)
+
+
+async def speak_text_to_tts(session_id: str, text: str) -> bool:
+    """Send an already generated reply into the session's live TTS connection, sentence by sentence"""
+    from agent.agent import split_speakable_segments
+    from deepgram_tts_websocket import tts_server_speak
+
+    segments, remainder = split_speakable_segments(text + " ")
+    if remainder.strip():
+        segments.append(remainder.strip())
+    spoken = False
+    for segment in segments:
+        spoken = await tts_server_speak(session_id, segment, flush=True) or spoken
+    return spoken
+
+
+async def voice_agent_text_helper(session_id: str = Form(...), user_text: str = Form(...), tts_mode: str = "rest",
+                                  agent_response: str = None):
     """
     Voice agent endpoint that accepts transcribed text instead of audio.
     This integrates with the existing LLM and ElevenLabs workflow.
+
+    tts_mode:
+    - "rest": synthesize the whole reply over REST and return it as base64 (default)
+    - "stream": stream the reply sentence by sentence into the session's live TTS socket
+      (falls back to "rest" when the session has no TTS connection)
+    - "none": text only; the caller synthesizes and delivers the audio itself
+
+    agent_response: reply already generated for user_text (e.g. a committed speculative turn);
+    when given the LLM call is skipped.
     """
+    # Voice websocket turns are traced from the final transcript; direct calls get their own trace
+    current_trace = get_turn_trace(session_id)
+    owns_trace = current_trace is None or current_trace.status != "in_progress"
+    if owns_trace:
+        current_trace = start_turn_trace(session_id, source="text")
     try:
         print(f"🎤 Voice agent (text) called for session: {session_id}")
         
@@ -82,6 +133,8 @@ async def voice_agent_text_helper(session_id: str = Form(...), user_text: str =
             print(f"👤 Using fallback company_id: {company_id}")
         
         print(f"👤 Final session metadata: user_id={user_id}, company_id={company_id}")
+        current_trace.company_id = current_trace.company_id or company_id
+        trace_mark(session_id, "session_lookup")
         
         # Check credits before processing
         if user_id:
@@ -102,15 +155,31 @@ async def voice_agent_text_helper(session_id: str = Form(...), user_text: str =
             except Exception as e:
                 print(f"⚠️ Error checking credits: {e}")
                 # Continue processing even if credit check fails
+            trace_mark(session_id, "credit_check")
         
         if not user_text or user_text.strip() == "":
             print(f"❌ No text provided")
             return {"error": "No text provided", "hasAudioResponse": False, "audioLength": 0, "hasTextResponse": False, "textResponse": "", "audio": None}
         
+        # Decide whether the reply can go straight into a live TTS connection
+        streamed_to_tts = False
+        if tts_mode == "stream":
+            from deepgram_tts_websocket import TTS_REGISTRY
+            streamed_to_tts = TTS_REGISTRY.get(session_id) is not None
+            if not streamed_to_tts:
+                print(f"⚠️ Streaming TTS requested but no active TTS connection for {session_id}; using REST TTS")
+
         # Get response with training data
         print(f"🤖 Getting response with training data")
         start_time = time.time()
-        response = await get_agent_response_with_training(session_id, user_text, user_id=user_id, company_id=company_id)
+        if agent_response:
+            response = agent_response
+            if streamed_to_tts:
+                await speak_text_to_tts(session_id, response)
+        elif streamed_to_tts:
+            response = await stream_agent_response_to_tts(session_id, user_text, user_id=user_id, company_id=company_id)
+        else:
+            response = await get_agent_response_with_training(session_id, user_text, user_id=user_id, company_id=company_id)
         end_time = time.time()
         print(f"⏱️ get_agent_response_with_training took {end_time - start_time} seconds")
         print(f"🤖 Response: {response[:100]}...")
@@ -118,19 +187,23 @@ async def voice_agent_text_helper(session_id: str = Form(...), user_text: str =
         # Synthesize audio response immediately
         print(f"🔊 Synthesizing audio response with user_id={user_id}, company_id={company_id}, session_id={session_id}")
         start_time = time.time()
-        try:
-            from main import supabase
-            language_code = supabase.table("companies").select("language").eq("company_id", company_id).execute().data[0]["language"]
-        except Exception as e:
-            print(f"⚠️ Error getting language code, using default: {e}")
-            language_code = "es"  # Default to Spanish
         model = "deepgram_aura_v2"
         # If streaming TTS is active for this session, skip REST TTS to avoid double audio and billing
-        if session_metadata_info.get("tts_stream_active"):
+        if streamed_to_tts or session_metadata_info.get("tts_stream_active"):
             print("🔇 Streaming TTS active; skipping REST TTS synthesis")
             audio_response = ""
+        elif tts_mode == "none":
+            print("🔇 Caller delivers audio itself; skipping REST TTS synthesis")
+            audio_response = ""
         else:
+            try:
+                from main import supabase
+                language_code = supabase.table("companies").select("language").eq("company_id", company_id).execute().data[0]["language"]
+            except Exception as e:
+                print(f"⚠️ Error getting language code, using default: {e}")
+                language_code = "es"  # Default to Spanish
             from audio.audio import choose_model_for_tts
+            trace_mark(session_id, "tts_request", mode="rest")
             audio_response = await choose_model_for_tts(model, response, language_code, user_id, company_id, session_id)
         end_time = time.time()
         print(f"⏱️ synthesize_audio_response took {end_time - start_time} seconds")
@@ -156,7 +229,8 @@ async def voice_agent_text_helper(session_id: str = Form(...), user_text: str =
             "audioLength": len(audio_response) if audio_response else 0,
             "hasTextResponse": True if response else False,
             "textResponse": response,
-            "audio": audio_response
+            "audio": audio_response,
+            "streamedToTTS": streamed_to_tts
         }
         print(f"✅ SUCCESS: Returning response with audioLength={len(audio_response) if audio_response else 0}")
         return result
@@ -167,4 +241,9 @@ async def voice_agent_text_helper(session_id: str = Form(...), user_text: str =
         traceback.print_exc()
         error_result = {"error": str(e), "hasAudioResponse": False, "audioLength": 0, "hasTextResponse": False, "textResponse": "", "audio": None}
         print(f"❌ ERROR: Returning empty response due to exception: {str(e)}")
-        return error_result 
\ No newline at end of file
+        if owns_trace:
+            finish_turn_trace(session_id, status="error")
+        return error_result
+    finally:
+        if owns_trace:
+            finish_turn_trace(session_id) 
\ No newline at end of file